@@ -0,0 +1,123 @@
+"""
+Analysis Options
+================
+
+Shared definition of the "Process Code" analysis options, used by both the
+Streamlit panel and the headless batch CLI so they send the same prompts.
+Local analyzers (complexity metrics, security scan) run first; their
+results ground the instructions sent to the model.
+"""
+
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from complexity_metrics import ComplexityReport, analyze_complexity, format_report
+from security_scanner import Finding, flagged_regions, scan_code
+
+# option name -> (section title, instruction), in prompt order
+ANALYSIS_OPTIONS = {
+    "time_complexity": ("⏱️ Time Complexity", "Calculate time complexity"),
+    "space_complexity": ("💾 Space Complexity", "Calculate space complexity"),
+    "security_scan": ("🔒 Security", "Perform security analysis"),
+    "convert_language": ("🔄 {language} Conversion", "Convert to {language}"),
+    "generate_docs": ("📚 Documentation", "Generate comprehensive documentation"),
+    "generate_tests": ("🧪 Unit Tests", "Create unit tests"),
+    "add_comments": ("💬 Comments", "Add detailed comments"),
+    "optimize_code": ("🚀 Optimization", "Optimize for better performance"),
+}
+
+COMPLEXITY_OPTIONS = {"time_complexity", "space_complexity"}
+
+
+class LocalAnalysis(NamedTuple):
+    """Results of the LLM-free analyzers for one piece of code"""
+
+    complexity: Optional[ComplexityReport]
+    findings: Optional[List[Finding]]
+
+
+def run_local_analysis(
+    code: str, language: Optional[str], options: Iterable[str]
+) -> LocalAnalysis:
+    """Run the local analyzers needed by the selected options"""
+    options = set(options)
+    complexity = (
+        analyze_complexity(code, language) if options & COMPLEXITY_OPTIONS else None
+    )
+    findings = scan_code(code, language) if "security_scan" in options else None
+    return LocalAnalysis(complexity, findings)
+
+
+def build_sections(
+    code: str,
+    options: Iterable[str],
+    target_language: str = None,
+    local: LocalAnalysis = None,
+) -> Dict[str, str]:
+    """Map each selected option to its section title and instruction"""
+    options = set(options)
+    if target_language and target_language != "Keep Original":
+        options.add("convert_language")
+    local = local or LocalAnalysis(None, None)
+    grounding = ""
+    if local.complexity is not None and local.complexity.functions:
+        grounding = "\n\n" + format_report(local.complexity)
+
+    sections = {}
+    for name, (title, instruction) in ANALYSIS_OPTIONS.items():
+        if name not in options:
+            continue
+        if name in COMPLEXITY_OPTIONS:
+            instruction += grounding
+        elif name == "security_scan":
+            # The model is pointed at the flagged lines, but the prompt
+            # template still carries the whole file. Nothing flagged means
+            # no security section at all.
+            if not local.findings:
+                continue
+            instruction += (
+                ", starting with these locally flagged lines:\n"
+                + flagged_regions(code, local.findings)
+            )
+        elif name == "convert_language":
+            title = title.format(language=target_language)
+            instruction = instruction.format(language=target_language)
+        sections[title] = instruction
+    return sections
+
+
+def base_sections(
+    options: Iterable[str], target_language: str = None
+) -> Dict[str, str]:
+    """Section titles and plain instructions, without whole-file grounding
+
+    Used for per-function analysis, where an instruction must not change
+    when code elsewhere in the file does.
+    """
+    options = set(options)
+    if target_language and target_language != "Keep Original":
+        options.add("convert_language")
+
+    sections = {}
+    for name, (title, instruction) in ANALYSIS_OPTIONS.items():
+        if name not in options:
+            continue
+        if name == "convert_language":
+            title = title.format(language=target_language)
+            instruction = instruction.format(language=target_language)
+        sections[title] = instruction
+    return sections
+
+
+def combined_task(sections: Dict[str, str]) -> str:
+    """Single-request prompt covering every selected option"""
+    prompt_parts = ["Analyze and enhance the following code:"]
+    prompt_parts.extend(f"- {instruction}" for instruction in sections.values())
+    return "\n".join(prompt_parts)
+
+
+def section_tasks(sections: Dict[str, str]) -> Dict[str, str]:
+    """One prompt per option, for concurrent fan-out"""
+    return {
+        title: f"Analyze the following code. Task: {instruction}."
+        for title, instruction in sections.items()
+    }
@@ -0,0 +1,291 @@
+"""
+Batch CLI
+=========
+
+Headless analysis of a whole directory, for CI or overnight runs.
+
+Walks a directory for files with ``SUPPORTED_LANGUAGES`` extensions, runs
+the same analysis options as the "Process Code" panel through helper_ai
+with bounded concurrency, and appends one JSON record per file to a JSONL
+file as soon as that file finishes. The output file doubles as the
+checkpoint: rerunning the same command skips files that already have a
+successful record for their current content, so a crashed run resumes
+where it stopped.
+
+Example::
+
+    python batch_cli.py src/ --output results.jsonl \\
+        --options time_complexity security_scan --model GPT-3.5-Turbo
+"""
+
+import argparse
+import contextvars
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from analysis_options import (
+    ANALYSIS_OPTIONS,
+    build_sections,
+    combined_task,
+    run_local_analysis,
+    section_tasks,
+)
+from call_metrics import action_scope
+from code_chunker import analyze_code, iter_code_analyses
+from complexity_metrics import metrics_table
+from config import PERFORMANCE_CONFIG, SUPPORTED_LANGUAGES
+from helper_ai import is_error_response
+from model_router import set_pinned
+from security_scanner import language_for_path
+
+MODELS = ["ChatGPT-4o", "GPT-3.5-Turbo", "Gemini Pro"]
+
+SKIP_DIRS = {".git", ".venv", "venv", "node_modules", "__pycache__", "build", "dist"}
+
+
+def iter_source_files(
+    root: str, languages: Optional[Set[str]] = None, max_bytes: int = None
+) -> Iterator[str]:
+    """Yield source files under root whose extension maps to a supported language"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(
+            d for d in dirnames if d not in SKIP_DIRS and not d.startswith(".")
+        )
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            language = language_for_path(path)
+            if language is None or (languages and language not in languages):
+                continue
+            if max_bytes and os.path.getsize(path) > max_bytes:
+                continue
+            yield path
+
+
+def read_source(path: str) -> Tuple[str, str]:
+    """File text as open() in text mode would give it, and its raw-bytes hash
+
+    Resuming compares the hash against the file on disk, so it is taken
+    over the bytes before decoding and newline translation.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    text = data.decode("utf-8", errors="replace")
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text, hashlib.sha256(data).hexdigest()
+
+
+def load_checkpoint(output: str) -> Dict[str, str]:
+    """Map path -> content hash for files already analyzed successfully"""
+    done = {}
+    if not os.path.exists(output):
+        return done
+    with open(output, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A crash mid-write leaves a partial last line; redo that file
+                continue
+            if record.get("status") == "ok":
+                done[record["path"]] = record["sha256"]
+    return done
+
+
+def analyze_file(
+    path: str,
+    options: List[str],
+    target_language: Optional[str],
+    api_key: str,
+    model: str,
+    separate: bool,
+) -> Dict[str, object]:
+    """Run local analyzers and the AI analysis for one file"""
+    started = time.perf_counter()
+    code, digest = read_source(path)
+    language = language_for_path(path)
+    local = run_local_analysis(code, language, options)
+    sections = build_sections(code, options, target_language, local)
+
+    record = {
+        "path": path,
+        "language": language,
+        "sha256": digest,
+        "model": model,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+    }
+    if local.complexity is not None:
+        record["complexity"] = metrics_table(local.complexity)
+    if local.findings is not None:
+        record["security_findings"] = [f._asdict() for f in local.findings]
+
+    with action_scope("Batch"):
+        if separate and len(sections) > 1:
+            results = dict(
+                iter_code_analyses(
+                    section_tasks(sections), code, api_key, model, language=language
+                )
+            )
+            record["sections"] = {title: results[title] for title in sections}
+            failed = [t for t, text in results.items() if is_error_response(text)]
+        elif sections:
+            analysis = analyze_code(
+                combined_task(sections), code, api_key, model, language=language
+            )
+            record["analysis"] = analysis
+            failed = ["analysis"] if is_error_response(analysis) else []
+        else:
+            failed = []
+
+    record["status"] = "error" if failed else "ok"
+    record["duration_s"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def run_batch(args: argparse.Namespace) -> int:
+    """Analyze every matching file, streaming records to the output JSONL"""
+    if not args.resume and os.path.exists(args.output):
+        os.remove(args.output)
+    done = load_checkpoint(args.output)
+
+    pending = []
+    skipped = 0
+    for path in iter_source_files(args.directory, args.languages, args.max_bytes):
+        if path in done and read_source(path)[1] == done[path]:
+            skipped += 1
+            continue
+        pending.append(path)
+
+    total = len(pending)
+    print(
+        f"{total} files to analyze ({skipped} already done) with {args.workers} workers",
+        file=sys.stderr,
+    )
+    if not total:
+        return 0
+
+    set_pinned(not args.auto_route)
+    write_lock = threading.Lock()
+    started = time.perf_counter()
+    completed = failures = 0
+    with open(args.output, "a", encoding="utf-8") as out, ThreadPoolExecutor(
+        max_workers=args.workers, thread_name_prefix="batch-file"
+    ) as executor:
+        futures = {
+            executor.submit(
+                contextvars.copy_context().run,
+                analyze_file,
+                path,
+                args.options,
+                args.convert_to,
+                args.api_key,
+                args.model,
+                args.separate,
+            ): path
+            for path in pending
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                record = {"path": path, "status": "error", "error": str(e)}
+
+            with write_lock:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+
+            completed += 1
+            failures += record["status"] != "ok"
+            elapsed = time.perf_counter() - started
+            print(
+                f"[{completed}/{total}] {record['status']:5} {path} "
+                f"({completed / elapsed * 60:.1f} files/min)",
+                file=sys.stderr,
+            )
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Done: {completed - failures} ok, {failures} failed in {elapsed:.1f}s "
+        f"({completed / elapsed * 60:.1f} files/min)",
+        file=sys.stderr,
+    )
+    return 1 if failures else 0
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run AI Coding Companion analysis over a directory"
+    )
+    parser.add_argument("directory", help="Directory to analyze")
+    parser.add_argument(
+        "--output", default="analysis_results.jsonl", help="JSONL results file"
+    )
+    parser.add_argument(
+        "--options",
+        nargs="+",
+        choices=[name for name in ANALYSIS_OPTIONS if name != "convert_language"],
+        default=["time_complexity", "security_scan", "optimize_code"],
+        help="Analysis options, as in the Process Code panel",
+    )
+    parser.add_argument("--convert-to", help="Target language for code conversion")
+    parser.add_argument("--model", choices=MODELS, default="GPT-3.5-Turbo")
+    parser.add_argument(
+        "--api-key", help="API key (defaults to OPENAI_API_KEY or GOOGLE_API_KEY)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=PERFORMANCE_CONFIG["parallel_processing"]["max_workers"],
+        help="Files analyzed concurrently",
+    )
+    parser.add_argument(
+        "--languages",
+        nargs="+",
+        choices=list(SUPPORTED_LANGUAGES),
+        help="Only analyze these languages",
+    )
+    parser.add_argument(
+        "--max-bytes", type=int, default=1_000_000, help="Skip larger files"
+    )
+    parser.add_argument(
+        "--separate",
+        action="store_true",
+        help="Send each option as its own request instead of one combined prompt",
+    )
+    parser.add_argument(
+        "--auto-route",
+        action="store_true",
+        help="Fail over to a healthier model from the same provider when --model keeps erroring",
+    )
+    parser.add_argument(
+        "--no-resume",
+        dest="resume",
+        action="store_false",
+        help="Start over instead of skipping files already in the output",
+    )
+    args = parser.parse_args(argv)
+
+    if args.languages:
+        args.languages = set(args.languages)
+    if not args.api_key:
+        env_var = "GOOGLE_API_KEY" if "Gemini" in args.model else "OPENAI_API_KEY"
+        args.api_key = os.getenv(env_var)
+        if not args.api_key:
+            parser.error(f"--api-key or {env_var} is required")
+    return args
+
+
+def main(argv: List[str] = None) -> int:
+    return run_batch(parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
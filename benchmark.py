@@ -0,0 +1,365 @@
+"""
+Benchmark Suite
+===============
+
+Reproducible benchmarks for the ``helper_ai.get_ai_response`` request path.
+
+The provider SDK clients are replaced by in-process fakes backed by
+``mock_backend.MockBackend``. Everything else runs as in production:
+client pooling, request building, scheduling and response handling. With
+the default zero mock latency the numbers show our own overhead per call.
+Pass ``--latency-ms`` to add simulated model time.
+
+For each path (OpenAI, Gemini and the OpenAI error path) the suite reports:
+
+- p50/p95/p99 latency of sequential calls
+- calls per second at each concurrency level
+- peak traced allocation per call and bytes retained after the run
+
+Results can be saved as a baseline and compared on later runs. A
+regression beyond the tolerance makes the process exit non-zero::
+
+    python benchmark.py --save-baseline
+    python benchmark.py --compare            # exits 1 on regression
+"""
+
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List
+
+import helper_ai
+from client_pool import ClientPool
+from config import DEBUG_CONFIG
+from mock_backend import MockBackend
+from request_scheduler import RequestScheduler
+from response_cache import ResponseCache
+from single_flight import SingleFlight
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+BENCH_API_KEY = "benchmark-key"
+
+# path name -> (model name, whether the fake provider fails every call)
+PATHS = {
+    "openai": ("GPT-3.5-Turbo", False),
+    "gemini": ("Gemini Pro", False),
+    "openai_error": ("GPT-3.5-Turbo", True),
+}
+
+# metric -> True when higher is better
+COMPARED_METRICS = {
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "alloc_peak_kib": False,
+    "calls_per_second": True,
+}
+
+
+class BenchmarkProviderError(Exception):
+    """Non-retryable failure raised by the fake clients on the error path"""
+
+    status_code = 400
+
+
+class _FakeOpenAIClient:
+    """Mimics the parts of ``openai.OpenAI`` used by helper_ai"""
+
+    def __init__(self, backend: MockBackend, fail: bool):
+        self._backend = backend
+        self._fail = fail
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, stream=False, timeout=None, **kwargs):
+        if self._fail:
+            raise BenchmarkProviderError("Invalid request (benchmark)")
+        prompt = messages[-1]["content"]
+        if stream:
+            return (
+                SimpleNamespace(
+                    choices=[SimpleNamespace(delta=SimpleNamespace(content=token))]
+                )
+                for token in self._backend.stream(prompt, model, timeout)
+            )
+        text = self._backend.complete(prompt, model, timeout)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text))]
+        )
+
+    def close(self) -> None:
+        pass
+
+
+def _fake_gemini_response(text: str) -> SimpleNamespace:
+    part = SimpleNamespace(text=text)
+    return SimpleNamespace(
+        candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))]
+    )
+
+
+class _FakeGeminiClient:
+    """Mimics the parts of ``GenerativeServiceClient`` used by helper_ai"""
+
+    def __init__(self, backend: MockBackend, fail: bool):
+        self._backend = backend
+        self._fail = fail
+
+    def _prompt(self, request) -> str:
+        if self._fail:
+            raise BenchmarkProviderError("Invalid request (benchmark)")
+        return request["contents"][-1]["parts"][-1]["text"]
+
+    def generate_content(self, request, timeout=None):
+        text = self._backend.complete(self._prompt(request), None, timeout)
+        return _fake_gemini_response(text)
+
+    def stream_generate_content(self, request, timeout=None):
+        return (
+            _fake_gemini_response(token)
+            for token in self._backend.stream(self._prompt(request), None, timeout)
+        )
+
+
+@contextmanager
+def benchmark_environment(backend: MockBackend, fail: bool) -> Iterator[None]:
+    """Swap provider clients for fakes and isolate shared state for one run"""
+    originals = {
+        name: getattr(helper_ai, name)
+        for name in (
+            "_build_openai_client",
+            "_close_openai_client",
+            "_build_gemini_client",
+            "_close_gemini_client",
+            "client_pool",
+            "response_cache",
+            "request_scheduler",
+            "single_flight",
+        )
+    }
+    mock_setting = DEBUG_CONFIG["mock_ai_responses"]
+
+    helper_ai._build_openai_client = lambda api_key: _FakeOpenAIClient(backend, fail)
+    helper_ai._close_openai_client = lambda client: None
+    helper_ai._build_gemini_client = lambda api_key: _FakeGeminiClient(backend, fail)
+    helper_ai._close_gemini_client = lambda client: None
+    helper_ai.client_pool = ClientPool()
+    # Every call must reach the provider path, and the limiter must not
+    # throttle the benchmark itself
+    helper_ai.response_cache = ResponseCache(max_bytes=0, ttl=0, enabled=False)
+    helper_ai.single_flight = SingleFlight(enabled=False)
+    helper_ai.request_scheduler = RequestScheduler(
+        per_minute=10**9,
+        per_hour=10**9,
+        retry_attempts=0,
+        attempt_timeout=60,
+        deadline=60,
+    )
+    DEBUG_CONFIG["mock_ai_responses"] = False
+    try:
+        yield
+    finally:
+        helper_ai.client_pool.clear()
+        for name, value in originals.items():
+            setattr(helper_ai, name, value)
+        DEBUG_CONFIG["mock_ai_responses"] = mock_setting
+
+
+def _prompt(i: int) -> str:
+    return f"Explain what this function does:\n\ndef f{i}(x):\n    return x * {i}\n"
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    index = min(
+        len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1)))
+    )
+    return sorted_values[index]
+
+
+def measure_latency(model: str, iterations: int) -> Dict[str, float]:
+    """Sequential calls; percentiles in milliseconds"""
+    timings = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        helper_ai.get_ai_response(_prompt(i), BENCH_API_KEY, model)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "p50_ms": round(_percentile(timings, 50), 4),
+        "p95_ms": round(_percentile(timings, 95), 4),
+        "p99_ms": round(_percentile(timings, 99), 4),
+        "mean_ms": round(statistics.fmean(timings), 4),
+    }
+
+
+def measure_throughput(model: str, iterations: int, concurrency: int) -> float:
+    """Calls per second with ``concurrency`` threads sharing the work"""
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        started = time.perf_counter()
+        list(
+            executor.map(
+                lambda i: helper_ai.get_ai_response(_prompt(i), BENCH_API_KEY, model),
+                range(iterations),
+            )
+        )
+        elapsed = time.perf_counter() - started
+    return round(iterations / elapsed, 1)
+
+
+def measure_allocations(model: str, iterations: int) -> Dict[str, float]:
+    """Peak traced allocation per call and bytes still held after the run"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        peaks = []
+        baseline, _ = tracemalloc.get_traced_memory()
+        for i in range(iterations):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            helper_ai.get_ai_response(_prompt(i), BENCH_API_KEY, model)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+        gc.collect()
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "alloc_peak_kib": round(statistics.median(peaks) / 1024, 2),
+        "retained_bytes_per_call": round((retained - baseline) / iterations, 1),
+    }
+
+
+def run_suite(
+    paths: List[str],
+    iterations: int,
+    concurrency: List[int],
+    backend: MockBackend,
+    warmup: int = 20,
+) -> Dict[str, Any]:
+    """Run every benchmark for each request path"""
+    results = {}
+    for name in paths:
+        model, fail = PATHS[name]
+        with benchmark_environment(backend, fail):
+            # Warm up the client pool, imports and code caches
+            for i in range(warmup):
+                helper_ai.get_ai_response(_prompt(i), BENCH_API_KEY, model)
+            result = measure_latency(model, iterations)
+            result.update(measure_allocations(model, max(1, iterations // 10)))
+            result["throughput"] = {
+                str(level): measure_throughput(model, iterations, level)
+                for level in concurrency
+            }
+            result["calls_per_second"] = result["throughput"][str(concurrency[0])]
+        results[name] = result
+    return {
+        "python": sys.version.split()[0],
+        "iterations": iterations,
+        "mock_latency_ms": backend.latency_ms,
+        "results": results,
+    }
+
+
+def compare(
+    current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """List metrics that regressed by more than ``tolerance`` (a fraction)"""
+    regressions = []
+    for path, metrics in current["results"].items():
+        previous = baseline.get("results", {}).get(path)
+        if not previous:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = previous.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{path}.{metric}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def format_results(report: Dict[str, Any]) -> str:
+    """Render results as a plain-text table"""
+    levels = list(next(iter(report["results"].values()))["throughput"])
+    header = (
+        f"{'path':<14}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'alloc KiB':>11}"
+        + "".join(f"{'c=' + level + ' /s':>12}" for level in levels)
+    )
+    lines = [header, "-" * len(header)]
+    for path, r in report["results"].items():
+        lines.append(
+            f"{path:<14}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}"
+            f"{r['alloc_peak_kib']:>11.2f}"
+            + "".join(f"{r['throughput'][level]:>12.1f}" for level in levels)
+        )
+    return "\n".join(lines)
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the helper_ai request path")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Thread counts"
+    )
+    parser.add_argument("--paths", nargs="+", choices=list(PATHS), default=list(PATHS))
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=0,
+        help="Simulated model latency (0 measures overhead only)",
+    )
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="Write results to the baseline"
+    )
+    parser.add_argument(
+        "--compare", action="store_true", help="Fail if results regress vs. baseline"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="Allowed regression (fraction)"
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    backend = MockBackend(
+        latency_ms=args.latency_ms, latency_sigma=0, tokens_per_second=0, seed=0
+    )
+    report = run_suite(args.paths, args.iterations, args.concurrency, backend)
+    print(json.dumps(report, indent=2) if args.json else format_results(report))
+
+    status = 0
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}", file=sys.stderr)
+            return 2
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions vs. baseline:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            status = 1
+        else:
+            print(f"No regressions beyond {args.tolerance:.0%}", file=sys.stderr)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,457 @@
+"""
+Call Metrics
+============
+
+Per-call instrumentation for AI requests. Each call made through helper_ai
+records:
+
+- wall time and time to first token
+- prompt and completion tokens
+- cost, priced from ``AI_MODELS[model]["cost_per_token"]`` (USD per 1K tokens)
+- model, action and outcome
+
+Actions are set by callers with ``action_scope("Find Bugs")``, which
+applies to every call made inside it, including calls fanned out to worker
+threads. Outcomes are ``ok``, ``error``, ``cache_hit``, ``coalesced``
+(shared the result of an identical call already running) and
+``cancelled`` (a stream abandoned part way through).
+
+Records are aggregated in process and exposed three ways:
+
+- ``to_prometheus()``, for Prometheus text format
+- a textfile written every ``export_interval`` seconds when
+  ``AI_METRICS_FILE`` is set
+- a ``/metrics`` HTTP endpoint when ``AI_METRICS_PORT`` is set
+"""
+
+import atexit
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import AI_MODELS, PERFORMANCE_CONFIG
+
+DEFAULT_ACTION = "Other"
+
+# Upper bounds, in seconds, of the wall-time histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf"))
+
+_current_action = contextvars.ContextVar("ai_action", default=DEFAULT_ACTION)
+_current_call = contextvars.ContextVar("ai_call", default=None)
+
+
+@contextmanager
+def action_scope(action: str) -> Iterator[None]:
+    """Attribute AI calls made inside this block to a user-facing action"""
+    token = _current_action.set(action)
+    try:
+        yield
+    finally:
+        _current_action.reset(token)
+
+
+def current_action() -> str:
+    return _current_action.get()
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+class CallRecord:
+    """Measurements for one AI call, filled in while it runs"""
+
+    __slots__ = (
+        "action",
+        "model",
+        "started",
+        "wall_time",
+        "ttft",
+        "prompt_tokens",
+        "completion_tokens",
+        "cost",
+        "outcome",
+        "timestamp",
+    )
+
+    def __init__(self, action: str, model: str):
+        self.action = action
+        self.model = model
+        self.started = time.perf_counter()
+        self.wall_time = 0.0
+        self.ttft: Optional[float] = None
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.cost = 0.0
+        self.outcome = "ok"
+        self.timestamp = time.time()
+
+    def first_token(self) -> None:
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+
+    def set_response(self, text: str, error: bool) -> None:
+        """Record the outcome, estimating completion tokens if none were reported"""
+        if error:
+            self.outcome = "error"
+        if self.completion_tokens is None:
+            self.completion_tokens = 0 if error else estimate_tokens(text)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class _Aggregate:
+    """Running totals for one (action, model, outcome) series"""
+
+    __slots__ = (
+        "count",
+        "wall_time",
+        "ttft",
+        "ttft_count",
+        "prompt_tokens",
+        "completion_tokens",
+        "cost",
+        "buckets",
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.wall_time = 0.0
+        self.ttft = 0.0
+        self.ttft_count = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def add(self, record: CallRecord) -> None:
+        self.count += 1
+        self.wall_time += record.wall_time
+        if record.ttft is not None:
+            self.ttft += record.ttft
+            self.ttft_count += 1
+        self.prompt_tokens += record.prompt_tokens or 0
+        self.completion_tokens += record.completion_tokens or 0
+        self.cost += record.cost
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if record.wall_time <= bound:
+                self.buckets[i] += 1
+                break
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class CallMetrics:
+    """Thread-safe in-process aggregation of AI call records"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        recent_calls: int = 200,
+        export_file: Optional[str] = None,
+        export_interval: float = 5,
+    ):
+        self.enabled = enabled
+        self.export_file = export_file
+        self.export_interval = export_interval
+        self._lock = threading.Lock()
+        self._series: Dict[tuple, _Aggregate] = {}
+        self._recent = deque(maxlen=recent_calls)
+        self._last_export = 0.0
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any] = None) -> "CallMetrics":
+        config = config or PERFORMANCE_CONFIG["metrics"]
+        return cls(
+            enabled=config["enabled"],
+            recent_calls=config["recent_calls"],
+            export_file=config["export_file"],
+            export_interval=config["export_interval"],
+        )
+
+    @contextmanager
+    def track(self, model: str, prompt: str) -> Iterator[CallRecord]:
+        """Time one call; the body sets ``outcome`` and may report usage"""
+        record = CallRecord(current_action(), model)
+        # Restore rather than reset(): streams may be finished from another
+        # context than the one they started in
+        previous = _current_call.get()
+        _current_call.set(record)
+        try:
+            yield record
+        except GeneratorExit:
+            # The consumer stopped reading a stream part way through
+            record.outcome = "cancelled"
+            raise
+        except BaseException:
+            record.outcome = "error"
+            raise
+        finally:
+            _current_call.set(previous)
+            record.wall_time = time.perf_counter() - record.started
+            if record.prompt_tokens is None:
+                record.prompt_tokens = estimate_tokens(prompt)
+            if record.outcome not in ("cache_hit", "coalesced"):
+                price = AI_MODELS.get(model, {}).get("cost_per_token", 0)
+                total = record.prompt_tokens + (record.completion_tokens or 0)
+                record.cost = total / 1000 * price
+            self.record(record)
+
+    def record(self, record: CallRecord) -> None:
+        if not self.enabled:
+            return
+        key = (record.action, record.model, record.outcome)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Aggregate()
+            series.add(record)
+            self._recent.append(record)
+            export = (
+                self.export_file is not None
+                and time.monotonic() - self._last_export >= self.export_interval
+            )
+            if export:
+                self._last_export = time.monotonic()
+        if export:
+            self.write_prometheus(self.export_file)
+
+    def recent(self) -> List[Dict[str, Any]]:
+        """Most recent call records, newest first"""
+        with self._lock:
+            return [record.as_dict() for record in reversed(self._recent)]
+
+    def model_health(self) -> Dict[str, Dict[str, float]]:
+        """Live latency and error rate per model over the recent calls
+
+        Cache hits, coalesced calls and cancelled streams say nothing about
+        the provider and are left out.
+        """
+        with self._lock:
+            records = [r for r in self._recent if r.outcome in ("ok", "error")]
+        health: Dict[str, Dict[str, float]] = {}
+        for record in records:
+            entry = health.setdefault(
+                record.model, {"samples": 0, "errors": 0, "latency": 0.0}
+            )
+            entry["samples"] += 1
+            if record.outcome == "error":
+                entry["errors"] += 1
+            else:
+                entry["latency"] += record.wall_time
+        for entry in health.values():
+            ok = entry["samples"] - entry["errors"]
+            entry["latency"] = entry["latency"] / ok if ok else None
+            entry["error_rate"] = entry["errors"] / entry["samples"]
+        return health
+
+    def summary_rows(self) -> List[Dict[str, Any]]:
+        """Per action and model totals, costliest first, for display"""
+        rows: Dict[tuple, Dict[str, Any]] = {}
+        with self._lock:
+            for (action, model, outcome), series in self._series.items():
+                row = rows.setdefault(
+                    (action, model),
+                    {
+                        "action": action,
+                        "model": model,
+                        "calls": 0,
+                        "errors": 0,
+                        "cache_hits": 0,
+                        "coalesced": 0,
+                        "wall_time": 0.0,
+                        "ttft": 0.0,
+                        "ttft_count": 0,
+                        "tokens": 0,
+                        "cost": 0.0,
+                    },
+                )
+                row["calls"] += series.count
+                if outcome == "error":
+                    row["errors"] += series.count
+                elif outcome == "cache_hit":
+                    row["cache_hits"] += series.count
+                elif outcome == "coalesced":
+                    row["coalesced"] += series.count
+                row["wall_time"] += series.wall_time
+                row["ttft"] += series.ttft
+                row["ttft_count"] += series.ttft_count
+                row["tokens"] += series.prompt_tokens + series.completion_tokens
+                row["cost"] += series.cost
+
+        result = []
+        for row in rows.values():
+            ttft, ttft_count = row.pop("ttft"), row.pop("ttft_count")
+            row["avg_latency_s"] = round(row.pop("wall_time") / row["calls"], 3)
+            row["avg_ttft_s"] = round(ttft / ttft_count, 3) if ttft_count else None
+            row["cost"] = round(row["cost"], 5)
+            result.append(row)
+        return sorted(result, key=lambda r: (-r["cost"], -r["calls"]))
+
+    def totals(self) -> Dict[str, float]:
+        with self._lock:
+            series = list(self._series.values())
+        return {
+            "calls": sum(s.count for s in series),
+            "tokens": sum(s.prompt_tokens + s.completion_tokens for s in series),
+            "cost": round(sum(s.cost for s in series), 5),
+            "wall_time": round(sum(s.wall_time for s in series), 3),
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+            self._recent.clear()
+
+    def to_prometheus(self) -> str:
+        """Render all series in the Prometheus text exposition format"""
+        with self._lock:
+            items = sorted(self._series.items())
+            snapshot = [
+                (
+                    key,
+                    list(s.buckets),
+                    s.count,
+                    s.wall_time,
+                    s.ttft,
+                    s.ttft_count,
+                    s.prompt_tokens,
+                    s.completion_tokens,
+                    s.cost,
+                )
+                for key, s in items
+            ]
+
+        lines = []
+
+        def header(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def labels(key: tuple, extra: str = "") -> str:
+            action, model, outcome = key
+            text = (
+                f'action="{_escape(action)}",model="{_escape(model)}",'
+                f'outcome="{_escape(outcome)}"'
+            )
+            return "{" + text + extra + "}"
+
+        header("ai_requests_total", "counter", "AI calls by action, model and outcome")
+        for key, _, count, *_ in snapshot:
+            lines.append(f"ai_requests_total{labels(key)} {count}")
+
+        header("ai_request_duration_seconds", "histogram", "Wall time per AI call")
+        for key, buckets, count, wall_time, *_ in snapshot:
+            cumulative = 0
+            for bound, hits in zip(LATENCY_BUCKETS, buckets):
+                cumulative += hits
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                bucket_labels = labels(key, ',le="' + le + '"')
+                lines.append(
+                    f"ai_request_duration_seconds_bucket{bucket_labels} {cumulative}"
+                )
+            lines.append(f"ai_request_duration_seconds_sum{labels(key)} {wall_time}")
+            lines.append(f"ai_request_duration_seconds_count{labels(key)} {count}")
+
+        header(
+            "ai_time_to_first_token_seconds",
+            "summary",
+            "Time to first streamed token",
+        )
+        for key, _, _, _, ttft, ttft_count, *_ in snapshot:
+            if ttft_count:
+                lines.append(f"ai_time_to_first_token_seconds_sum{labels(key)} {ttft}")
+                lines.append(
+                    f"ai_time_to_first_token_seconds_count{labels(key)} {ttft_count}"
+                )
+
+        header("ai_tokens_total", "counter", "Prompt and completion tokens")
+        for key, *_, prompt_tokens, completion_tokens, _ in snapshot:
+            for kind, value in (
+                ("prompt", prompt_tokens),
+                ("completion", completion_tokens),
+            ):
+                kind_labels = labels(key, ',kind="' + kind + '"')
+                lines.append(f"ai_tokens_total{kind_labels} {value}")
+
+        header("ai_cost_usd_total", "counter", "Estimated spend in USD")
+        for key, *_, cost in snapshot:
+            lines.append(f"ai_cost_usd_total{labels(key)} {cost:.6f}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """Atomically write the metrics for a node_exporter textfile collector"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+def record_usage(
+    prompt_tokens: Optional[int], completion_tokens: Optional[int]
+) -> None:
+    """Report provider token counts for the call currently being tracked"""
+    record = _current_call.get()
+    if record is None:
+        return
+    if prompt_tokens is not None:
+        record.prompt_tokens = prompt_tokens
+    if completion_tokens is not None:
+        record.completion_tokens = completion_tokens
+
+
+def _make_metrics_handler(metrics: CallMetrics):
+    # http.server pulls in email and ssl; import it only when serving
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return MetricsHandler
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> Any:
+    """Serve ``/metrics`` on a background thread; later calls are no-ops"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            from http.server import ThreadingHTTPServer
+
+            _server = ThreadingHTTPServer(
+                (host, port), _make_metrics_handler(call_metrics)
+            )
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server
+
+
+# Shared metrics registry used by helper_ai
+call_metrics = CallMetrics.from_config()
+if call_metrics.export_file:
+    # Flush the last interval's calls, e.g. at the end of a batch run
+    atexit.register(call_metrics.write_prometheus, call_metrics.export_file)
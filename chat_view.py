@@ -0,0 +1,70 @@
+"""
+Chat View
+=========
+
+Keeps the cost of drawing the chat flat as a conversation grows. Each
+rerun draws only the newest ``page_size`` messages, and older pages are
+loaded on request. The markdown for each message is prepared once and
+cached by message id, so reruns neither re-read history spilled to disk
+nor re-process message text. Settings live in
+``PERFORMANCE_CONFIG["chat_rendering"]``.
+"""
+
+from collections import OrderedDict
+from typing import List, Tuple
+
+from config import PERFORMANCE_CONFIG
+from session_history import HistoryRecord, SessionHistory
+
+RENDER_CONFIG = PERFORMANCE_CONFIG["chat_rendering"]
+
+
+def prepare_markdown(text: str) -> str:
+    """Message text ready for st.markdown
+
+    A reply cut off mid code block would otherwise leave its fence open and
+    turn every message drawn after it into code.
+    """
+    fences = sum(1 for line in text.splitlines() if line.lstrip().startswith("```"))
+    if fences % 2:
+        text += "\n```"
+    return text
+
+
+class ChatWindow:
+    """Paged view over a chat history with a per-message markdown cache"""
+
+    def __init__(self, page_size: int = 20, cache_entries: int = 200):
+        self.page_size = page_size
+        self.cache_entries = cache_entries
+        self.pages = 1
+        self._markdown: "OrderedDict[int, str]" = OrderedDict()
+
+    @classmethod
+    def from_config(cls) -> "ChatWindow":
+        return cls(RENDER_CONFIG["page_size"], RENDER_CONFIG["markdown_cache_entries"])
+
+    def visible(self, history: SessionHistory) -> Tuple[List[HistoryRecord], int]:
+        """Messages to draw, oldest first, and how many older ones are hidden"""
+        records = history.recent(self.pages * self.page_size)
+        return records, len(history) - len(records)
+
+    def show_older(self) -> None:
+        self.pages += 1
+
+    def reset(self) -> None:
+        """Back to the newest page with an empty cache (e.g. after clearing chat)"""
+        self.pages = 1
+        self._markdown.clear()
+
+    def markdown(self, record: HistoryRecord) -> str:
+        text = self._markdown.get(record.id)
+        if text is not None:
+            self._markdown.move_to_end(record.id)
+            return text
+
+        text = prepare_markdown(record.content)
+        self._markdown[record.id] = text
+        while len(self._markdown) > self.cache_entries:
+            self._markdown.popitem(last=False)
+        return text
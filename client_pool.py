@@ -0,0 +1,155 @@
+"""
+Provider Client Pool
+====================
+
+Process-wide, thread-safe pool of AI provider clients keyed by provider
+and a SHA-256 digest of the API key. Clients are reused across calls so HTTP/gRPC
+connections stay alive between chat messages, quick actions and
+"Process Code" runs. The pool is bounded in size and drops clients that
+have been idle for too long whenever a lease is returned.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_MAX_CLIENTS = 16
+DEFAULT_IDLE_TIMEOUT = 300  # seconds
+
+
+class _PooledClient:
+    """A pooled client together with its bookkeeping"""
+
+    __slots__ = ("client", "closer", "last_used", "in_use")
+
+    def __init__(self, client: Any, closer: Optional[Callable[[Any], None]]):
+        self.client = client
+        self.closer = closer
+        self.last_used = time.monotonic()
+        self.in_use = 0
+
+
+class ClientPool:
+    """Bounded LRU pool of provider clients with idle eviction"""
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_MAX_CLIENTS,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+    ):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], _PooledClient]" = OrderedDict()
+
+    @contextmanager
+    def lease(
+        self,
+        provider: str,
+        api_key: str,
+        factory: Callable[[str], Any],
+        closer: Optional[Callable[[Any], None]] = None,
+    ) -> Iterator[Any]:
+        """Borrow the client for (provider, api_key), creating it on first use"""
+        # Index by digest so raw keys are not kept as dict keys
+        key = (provider, hashlib.sha256(api_key.encode("utf-8")).hexdigest())
+        entry = self._checkout(key)
+        if entry is None:
+            # Build outside the lock so one slow constructor does not
+            # block every other session.
+            fresh = _PooledClient(factory(api_key), closer)
+            entry = self._insert(key, fresh)
+
+        try:
+            yield entry.client
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.monotonic()
+                evicted = self._collect_idle(entry.last_used)
+            self._close_all(evicted)
+
+    def evict_idle(self) -> int:
+        """Close clients idle for longer than ``idle_timeout``"""
+        with self._lock:
+            evicted = self._collect_idle(time.monotonic())
+        self._close_all(evicted)
+        return len(evicted)
+
+    def clear(self) -> None:
+        """Close and forget every client that is not currently in use"""
+        with self._lock:
+            keys = [k for k, e in self._entries.items() if not e.in_use]
+            evicted = [self._entries.pop(k) for k in keys]
+        self._close_all(evicted)
+
+    def stats(self) -> Dict[str, int]:
+        """Return current pool size and in-use count"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "in_use": sum(1 for e in self._entries.values() if e.in_use),
+                "max_size": self.max_size,
+            }
+
+    def _checkout(self, key: Tuple[str, str]) -> Optional[_PooledClient]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.in_use += 1
+                self._entries.move_to_end(key)
+            return entry
+
+    def _insert(self, key: Tuple[str, str], fresh: _PooledClient) -> _PooledClient:
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                # Another thread won the race; keep theirs.
+                existing.in_use += 1
+                self._entries.move_to_end(key)
+                evicted = [fresh]
+                entry = existing
+            else:
+                fresh.in_use = 1
+                self._entries[key] = fresh
+                evicted = self._collect_idle(time.monotonic())
+                evicted.extend(self._collect_overflow())
+                entry = fresh
+        self._close_all(evicted)
+        return entry
+
+    def _collect_idle(self, now: float) -> List[_PooledClient]:
+        expired = [
+            k
+            for k, e in self._entries.items()
+            if not e.in_use and now - e.last_used > self.idle_timeout
+        ]
+        return [self._entries.pop(k) for k in expired]
+
+    def _collect_overflow(self) -> List[_PooledClient]:
+        # Evict least recently used clients that nobody is holding; if all
+        # of them are busy the pool is allowed to overshoot temporarily.
+        evicted = []
+        for k in list(self._entries):
+            if len(self._entries) <= self.max_size:
+                break
+            if not self._entries[k].in_use:
+                evicted.append(self._entries.pop(k))
+        return evicted
+
+    @staticmethod
+    def _close_all(entries: List[_PooledClient]) -> None:
+        for entry in entries:
+            if entry.closer is None:
+                continue
+            try:
+                entry.closer(entry.client)
+            except Exception:
+                pass
+
+
+# Shared pool used by helper_ai
+client_pool = ClientPool()
@@ -0,0 +1,530 @@
+"""
+Code Chunker
+============
+
+Splits large source files along function/class boundaries into
+token-budgeted chunks and runs map-reduce analysis over them: every chunk
+is analyzed concurrently (map), then the partial answers are merged into a
+single report (reduce). Small inputs skip all of this and go out as one
+request. Code is minified (see code_minifier) before it is split or sent.
+"""
+
+import ast
+import re
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from call_metrics import estimate_tokens
+from code_fingerprint import cache_prompt
+from code_minifier import prompt_code
+from config import PERFORMANCE_CONFIG
+from helper_ai import (
+    get_ai_response,
+    is_error_response,
+    iter_ai_responses_parallel,
+    stream_ai_response,
+)
+from request_scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+# Top-level declarations that start a new unit in non-Python sources
+DECLARATION_RE = re.compile(
+    r"^(?:export\s+)?(?:default\s+)?(?:pub(?:\(\w+\))?\s+)?(?:async\s+)?"
+    r"(?:def|class|function|fn|func|impl|struct|enum|trait|interface|type)\b"
+    r"|^\s{0,4}(?:(?:public|private|protected|static|final|abstract)\s+)+[\w<>\[\],\s]*?\w+\s*\("
+)
+
+MAP_TEMPLATE = (
+    "You are reviewing part {index} of {total} of a larger file "
+    "(lines {start}-{end}). Answer only for this part; the parts will be merged later.\n\n"
+    "Task: {task}\n\nCode:\n{code}"
+)
+
+REDUCE_TEMPLATE = (
+    "The following are partial analyses of consecutive parts of one file. "
+    "Merge them into a single coherent answer to the task, removing duplicates "
+    "and keeping line references.\n\nTask: {task}\n\n{partials}"
+)
+
+
+class CodeChunk(NamedTuple):
+    """A contiguous slice of source code (1-based, inclusive line numbers)"""
+
+    start_line: int
+    end_line: int
+    text: str
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+def _python_boundaries(code: str) -> Optional[List[int]]:
+    """Start lines of top-level Python statements, or None if it does not parse"""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+
+    starts = []
+    for node in tree.body:
+        decorators = getattr(node, "decorator_list", [])
+        starts.append(min([node.lineno] + [d.lineno for d in decorators]))
+    return starts
+
+
+def _python_member_boundaries(code: str, start: int, end: int) -> List[int]:
+    """Start lines of methods inside a class spanning [start, end]"""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return []
+
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and start <= node.lineno <= end:
+            return [
+                min(
+                    [child.lineno]
+                    + [d.lineno for d in getattr(child, "decorator_list", [])]
+                )
+                for child in node.body
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))
+            ]
+    return []
+
+
+def _generic_boundaries(lines: List[str]) -> List[int]:
+    """Start lines of unindented declarations in brace-style languages"""
+    return [i + 1 for i, line in enumerate(lines) if DECLARATION_RE.match(line)]
+
+
+def _units(lines: List[str], starts: List[int]) -> List[Tuple[int, int]]:
+    """Turn unit start lines into contiguous (start, end) spans covering the file"""
+    starts = sorted(set(s for s in starts if 1 < s <= len(lines)))
+    spans = []
+    current = 1
+    for start in starts:
+        spans.append((current, start - 1))
+        current = start
+    spans.append((current, len(lines)))
+    return spans
+
+
+def _split_oversized(
+    lines: List[str], start: int, end: int, max_tokens: int, code: str, is_python: bool
+) -> List[Tuple[int, int]]:
+    """Break a unit that exceeds the budget at methods, blank lines, then line windows"""
+    text = "\n".join(lines[start - 1 : end])
+    if estimate_tokens(text) <= max_tokens or start == end:
+        return [(start, end)]
+
+    inner = _python_member_boundaries(code, start, end) if is_python else []
+    if not inner:
+        inner = [i for i in range(start + 1, end + 1) if not lines[i - 1].strip()]
+
+    pieces = []
+    cursor = start
+    for boundary in sorted(b for b in inner if start < b <= end):
+        pieces.append((cursor, boundary - 1))
+        cursor = boundary
+    pieces.append((cursor, end))
+
+    if len(pieces) == 1:
+        # No natural boundary: fall back to fixed-size line windows
+        per_line = max(1, estimate_tokens(text) // (end - start + 1))
+        window = max(1, max_tokens // per_line)
+        return [(s, min(s + window - 1, end)) for s in range(start, end + 1, window)]
+
+    result = []
+    for piece_start, piece_end in pieces:
+        result.extend(
+            _split_oversized(lines, piece_start, piece_end, max_tokens, code, False)
+        )
+    return result
+
+
+def _python_unit_boundaries(code: str) -> Optional[List[int]]:
+    """Start lines of top-level definitions and of the statement runs between them"""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+
+    def start_of(node: ast.AST) -> int:
+        decorators = getattr(node, "decorator_list", [])
+        return min([node.lineno] + [d.lineno for d in decorators])
+
+    starts = []
+    previous_is_def = True
+    for node in tree.body:
+        is_def = isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+        if is_def or previous_is_def:
+            starts.append(start_of(node))
+        if isinstance(node, ast.ClassDef):
+            # Methods are units of their own; the class header and
+            # attributes stay together with the first one's preamble
+            starts.extend(
+                start_of(child)
+                for child in node.body
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))
+            )
+        previous_is_def = is_def
+    return starts
+
+
+def split_units(code: str, max_tokens: int = None) -> List[CodeChunk]:
+    """Split code into one chunk per function or method (no packing)
+
+    Statements between definitions (imports, constants, class headers) are
+    grouped into a single unit, and units over the budget are split as in
+    split_code.
+    """
+    if max_tokens is None:
+        max_tokens = PERFORMANCE_CONFIG["chunking"]["max_chunk_tokens"]
+
+    lines = code.splitlines()
+    if not lines:
+        return []
+
+    starts = _python_unit_boundaries(code)
+    is_python = starts is not None
+    if not is_python:
+        starts = _generic_boundaries(lines)
+
+    units = []
+    for start, end in _units(lines, starts):
+        for piece_start, piece_end in _split_oversized(
+            lines, start, end, max_tokens, code, is_python
+        ):
+            text = "\n".join(lines[piece_start - 1 : piece_end])
+            if text.strip():
+                units.append(CodeChunk(piece_start, piece_end, text))
+    return units
+
+
+def split_code(code: str, max_tokens: int = None) -> List[CodeChunk]:
+    """Split code into chunks along function/class boundaries within a token budget"""
+    if max_tokens is None:
+        max_tokens = PERFORMANCE_CONFIG["chunking"]["max_chunk_tokens"]
+
+    lines = code.splitlines()
+    if not lines:
+        return []
+
+    starts = _python_boundaries(code)
+    is_python = starts is not None
+    if not is_python:
+        starts = _generic_boundaries(lines)
+
+    spans = []
+    for start, end in _units(lines, starts):
+        spans.extend(_split_oversized(lines, start, end, max_tokens, code, is_python))
+
+    # Greedily pack consecutive units into chunks
+    chunks = []
+    chunk_start, chunk_tokens = None, 0
+    for start, end in spans:
+        unit_tokens = estimate_tokens("\n".join(lines[start - 1 : end]))
+        if chunk_start is not None and chunk_tokens + unit_tokens > max_tokens:
+            chunks.append(
+                CodeChunk(
+                    chunk_start,
+                    start - 1,
+                    "\n".join(lines[chunk_start - 1 : start - 1]),
+                )
+            )
+            chunk_start, chunk_tokens = None, 0
+        if chunk_start is None:
+            chunk_start = start
+        chunk_tokens += unit_tokens
+    chunks.append(
+        CodeChunk(chunk_start, len(lines), "\n".join(lines[chunk_start - 1 :]))
+    )
+    return chunks
+
+
+def _map_prompts(task: str, chunks: List[CodeChunk]) -> Dict[int, str]:
+    return {
+        i: MAP_TEMPLATE.format(
+            index=i + 1,
+            total=len(chunks),
+            start=chunk.start_line,
+            end=chunk.end_line,
+            task=task,
+            code=chunk.text,
+        )
+        for i, chunk in enumerate(chunks)
+    }
+
+
+def _with_context(prompt: str, context: str) -> str:
+    return f"{context}\n\n{prompt}" if context else prompt
+
+
+def _reduce_prompt(
+    task: str, partials: List[Tuple[CodeChunk, str]], context: str = ""
+) -> str:
+    sections = "\n\n".join(
+        f"### Lines {chunk.start_line}-{chunk.end_line}\n{text}"
+        for chunk, text in partials
+    )
+    return _with_context(REDUCE_TEMPLATE.format(task=task, partials=sections), context)
+
+
+def _reduce_groups(
+    partials: List[Tuple[CodeChunk, str]], max_tokens: int
+) -> List[List[Tuple[CodeChunk, str]]]:
+    """Group consecutive partial results so each reduce request fits the budget"""
+    groups, current, current_tokens = [], [], 0
+    for chunk, text in partials:
+        tokens = estimate_tokens(text)
+        if current and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append((chunk, text))
+        current_tokens += tokens
+    groups.append(current)
+    return groups
+
+
+def _map_phase(
+    task: str,
+    chunks: List[CodeChunk],
+    api_key: str,
+    model: str,
+    language: Optional[str],
+    priority: int,
+) -> List[Tuple[CodeChunk, str]]:
+    prompts = _map_prompts(task, chunks)
+    results = dict(
+        iter_ai_responses_parallel(
+            prompts,
+            api_key,
+            model,
+            priority,
+            # Fingerprint each chunk so reformatted code still hits the cache
+            cache_prompts={
+                i: cache_prompt(prompts[i], chunk.text, language)
+                for i, chunk in enumerate(chunks)
+            },
+        )
+    )
+    return [(chunk, results[i]) for i, chunk in enumerate(chunks)]
+
+
+def _split_failures(
+    partials: List[Tuple[CodeChunk, str]],
+) -> Tuple[List[Tuple[CodeChunk, str]], List[Tuple[CodeChunk, str]]]:
+    """Separate real partial analyses from provider error messages"""
+    ok, failed = [], []
+    for chunk, text in partials:
+        (failed if is_error_response(text) else ok).append((chunk, text))
+    return ok, failed
+
+
+def _failure_note(failed: List[Tuple[CodeChunk, str]]) -> str:
+    """Footnote naming the line ranges left out of a merged answer"""
+    if not failed:
+        return ""
+    ranges = "\n".join(
+        f"- Lines {chunk.start_line}-{chunk.end_line}: {text}" for chunk, text in failed
+    )
+    return f"\n\n⚠️ These parts could not be analyzed and are not covered:\n{ranges}"
+
+
+def _collapse_partials(
+    task: str,
+    partials: List[Tuple[CodeChunk, str]],
+    api_key: str,
+    model: str,
+    priority: int,
+) -> Tuple[List[Tuple[CodeChunk, str]], List[Tuple[CodeChunk, str]]]:
+    """Reduce partial results in parallel groups until they fit one final request
+
+    Returns the partials to reduce and the chunks whose map request
+    failed. Failed chunks are reported separately, never merged.
+    """
+    partials, failed = _split_failures(partials)
+    if not partials:
+        return [], failed
+    max_tokens = PERFORMANCE_CONFIG["chunking"]["max_reduce_tokens"]
+    groups = _reduce_groups(partials, max_tokens)
+    while len(groups) > 1:
+        merged = dict(
+            iter_ai_responses_parallel(
+                {i: _reduce_prompt(task, group) for i, group in enumerate(groups)},
+                api_key,
+                model,
+                priority,
+            )
+        )
+        partials = []
+        for i, group in enumerate(groups):
+            if is_error_response(merged[i]):
+                # Keep the group's partials rather than lose them
+                partials.extend(group)
+            else:
+                chunk = CodeChunk(group[0][0].start_line, group[-1][0].end_line, "")
+                partials.append((chunk, merged[i]))
+        next_groups = _reduce_groups(partials, max_tokens)
+        if len(next_groups) >= len(groups):
+            # Merged results did not shrink; stop rather than loop forever
+            break
+        groups = next_groups
+    return partials, failed
+
+
+def stream_code_analysis(
+    task: str,
+    code: str,
+    api_key: str,
+    model: str,
+    template: str = None,
+    language: str = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    context: str = "",
+) -> Iterator[str]:
+    """Stream an answer to task over code, using map-reduce for large inputs
+
+    ``template`` formats the single-request prompt for code that fits the
+    budget and receives ``task`` and ``code``. ``language`` selects how the
+    code is minified and normalized for cache keys. ``priority`` applies to
+    every request, map and reduce included. ``context`` (such as earlier
+    chat turns) is put before the single-request and final reduce prompts
+    only; map prompts carry just the task.
+    """
+    yield from _stream_analysis(
+        task,
+        prompt_code(code, language),
+        api_key,
+        model,
+        template,
+        language,
+        priority,
+        context,
+    )
+
+
+def _stream_analysis(
+    task: str,
+    code: str,
+    api_key: str,
+    model: str,
+    template: Optional[str],
+    language: Optional[str],
+    priority: int = PRIORITY_INTERACTIVE,
+    context: str = "",
+) -> Iterator[str]:
+    template = template or "{task}\n\nCode:\n{code}"
+    chunks = split_code(code)
+    if len(chunks) <= 1:
+        prompt = _with_context(template.format(task=task, code=code), context)
+        yield from stream_ai_response(
+            prompt, api_key, model, cache_prompt(prompt, code, language), priority
+        )
+        return
+
+    partials, failed = _collapse_partials(
+        task,
+        _map_phase(task, chunks, api_key, model, language, priority),
+        api_key,
+        model,
+        priority,
+    )
+    if not partials:
+        # Every part failed; pass the provider error on as the answer
+        yield failed[0][1] + _failure_note(failed)
+        return
+    yield from stream_ai_response(
+        _reduce_prompt(task, partials, context), api_key, model, priority=priority
+    )
+    if failed:
+        yield _failure_note(failed)
+
+
+def iter_code_analyses(
+    tasks: Dict[str, str],
+    code: str,
+    api_key: str,
+    model: str,
+    template: str = None,
+    language: str = None,
+    priority: int = PRIORITY_BULK,
+) -> Iterator[Tuple[str, str]]:
+    """Run several tasks over code concurrently, yielding (name, answer) as each finishes
+
+    Large inputs map every (task, chunk) pair in one parallel batch, then
+    reduce each task's partials in a second batch. Every request runs at
+    ``priority``.
+    """
+    template = template or "{task}\n\nCode:\n{code}"
+    code = prompt_code(code, language)
+    chunks = split_code(code)
+    if len(chunks) <= 1:
+        prompts = {
+            name: template.format(task=task, code=code) for name, task in tasks.items()
+        }
+        yield from iter_ai_responses_parallel(
+            prompts,
+            api_key,
+            model,
+            priority,
+            cache_prompts={
+                name: cache_prompt(prompt, code, language)
+                for name, prompt in prompts.items()
+            },
+        )
+        return
+
+    map_prompts, map_cache_prompts = {}, {}
+    for name, task in tasks.items():
+        for i, prompt in _map_prompts(task, chunks).items():
+            map_prompts[(name, i)] = prompt
+            map_cache_prompts[(name, i)] = cache_prompt(
+                prompt, chunks[i].text, language
+            )
+    mapped = dict(
+        iter_ai_responses_parallel(
+            map_prompts, api_key, model, priority, cache_prompts=map_cache_prompts
+        )
+    )
+
+    reduce_prompts, failures = {}, {}
+    for name, task in tasks.items():
+        partials = [(chunk, mapped[(name, i)]) for i, chunk in enumerate(chunks)]
+        partials, failures[name] = _collapse_partials(
+            task, partials, api_key, model, priority
+        )
+        if partials:
+            reduce_prompts[name] = _reduce_prompt(task, partials)
+        else:
+            failed = failures[name]
+            yield name, failed[0][1] + _failure_note(failed)
+    for name, text in iter_ai_responses_parallel(
+        reduce_prompts, api_key, model, priority
+    ):
+        yield name, text + _failure_note(failures[name])
+
+
+def analyze_code(
+    task: str,
+    code: str,
+    api_key: str,
+    model: str,
+    template: str = None,
+    language: str = None,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> str:
+    """Blocking variant of stream_code_analysis"""
+    template = template or "{task}\n\nCode:\n{code}"
+    code = prompt_code(code, language)
+    if len(split_code(code)) <= 1:
+        prompt = template.format(task=task, code=code)
+        return get_ai_response(
+            prompt,
+            api_key,
+            model,
+            priority,
+            cache_prompt=cache_prompt(prompt, code, language),
+        )
+    return "".join(
+        _stream_analysis(task, code, api_key, model, template, language, priority)
+    )
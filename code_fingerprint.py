@@ -0,0 +1,196 @@
+"""
+Code Fingerprint
+================
+
+Formatting-insensitive identity for source code, used to build response
+cache keys. Re-pasting the same code with different whitespace, comments
+or layout gives the same fingerprint, so earlier analyses are reused
+instead of paying for another model round trip.
+
+Normalization per ``SUPPORTED_LANGUAGES`` language:
+
+- Python is parsed and compared as a canonical ``ast.dump``. Comments,
+  formatting and docstrings drop out. Source that does not parse falls
+  back to the token form below.
+- The other languages are lexed into tokens with that language's comment
+  syntax removed, then joined with single spaces. String literals are kept
+  verbatim, including C++ raw strings and JavaScript/TypeScript regex
+  literals.
+- Code of unknown language is tried as Python first. Otherwise only
+  whitespace is normalized, since it is not known which characters start
+  a comment.
+"""
+
+import ast
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Iterator, Optional, Tuple
+
+CACHE_SIZE = 256
+
+_STRING_PATTERNS = {
+    "python": r"[rRbBuUfF]{0,2}(?:'''.*?'''|\"\"\".*?\"\"\"|'(?:\\.|[^'\\\n])*'|\"(?:\\.|[^\"\\\n])*\")",
+    # C++ raw strings come first, as their body may hold unescaped quotes
+    "c_like": r"(?:u8|[uUL])?R\"(?P<raw_delim>[^()\\\s]{0,16})\(.*?\)(?P=raw_delim)\"|\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`",
+    # 'a is a lifetime in Rust, so only single-character literals are chars
+    "rust": r"r#*\"(?:.*?)\"#*|b?\"(?:\\.|[^\"\\])*\"|b?'(?:\\.|[^'\\])'",
+}
+
+_COMMENT_PATTERNS = {
+    "python": r"#[^\n]*",
+    "c_like": r"//[^\n]*|/\*.*?\*/",
+    "rust": r"//[^\n]*|/\*.*?\*/",
+}
+
+LANGUAGE_SYNTAX = {
+    "Python": "python",
+    "JavaScript": "c_like",
+    "TypeScript": "c_like",
+    "Java": "c_like",
+    "C++": "c_like",
+    "Go": "c_like",
+    "Rust": "rust",
+}
+
+
+def _token_re(syntax: Optional[str]) -> "re.Pattern":
+    parts = []
+    if syntax:
+        parts.append(f"(?P<comment>{_COMMENT_PATTERNS[syntax]})")
+        parts.append(f"(?P<string>{_STRING_PATTERNS[syntax]})")
+    parts.append(r"(?P<word>\w+)")
+    parts.append(r"(?P<other>[^\s\w])")
+    return re.compile("|".join(parts), re.DOTALL)
+
+
+_TOKEN_RES = {
+    syntax: _token_re(syntax) for syntax in (None, *set(LANGUAGE_SYNTAX.values()))
+}
+
+
+_REGEX_LITERAL_RE = re.compile(r"/(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[A-Za-z]*")
+_REGEX_LANGUAGES = frozenset({"JavaScript", "TypeScript"})
+# Words after which a slash starts a regex literal rather than a division
+_REGEX_KEYWORDS = frozenset(
+    "await case delete do else in instanceof new of return throw typeof void "
+    "yield".split()
+)
+
+
+def _starts_regex(previous: Optional[Tuple[str, str]]) -> bool:
+    if previous is None:
+        return True
+    kind, text = previous
+    if kind == "word":
+        return text in _REGEX_KEYWORDS
+    return kind == "other" and text not in ")]"
+
+
+def iter_tokens(code: str, language: str = None) -> Iterator[Tuple[str, int, int]]:
+    """(kind, start, end) of each token: ``comment``, ``string``, ``word``, ``other``
+
+    Languages without a known syntax only get ``word`` and ``other``. In
+    JavaScript and TypeScript a slash where an expression starts opens a
+    regex literal, which is a ``string``.
+    """
+    pattern = _TOKEN_RES[LANGUAGE_SYNTAX.get(language)]
+    regexes = language in _REGEX_LANGUAGES
+    previous = None
+    position = 0
+    while True:
+        match = pattern.search(code, position)
+        if match is None:
+            return
+        kind, start, end = match.lastgroup, match.start(), match.end()
+        if regexes and kind == "other" and match.group() == "/":
+            literal = _starts_regex(previous) and _REGEX_LITERAL_RE.match(code, start)
+            if literal:
+                kind, end = "string", literal.end()
+        if kind != "comment":
+            previous = (kind, code[start:end])
+        yield kind, start, end
+        position = end
+
+
+class _StripDocstrings(ast.NodeTransformer):
+    """Drop leading string expressions from modules, classes and functions"""
+
+    def _strip(self, node: ast.AST) -> ast.AST:
+        self.generic_visit(node)
+        body = node.body
+        if (
+            body
+            and isinstance(body[0], ast.Expr)
+            and isinstance(body[0].value, ast.Constant)
+            and isinstance(body[0].value.value, str)
+        ):
+            node.body = body[1:] or [ast.Pass()]
+        return node
+
+    visit_Module = _strip
+    visit_ClassDef = _strip
+    visit_FunctionDef = _strip
+    visit_AsyncFunctionDef = _strip
+
+
+def _normalize_python(code: str) -> Optional[str]:
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+    return ast.dump(_StripDocstrings().visit(tree))
+
+
+def _normalize_tokens(code: str, language: Optional[str]) -> str:
+    return " ".join(
+        code[start:end]
+        for kind, start, end in iter_tokens(code, language)
+        if kind != "comment"
+    )
+
+
+def normalize_code(code: str, language: str = None) -> str:
+    """Canonical form of code that ignores formatting and comments"""
+    syntax = LANGUAGE_SYNTAX.get(language)
+    if syntax == "python" or language is None:
+        normalized = _normalize_python(code)
+        if normalized is not None:
+            return "ast:" + normalized
+    return f"tokens:{syntax}:" + _normalize_tokens(code, language)
+
+
+# (content hash, language) -> fingerprint
+_cache: OrderedDict = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def code_fingerprint(code: str, language: str = None) -> str:
+    """Hash of the normalized code, cached by raw content hash"""
+    key = (hashlib.sha256(code.encode("utf-8")).hexdigest(), language)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    fingerprint = hashlib.sha256(
+        normalize_code(code, language).encode("utf-8")
+    ).hexdigest()
+    with _cache_lock:
+        _cache[key] = fingerprint
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return fingerprint
+
+
+def cache_prompt(prompt: str, code: str, language: str = None) -> str:
+    """Prompt identity for the response cache, with the code fingerprinted
+
+    The code embedded in ``prompt`` is replaced by its fingerprint, so
+    reformatting the code does not change the cache key while any change
+    to the surrounding instructions still does.
+    """
+    if not code.strip() or code not in prompt:
+        return prompt
+    return prompt.replace(code, f"<code {code_fingerprint(code, language)}>")
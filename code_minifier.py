@@ -0,0 +1,227 @@
+"""
+Code Minifier
+=============
+
+Compacts code before it is embedded in a prompt, so fewer tokens are paid
+for and generated around. Enabled by
+``PERFORMANCE_CONFIG["optimization"]["minification"]``, with options in
+``PERFORMANCE_CONFIG["minification"]``.
+
+Per ``SUPPORTED_LANGUAGES`` language (lexed as in code_fingerprint):
+
+- trailing whitespace and whitespace-only lines are emptied
+- runs of spaces between tokens collapse to one; indentation and string
+  literals (including C++ raw strings and JavaScript/TypeScript regex
+  literals) are kept verbatim
+- optionally, comments (every language with a known syntax) and Python
+  docstrings are removed
+
+Line breaks are never removed, so line N of the compacted code is line N
+of the original. Line numbers the model quotes, chunk ranges and locally
+flagged lines all stay valid without remapping. Runs of empty lines cost
+close to nothing once tokenized.
+
+Code of unknown language only has whitespace at line ends trimmed, since
+it is not known where its strings start. Savings are recorded per request
+in ``minification_stats``.
+"""
+
+import ast
+import re
+import threading
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional
+
+from call_metrics import estimate_tokens
+from code_fingerprint import LANGUAGE_SYNTAX, iter_tokens
+from config import PERFORMANCE_CONFIG
+
+MINIFY_CONFIG = PERFORMANCE_CONFIG["minification"]
+
+_INDENT_RE = re.compile(r"[ \t]*")
+
+
+class MinifiedCode(NamedTuple):
+    """Compacted code and its estimated token savings"""
+
+    text: str
+    language: Optional[str]
+    original_tokens: int
+    minified_tokens: int
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.minified_tokens
+
+
+def _docstring_spans(code: str) -> Optional[List[tuple]]:
+    """(start, end, replacement) character spans of Python docstrings"""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+
+    offsets = [0]
+    for line in code.splitlines(keepends=True):
+        offsets.append(offsets[-1] + len(line))
+
+    def position(lineno: int, col: int) -> int:
+        # ast columns are UTF-8 byte offsets
+        line = code[offsets[lineno - 1] : offsets[lineno]]
+        return offsets[lineno - 1] + len(line.encode("utf-8")[:col].decode("utf-8"))
+
+    spans = []
+    for node in ast.walk(tree):
+        body = getattr(node, "body", None)
+        if not isinstance(body, list) or not body:
+            continue
+        first = body[0]
+        if (
+            isinstance(first, ast.Expr)
+            and isinstance(first.value, ast.Constant)
+            and isinstance(first.value.value, str)
+        ):
+            # A body of just a docstring still needs a statement
+            replacement = "..." if len(body) == 1 else ""
+            spans.append(
+                (
+                    position(first.lineno, first.col_offset),
+                    position(first.end_lineno, first.end_col_offset),
+                    replacement,
+                )
+            )
+    return sorted(spans)
+
+
+def _strip_docstrings(code: str) -> str:
+    spans = _docstring_spans(code)
+    if not spans:
+        return code
+    for start, end, replacement in reversed(spans):
+        # Keep the docstring's line breaks so later lines keep their numbers
+        code = (
+            code[:start]
+            + replacement
+            + "\n" * code.count("\n", start, end)
+            + code[end:]
+        )
+    return code
+
+
+def _collapse_whitespace(code: str, language: str, strip_comments: bool) -> str:
+    """Rebuild code from its tokens, keeping line breaks and indentation"""
+    parts = []
+    position = 0
+    breaks = 0  # line breaks not yet written
+    indent = ""  # indentation of the line after them
+    spaced = False
+    for kind, start, end in iter_tokens(code, language):
+        gap = code[position:start]
+        position = end
+        if "\n" in gap:
+            breaks += gap.count("\n")
+            indent = gap.rsplit("\n", 1)[1]
+        if kind == "comment" and strip_comments:
+            # Comments may span lines; keep their breaks, drop their text.
+            # A token after a multi-line comment is indented like the line
+            # the comment started on.
+            if "\n" in code[start:end]:
+                breaks += code.count("\n", start, end)
+                indent = _INDENT_RE.match(code, code.rfind("\n", 0, start) + 1).group()
+            spaced = True
+            continue
+
+        if breaks:
+            parts.append("\n" * breaks + indent)
+            breaks = 0
+        elif (gap or spaced) and parts:
+            parts.append(" ")
+        spaced = False
+        parts.append(code[start:end])
+    parts.append("\n" * (breaks + code.count("\n", position)))
+    return _trim_lines("".join(parts))
+
+
+def _trim_lines(code: str) -> str:
+    return "\n".join(line.rstrip() for line in code.split("\n"))
+
+
+def minify_code(
+    code: str,
+    language: str = None,
+    strip_comments: bool = None,
+    strip_docstrings: bool = None,
+) -> MinifiedCode:
+    """Compact code for a prompt without changing its line numbering"""
+    if strip_comments is None:
+        strip_comments = MINIFY_CONFIG["strip_comments"]
+    if strip_docstrings is None:
+        strip_docstrings = MINIFY_CONFIG["strip_docstrings"]
+
+    syntax = LANGUAGE_SYNTAX.get(language)
+    if language is None and _docstring_spans(code) is not None:
+        language, syntax = "Python", "python"
+
+    text = code
+    if syntax == "python" and strip_docstrings:
+        text = _strip_docstrings(text)
+    if syntax is not None:
+        text = _collapse_whitespace(text, language, strip_comments)
+    else:
+        text = _trim_lines(text)
+
+    result = MinifiedCode(text, language, estimate_tokens(code), estimate_tokens(text))
+    minification_stats.record(result)
+    return result
+
+
+class MinificationStats:
+    """Token savings per request and in total"""
+
+    def __init__(self, recent: int = 50):
+        self._recent: deque = deque(maxlen=recent)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.original_tokens = 0
+        self.minified_tokens = 0
+
+    def record(self, minified: MinifiedCode) -> None:
+        with self._lock:
+            self.requests += 1
+            self.original_tokens += minified.original_tokens
+            self.minified_tokens += minified.minified_tokens
+            self._recent.append(
+                {
+                    "language": minified.language or "unknown",
+                    "original_tokens": minified.original_tokens,
+                    "minified_tokens": minified.minified_tokens,
+                    "saved_tokens": minified.saved_tokens,
+                }
+            )
+
+    def recent(self) -> List[Dict]:
+        """Most recent requests, newest first"""
+        with self._lock:
+            return list(reversed(self._recent))
+
+    def totals(self) -> Dict[str, float]:
+        with self._lock:
+            saved = self.original_tokens - self.minified_tokens
+            return {
+                "requests": self.requests,
+                "original_tokens": self.original_tokens,
+                "saved_tokens": saved,
+                "saved_ratio": (
+                    saved / self.original_tokens if self.original_tokens else 0
+                ),
+            }
+
+
+minification_stats = MinificationStats()
+
+
+def prompt_code(code: str, language: str = None) -> str:
+    """Code as it should be embedded in a prompt under the current config"""
+    if not PERFORMANCE_CONFIG["optimization"]["minification"] or not code.strip():
+        return code
+    return minify_code(code, language).text
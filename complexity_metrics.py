@@ -0,0 +1,431 @@
+"""
+Complexity Metrics
+==================
+
+Local engine for the metrics listed in
+``ANALYSIS_FEATURES["performance_analysis"]["complexity_metrics"]``:
+cyclomatic, cognitive and Halstead, computed per function.
+
+Python is measured exactly from a single ``ast`` parse. The other
+``SUPPORTED_LANGUAGES`` fall back to a token-based approximation (decision
+keywords, brace nesting and operator/operand counts). Reports are cached
+by content hash so reruns on unchanged code are free.
+"""
+
+import ast
+import hashlib
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Tuple
+
+from config import ANALYSIS_FEATURES
+
+ENABLED_METRICS = ANALYSIS_FEATURES["performance_analysis"]["complexity_metrics"]
+
+CACHE_SIZE = 128
+
+
+class HalsteadMetrics(NamedTuple):
+    """Halstead software-science measures"""
+
+    distinct_operators: int
+    distinct_operands: int
+    total_operators: int
+    total_operands: int
+    vocabulary: int
+    length: int
+    volume: float
+    difficulty: float
+    effort: float
+    bugs: float
+
+
+class FunctionMetrics(NamedTuple):
+    """Metrics for a single function or method"""
+
+    name: str
+    line: int
+    end_line: int
+    cyclomatic: int
+    cognitive: int
+    halstead: HalsteadMetrics
+
+
+class ComplexityReport(NamedTuple):
+    """Per-function metrics for one source file"""
+
+    language: str
+    method: str  # "ast" or "tokens"
+    functions: List[FunctionMetrics]
+    duration_ms: float
+
+
+def _halstead(operators: List[str], operands: List[str]) -> HalsteadMetrics:
+    n1, n2 = len(set(operators)), len(set(operands))
+    big_n1, big_n2 = len(operators), len(operands)
+    vocabulary = n1 + n2
+    length = big_n1 + big_n2
+    volume = length * math.log2(vocabulary) if vocabulary > 1 else 0.0
+    difficulty = (n1 / 2) * (big_n2 / n2) if n2 else 0.0
+    effort = difficulty * volume
+    return HalsteadMetrics(
+        n1,
+        n2,
+        big_n1,
+        big_n2,
+        vocabulary,
+        length,
+        round(volume, 2),
+        round(difficulty, 2),
+        round(effort, 2),
+        round(volume / 3000, 4),
+    )
+
+
+# =============================================================================
+# PYTHON (AST)
+# =============================================================================
+
+_FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef)
+_SCOPE_NODES = _FUNCTION_NODES + (ast.ClassDef,)
+_LOOP_NODES = (ast.For, ast.AsyncFor, ast.While)
+
+
+def _own_nodes(func: ast.AST):
+    """Walk a function body without descending into nested functions or classes"""
+    stack = list(ast.iter_child_nodes(func))
+    while stack:
+        node = stack.pop()
+        yield node
+        if not isinstance(node, _SCOPE_NODES):
+            stack.extend(ast.iter_child_nodes(node))
+
+
+def _python_cyclomatic(func: ast.AST) -> int:
+    complexity = 1
+    for node in _own_nodes(func):
+        if isinstance(node, (ast.If, ast.IfExp, ast.ExceptHandler, ast.Assert)):
+            complexity += 1
+        elif isinstance(node, _LOOP_NODES):
+            complexity += 1 + bool(node.orelse)
+        elif isinstance(node, ast.BoolOp):
+            complexity += len(node.values) - 1
+        elif isinstance(node, ast.comprehension):
+            complexity += 1 + len(node.ifs)
+        elif isinstance(node, ast.match_case):
+            complexity += 1
+    return complexity
+
+
+def _python_cognitive(func: ast.AST) -> int:
+    """Cognitive complexity: structural increments weighted by nesting depth"""
+    total = 0
+
+    def visit(node: ast.AST, nesting: int) -> None:
+        nonlocal total
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, _SCOPE_NODES):
+                continue
+            if isinstance(child, ast.If):
+                total += 1 + nesting
+                visit_if(child, nesting)
+                continue
+            if isinstance(child, _LOOP_NODES + (ast.ExceptHandler, ast.Match)):
+                total += 1 + nesting
+                visit(child, nesting + 1)
+                continue
+            if isinstance(child, (ast.IfExp, ast.comprehension)):
+                total += 1 + nesting
+            elif isinstance(child, ast.BoolOp):
+                total += 1
+            elif isinstance(child, ast.Lambda):
+                visit(child, nesting + 1)
+                continue
+            elif (
+                isinstance(child, ast.Call)
+                and isinstance(child.func, ast.Name)
+                and child.func.id == func.name
+            ):
+                total += 1  # recursion
+            visit(child, nesting)
+
+    def visit_if(node: ast.If, nesting: int) -> None:
+        nonlocal total
+        visit(ast.Expression(body=node.test), nesting)
+        for stmt in node.body:
+            visit(ast.Module(body=[stmt], type_ignores=[]), nesting + 1)
+        orelse = node.orelse
+        if len(orelse) == 1 and isinstance(orelse[0], ast.If):
+            total += 1  # elif
+            visit_if(orelse[0], nesting)
+        elif orelse:
+            total += 1  # else
+            for stmt in orelse:
+                visit(ast.Module(body=[stmt], type_ignores=[]), nesting + 1)
+
+    visit(func, 0)
+    return total
+
+
+def _python_halstead(func: ast.AST) -> HalsteadMetrics:
+    operators, operands = [], []
+    for node in _own_nodes(func):
+        if isinstance(node, (ast.BinOp, ast.AugAssign)):
+            operators.append(type(node.op).__name__)
+        elif isinstance(node, (ast.UnaryOp, ast.BoolOp)):
+            operators.append(type(node.op).__name__)
+        elif isinstance(node, ast.Compare):
+            operators.extend(type(op).__name__ for op in node.ops)
+        elif isinstance(node, (ast.stmt, ast.Call, ast.Attribute, ast.Subscript)):
+            operators.append(type(node).__name__)
+
+        if isinstance(node, ast.Name):
+            operands.append(node.id)
+        elif isinstance(node, ast.Constant):
+            operands.append(repr(node.value))
+        elif isinstance(node, ast.Attribute):
+            operands.append(node.attr)
+        elif isinstance(node, ast.arg):
+            operands.append(node.arg)
+    return _halstead(operators, operands)
+
+
+def _analyze_python(tree: ast.Module) -> List[FunctionMetrics]:
+    functions = []
+
+    def collect(node: ast.AST, prefix: str) -> None:
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, _FUNCTION_NODES):
+                name = f"{prefix}{child.name}"
+                functions.append(
+                    FunctionMetrics(
+                        name,
+                        child.lineno,
+                        child.end_lineno,
+                        _python_cyclomatic(child),
+                        _python_cognitive(child),
+                        _python_halstead(child),
+                    )
+                )
+                collect(child, f"{name}.")
+            elif isinstance(child, ast.ClassDef):
+                collect(child, f"{prefix}{child.name}.")
+
+    collect(tree, "")
+    return sorted(functions, key=lambda f: f.line)
+
+
+# =============================================================================
+# OTHER LANGUAGES (TOKEN APPROXIMATION)
+# =============================================================================
+
+_TOKEN_RE = re.compile(
+    r"(?P<comment>//[^\n]*|/\*.*?\*/|#[^\n]*)"
+    r"|(?P<string>\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|`[^`]*`)"
+    r"|(?P<number>\b\d[\w.]*)"
+    r"|(?P<ident>[A-Za-z_]\w*)"
+    r"|(?P<op>&&|\|\||==|!=|<=|>=|->|=>|::|\+\+|--|[-+*/%=<>!&|^~?:.,;(){}\[\]])",
+    re.DOTALL,
+)
+
+_DECISION_KEYWORDS = {
+    "if",
+    "for",
+    "while",
+    "case",
+    "catch",
+    "except",
+    "elif",
+    "foreach",
+}
+_BRANCH_OPERATORS = {"&&", "||", "?"}
+_KEYWORDS = _DECISION_KEYWORDS | {
+    "else",
+    "switch",
+    "do",
+    "return",
+    "break",
+    "continue",
+    "try",
+    "finally",
+    "throw",
+    "new",
+    "function",
+    "func",
+    "fn",
+    "def",
+    "class",
+    "struct",
+    "public",
+    "private",
+    "protected",
+    "static",
+    "const",
+    "let",
+    "var",
+    "final",
+    "void",
+    "int",
+    "impl",
+    "pub",
+    "mut",
+    "async",
+    "await",
+}
+_NOT_FUNCTION_NAMES = {"if", "for", "while", "switch", "catch", "return", "foreach"}
+_FUNCTION_NAME_RE = re.compile(r"([A-Za-z_]\w*)\s*(?:<[^>]*>)?\s*\([^;{}]*\)[^;{}]*$")
+
+
+def _tokenize(code: str) -> List[Tuple[str, str, int]]:
+    """Return (kind, text, line) tokens with comments dropped"""
+    tokens = []
+    line = 1
+    last = 0
+    for match in _TOKEN_RE.finditer(code):
+        line += code.count("\n", last, match.start())
+        last = match.start()
+        if match.lastgroup != "comment":
+            tokens.append((match.lastgroup, match.group(), line))
+    return tokens
+
+
+def _find_token_functions(
+    tokens: List[Tuple[str, str, int]],
+) -> List[Tuple[str, int, int]]:
+    """Locate (name, open_brace_index, close_brace_index) for function bodies"""
+    functions = []
+    depth_stack = []
+    for i, (kind, text, _) in enumerate(tokens):
+        if text == "{":
+            # Look back to the previous statement boundary for "name(...)"
+            j = i - 1
+            while j >= 0 and tokens[j][1] not in (";", "{", "}"):
+                j -= 1
+            header = " ".join(t[1] for t in tokens[j + 1 : i])
+            match = _FUNCTION_NAME_RE.search(header)
+            name = match.group(1) if match else None
+            if name in _NOT_FUNCTION_NAMES:
+                name = None
+            depth_stack.append((name, i))
+        elif text == "}" and depth_stack:
+            name, start = depth_stack.pop()
+            if name:
+                functions.append((name, start, i))
+    return sorted(functions, key=lambda f: f[1])
+
+
+def _analyze_tokens(code: str) -> List[FunctionMetrics]:
+    tokens = _tokenize(code)
+    functions = []
+    for name, start, end in _find_token_functions(tokens):
+        body = tokens[start : end + 1]
+        cyclomatic, cognitive, depth = 1, 0, 0
+        operators, operands = [], []
+        for kind, text, _ in body:
+            if text == "{":
+                depth += 1
+            elif text == "}":
+                depth -= 1
+            if text in _DECISION_KEYWORDS:
+                cyclomatic += 1
+                cognitive += max(1, depth)
+            elif text in _BRANCH_OPERATORS:
+                cyclomatic += 1
+                cognitive += 1
+            elif text == "else":
+                cognitive += 1
+
+            if kind == "op" or text in _KEYWORDS:
+                operators.append(text)
+            else:
+                operands.append(text)
+        functions.append(
+            FunctionMetrics(
+                name,
+                tokens[start][2],
+                tokens[end][2],
+                cyclomatic,
+                cognitive,
+                _halstead(operators, operands),
+            )
+        )
+    return functions
+
+
+# =============================================================================
+# PUBLIC API
+# =============================================================================
+
+# (content hash, language) -> report
+_cache: OrderedDict = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def analyze_complexity(code: str, language: str = None) -> ComplexityReport:
+    """Compute per-function complexity metrics, cached by content hash"""
+    key = (hashlib.sha256(code.encode("utf-8")).hexdigest(), language)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    started = time.perf_counter()
+    tree = None
+    if language in (None, "Python"):
+        try:
+            tree = ast.parse(code)
+        except (SyntaxError, ValueError):
+            tree = None
+
+    if tree is not None:
+        report_language, method, functions = "Python", "ast", _analyze_python(tree)
+    else:
+        report_language, method = language or "Unknown", "tokens"
+        functions = _analyze_tokens(code)
+
+    report = ComplexityReport(
+        report_language,
+        method,
+        functions,
+        round((time.perf_counter() - started) * 1000, 2),
+    )
+    with _cache_lock:
+        _cache[key] = report
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return report
+
+
+def metrics_table(report: ComplexityReport) -> List[Dict[str, object]]:
+    """Flatten a report into rows suitable for st.table or JSON export"""
+    rows = []
+    for func in report.functions:
+        row = {"Function": func.name, "Lines": f"{func.line}-{func.end_line}"}
+        if "cyclomatic" in ENABLED_METRICS:
+            row["Cyclomatic"] = func.cyclomatic
+        if "cognitive" in ENABLED_METRICS:
+            row["Cognitive"] = func.cognitive
+        if "halstead" in ENABLED_METRICS:
+            row["Halstead Volume"] = func.halstead.volume
+            row["Halstead Difficulty"] = func.halstead.difficulty
+        rows.append(row)
+    return rows
+
+
+def format_report(report: ComplexityReport) -> str:
+    """Render a report as a compact markdown table to ground AI prompts"""
+    rows = metrics_table(report)
+    if not rows:
+        return "No functions found."
+
+    headers = list(rows[0])
+    lines = [
+        f"Measured complexity metrics ({report.language}, {report.method}-based):",
+        "| " + " | ".join(headers) + " |",
+        "|" + "---|" * len(headers),
+    ]
+    lines.extend("| " + " | ".join(str(row[h]) for h in headers) + " |" for row in rows)
+    return "\n".join(lines)
@@ -43,7 +43,16 @@ STREAMLIT_CONFIG = {
 # AI MODEL CONFIGURATIONS
 # =============================================================================
 
+# cost_per_token is the provider's list price in USD per 1K tokens
 AI_MODELS = {
+    "ChatGPT-4o": {
+        "api_name": "gpt-4o",
+        "max_tokens": 4000,
+        "temperature": 0.3,
+        "description": "Fast flagship model with strong reasoning",
+        "cost_per_token": 0.005,
+        "capabilities": ["code_generation", "analysis", "refactoring", "documentation"],
+    },
     "ChatGPT-4": {
         "api_name": "gpt-4",
         "max_tokens": 4000,
@@ -93,6 +102,13 @@ ANALYSIS_FEATURES = {
             "insecure_random": r"random\.",
             "debug_mode": r"debug\s*=\s*True",
         },
+        "severities": {
+            "sql_injection": "High",
+            "hardcoded_password": "High",
+            "eval_usage": "High",
+            "insecure_random": "Medium",
+            "debug_mode": "Low",
+        },
     },
     "performance_analysis": {
         "enabled": True,
@@ -252,9 +268,14 @@ EXPORT_CONFIG = {
     "formats": {
         "pdf": {"enabled": True, "template": "professional", "include_charts": True},
         "json": {"enabled": True, "pretty_print": True, "include_metadata": True},
+        "jsonl": {"enabled": True},
         "markdown": {"enabled": True, "include_toc": True, "code_highlighting": True},
         "html": {"enabled": True, "responsive": True, "include_css": True},
     },
+    "streaming": {
+        "gzip": False,  # default for exports; each export can override it
+        "buffer_bytes": 64 * 1024,  # text gathered per write
+    },
     "api_endpoints": {
         "base_url": "https://api.ai-coding-companion.com/v1",
         "timeout": 30,
@@ -287,9 +308,84 @@ PERFORMANCE_CONFIG = {
         "enabled": True,
         "ttl": 3600,  # seconds
         "max_size": 100,  # MB
+        "persist_to_disk": os.getenv("AI_CACHE_PERSIST", "False").lower() == "true",
+        "cache_dir": os.getenv("AI_CACHE_DIR", ".ai_cache"),
     },
     "parallel_processing": {"enabled": True, "max_workers": 4},
+    "chunking": {
+        "max_chunk_tokens": 3000,  # per map request
+        "max_reduce_tokens": 6000,  # partial results merged per reduce request
+    },
+    "scheduler": {
+        "request_deadline": 120,  # seconds, including queueing and retries
+        "backoff_base": 1.0,  # seconds
+        "backoff_max": 20.0,  # seconds
+    },
+    "conversation_memory": {
+        "max_history_tokens": 2000,  # prior turns sent with each chat message
+        "summary_max_words": 200,
+        "keep_ratio": 0.5,  # share of the budget left after compacting
+    },
+    "session_history": {
+        "max_chat_messages": 200,  # per session; oldest dropped first
+        "max_code_entries": 50,
+        "hot_entries": 40,  # newest records kept in memory when spilling
+        "spill_to_disk": os.getenv("AI_HISTORY_SPILL", "False").lower() == "true",
+        "spill_dir": os.getenv("AI_HISTORY_DIR", ".ai_history"),
+    },
+    "prefetch": {
+        # Opt-in: speculative quick-action answers cost tokens nobody asked for
+        "enabled": os.getenv("AI_PREFETCH", "False").lower() == "true",
+        "debounce": 2.0,  # seconds the code must stay unchanged
+        "max_code_tokens": 4000,  # larger files are never prefetched
+        "token_budget": 20000,  # estimated tokens per session
+        "max_workers": 2,  # prefetches running at once, process-wide
+        "deadline": 180,  # seconds
+    },
+    "project_index": {
+        "max_files": 500,  # per session; later files are skipped
+        "max_file_bytes": 200_000,  # larger files and archive members are skipped
+        "max_archive_bytes": 20_000_000,  # decompressed bytes read per archive
+        "context_tokens": 3000,  # retrieved code sent with each chat question
+        "bm25_k1": 1.2,
+        "bm25_b": 0.75,
+        "parse_cache_entries": 2000,  # parsed files shared across sessions
+    },
+    "single_flight": {
+        "enabled": True,  # share one call among identical concurrent requests
+        "wait_timeout": 180,  # seconds a follower waits for the shared call
+    },
+    "jobs": {
+        "max_workers": 4,  # background analyses running at once
+        "deadline": 300,  # seconds per job, including queueing
+        "keep_finished": 600,  # seconds an uncollected result is kept
+    },
+    "chat_rendering": {
+        "page_size": 20,  # newest messages drawn per rerun
+        "markdown_cache_entries": 200,  # prepared messages kept per session
+    },
+    "routing": {
+        "enabled": True,  # users can still pin the selected model in the UI
+        "simple_max_tokens": 1500,  # prompts up to this size may go to a fast model
+        "simple_actions": ["Explain Code", "Chat", "Chat Memory"],
+        "cost_weight": 1.0,
+        "latency_weight": 1.0,
+        "max_error_rate": 0.5,  # recent error rate above which a model is avoided
+        "min_samples": 5,  # recent calls needed before live stats are trusted
+    },
+    "metrics": {
+        "enabled": True,
+        "export_file": os.getenv("AI_METRICS_FILE"),  # Prometheus textfile output
+        "export_interval": 5,  # seconds between file rewrites
+        "http_port": int(os.getenv("AI_METRICS_PORT", "0")),  # 0 disables /metrics
+        "recent_calls": 200,  # per-call records kept for the in-app panel
+    },
     "optimization": {"lazy_loading": True, "compression": True, "minification": True},
+    "minification": {
+        # Off by default: answers that rewrite the code would lose them
+        "strip_comments": False,
+        "strip_docstrings": False,
+    },
 }
 
 # =============================================================================
@@ -301,6 +397,15 @@ DEBUG_CONFIG = {
     "log_level": "DEBUG" if os.getenv("DEBUG") else "INFO",
     "show_performance_metrics": True,
     "mock_ai_responses": os.getenv("MOCK_AI", "False").lower() == "true",
+    "mock_backend": {
+        "latency_ms": float(os.getenv("MOCK_AI_LATENCY_MS", "200")),  # median TTFT
+        "latency_sigma": float(os.getenv("MOCK_AI_LATENCY_SIGMA", "0.5")),  # lognormal
+        "tokens_per_second": float(os.getenv("MOCK_AI_TOKENS_PER_SECOND", "80")),
+        "rate_limit_rate": float(os.getenv("MOCK_AI_429_RATE", "0")),
+        "timeout_rate": float(os.getenv("MOCK_AI_TIMEOUT_RATE", "0")),
+        "retry_after": 1,  # seconds, sent with injected 429s
+        "seed": os.getenv("MOCK_AI_SEED"),
+    },
     "verbose_logging": True,
 }
 
@@ -369,14 +474,25 @@ def apply_custom_config(custom_config: Dict[str, Any]) -> None:
 # =============================================================================
 
 
-def initialize_config():
+def initialize_config(strict: bool = True):
     """Initialize configuration and validate settings."""
     issues = validate_config()
-    if issues and not DEBUG_CONFIG["enabled"]:
+    if strict and issues and not DEBUG_CONFIG["enabled"]:
         raise ValueError(f"Configuration issues found: {', '.join(issues)}")
 
     return get_config()
 
 
-# Export main configuration
-CONFIG = initialize_config()
+_config = None
+
+
+def __getattr__(name: str) -> Any:
+    """Build ``CONFIG`` on first access rather than at import time"""
+    global _config
+    if name == "CONFIG":
+        # API keys are usually entered in the UI, so a missing environment
+        # variable must not stop modules importing settings.
+        if _config is None:
+            _config = initialize_config(strict=False)
+        return _config
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
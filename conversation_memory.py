@@ -0,0 +1,145 @@
+"""
+Conversation Memory
+===================
+
+Token-budgeted memory for the chat. Recent turns are sent back to the
+model verbatim up to ``max_history_tokens``; once the window overflows,
+the oldest turns are folded into a rolling summary. Summarization is
+incremental: only the turns leaving the window are sent, together with
+the previous summary, and it runs once per half-budget of new
+conversation rather than on every message. Per-message token counts are
+cached so each turn is only measured once.
+"""
+
+from typing import Callable, Dict, List
+
+from code_chunker import estimate_tokens
+from config import PERFORMANCE_CONFIG
+from helper_ai import is_error_response
+
+MEMORY_CONFIG = PERFORMANCE_CONFIG["conversation_memory"]
+
+SUMMARY_TEMPLATE = (
+    "Update the running summary of a conversation between a developer and a "
+    "programming assistant. Keep decisions, code facts, open questions and "
+    "names of functions discussed. Reply with the summary only, in at most "
+    "{max_words} words.\n\nCurrent summary:\n{summary}\n\nNew turns:\n{turns}"
+)
+
+
+def _format_turns(messages: List[Dict[str, str]]) -> str:
+    return "\n\n".join(
+        f"{'User' if m['role'] == 'user' else 'Assistant'}: {m['content']}"
+        for m in messages
+    )
+
+
+class ConversationMemory:
+    """Rolling summary plus a recent-turn window over an append-only history"""
+
+    def __init__(
+        self,
+        max_tokens: int = None,
+        summary_max_words: int = None,
+        keep_ratio: float = None,
+    ):
+        self.max_tokens = max_tokens or MEMORY_CONFIG["max_history_tokens"]
+        self.summary_max_words = summary_max_words or MEMORY_CONFIG["summary_max_words"]
+        self.keep_ratio = keep_ratio or MEMORY_CONFIG["keep_ratio"]
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the summary and cached counts (e.g. after clearing chat)"""
+        self.summary = ""
+        self.summarized_count = 0
+        self._token_counts: List[int] = []
+        self._dropped = None
+
+    def _sync(self, history: List[Dict[str, str]]) -> None:
+        """Measure messages appended since the last call"""
+        # A bounded SessionHistory drops its oldest messages; shift the
+        # per-position state by the number dropped since the last call.
+        # Expire first, so that messages past their age limit are counted
+        # as dropped before the history is read.
+        if hasattr(history, "expire"):
+            history.expire()
+        dropped = getattr(history, "dropped", 0)
+        if self._dropped is not None and dropped > self._dropped:
+            shift = dropped - self._dropped
+            del self._token_counts[:shift]
+            self.summarized_count = max(0, self.summarized_count - shift)
+        self._dropped = dropped
+        if len(history) < len(self._token_counts):
+            # History was cleared or replaced; start over
+            self.reset()
+            self._dropped = dropped
+        for message in history[len(self._token_counts) :]:
+            self._token_counts.append(estimate_tokens(message["content"]))
+
+    def window_tokens(self, history: List[Dict[str, str]]) -> int:
+        """Tokens in the turns not yet folded into the summary"""
+        self._sync(history)
+        return sum(self._token_counts[self.summarized_count :])
+
+    def compact(
+        self, history: List[Dict[str, str]], summarize: Callable[[str], str]
+    ) -> bool:
+        """Fold the oldest turns into the summary if the window is over budget
+
+        ``summarize`` sends a prompt to the model and returns its reply.
+        Returns True when the summary was updated.
+        """
+        window = self.window_tokens(history)
+        if window <= self.max_tokens:
+            return False
+
+        target = self.max_tokens * self.keep_ratio
+        cut = self.summarized_count
+        # Always keep the latest turn verbatim
+        while cut < len(history) - 1 and window > target:
+            window -= self._token_counts[cut]
+            cut += 1
+        if cut == self.summarized_count:
+            return False
+
+        result = summarize(
+            SUMMARY_TEMPLATE.format(
+                max_words=self.summary_max_words,
+                summary=self.summary or "(none yet)",
+                turns=_format_turns(history[self.summarized_count : cut]),
+            )
+        )
+        if is_error_response(result):
+            return False
+
+        self.summary = result.strip()
+        self.summarized_count = cut
+        return True
+
+    def build_context(self, history: List[Dict[str, str]]) -> str:
+        """Render the summary and as many recent turns as fit the budget"""
+        self._sync(history)
+        budget = self.max_tokens
+        start = len(history)
+        while start > self.summarized_count:
+            cost = self._token_counts[start - 1]
+            if cost > budget:
+                break
+            budget -= cost
+            start -= 1
+
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation:\n{self.summary}")
+        if start < len(history):
+            parts.append(f"Recent conversation:\n{_format_turns(history[start:])}")
+        return "\n\n".join(parts)
+
+    def stats(self, history: List[Dict[str, str]]) -> Dict[str, int]:
+        """Report how much of the conversation is summarized vs. verbatim"""
+        return {
+            "summarized_messages": self.summarized_count,
+            "window_messages": len(history) - self.summarized_count,
+            "window_tokens": self.window_tokens(history),
+            "summary_tokens": estimate_tokens(self.summary) if self.summary else 0,
+        }
@@ -0,0 +1,314 @@
+"""
+Exporter
+========
+
+Streams chat and analysis histories, or batch_cli results, to the
+``EXPORT_CONFIG["formats"]`` formats: JSON, JSONL, Markdown and HTML,
+optionally gzip-compressed. Documents are produced as a sequence of small
+text pieces and written as they are generated, one record at a time. A
+whole document is never held in memory, so large sessions and batch runs
+export in constant memory.
+
+Records may be session_history records or plain dicts such as batch_cli
+JSONL lines, and are rendered with full content. PDF is listed in the
+config, but it would need a rendering dependency, so it is not produced
+here.
+
+Example::
+
+    python exporter.py analysis_results.jsonl --format markdown --gzip
+"""
+
+import argparse
+import gzip
+import html
+import json
+import os
+import re
+import sys
+from datetime import datetime
+from typing import IO, Dict, Iterable, Iterator, List, Mapping, Union
+
+from config import APP_CONFIG, EXPORT_CONFIG, SUPPORTED_LANGUAGES
+from session_history import HistoryRecord
+
+FORMATS_CONFIG = EXPORT_CONFIG["formats"]
+STREAM_CONFIG = EXPORT_CONFIG["streaming"]
+
+# Format -> (file extension, MIME type)
+FORMATS = {
+    "json": (".json", "application/json"),
+    "jsonl": (".jsonl", "application/x-ndjson"),
+    "markdown": (".md", "text/markdown"),
+    "html": (".html", "text/html"),
+}
+
+HTML_CSS = """
+body { font-family: system-ui, sans-serif; max-width: 960px; margin: 0 auto;
+       padding: 1rem; line-height: 1.5; }
+pre { background: #f5f5f5; padding: 0.75rem; overflow-x: auto;
+      white-space: pre-wrap; word-wrap: break-word; }
+.meta { color: #666; font-size: 0.9em; }
+article { border-bottom: 1px solid #ddd; padding: 0.5rem 0; }
+"""
+
+Record = Union[HistoryRecord, Mapping[str, object]]
+Sections = Mapping[str, Iterable[Record]]
+
+_BACKTICKS_RE = re.compile(r"`{3,}")
+
+
+def enabled_formats() -> List[str]:
+    """Formats this module can write that are enabled in EXPORT_CONFIG"""
+    return [name for name in FORMATS if FORMATS_CONFIG[name]["enabled"]]
+
+
+def _as_dict(record: Record) -> Dict[str, object]:
+    if isinstance(record, HistoryRecord):
+        return record.as_dict()
+    return dict(record)
+
+
+def _metadata(sections: Sections) -> Dict[str, object]:
+    return {
+        "app": APP_CONFIG["title"],
+        "version": APP_CONFIG["version"],
+        "exported": datetime.now().isoformat(timespec="seconds"),
+        "sections": list(sections),
+    }
+
+
+def _title(record: Dict[str, object]) -> str:
+    if record.get("path"):
+        return str(record["path"])
+    return str(record.get("role") or "record").title()
+
+
+def _fence_for(language: object) -> str:
+    if not FORMATS_CONFIG["markdown"]["code_highlighting"]:
+        return ""
+    settings = SUPPORTED_LANGUAGES.get(language)
+    return settings["syntax_highlighting"] if settings else ""
+
+
+def _bodies(record: Dict[str, object]) -> Iterator[tuple]:
+    """(heading, text) of the record's prose parts"""
+    if record.get("content"):
+        yield None, str(record["content"])
+    if record.get("analysis"):
+        yield None, str(record["analysis"])
+    for title, text in (record.get("sections") or {}).items():
+        yield title, str(text)
+    if record.get("error"):
+        yield "Error", str(record["error"])
+
+
+# -- Formats --------------------------------------------------------------------
+
+
+def iter_json(sections: Sections) -> Iterator[str]:
+    """One JSON object with a list per section"""
+    indent = 2 if FORMATS_CONFIG["json"]["pretty_print"] else None
+    # Newline plus indentation for the section and record levels
+    section_pad, record_pad = ("\n  ", "\n    ") if indent else ("", "")
+    yield "{"
+    first = True
+    if FORMATS_CONFIG["json"]["include_metadata"]:
+        yield f'{section_pad}"metadata": {json.dumps(_metadata(sections), ensure_ascii=False)}'
+        first = False
+    for name, records in sections.items():
+        yield f'{"" if first else ","}{section_pad}{json.dumps(name)}: ['
+        first = False
+        separator = ""
+        for record in records:
+            text = json.dumps(_as_dict(record), ensure_ascii=False, indent=indent)
+            if indent:
+                text = text.replace("\n", "\n    ")
+            yield f"{separator}{record_pad}{text}"
+            separator = ","
+        yield f"{section_pad}]"
+    yield f"{section_pad[:1]}}}\n"
+
+
+def iter_jsonl(sections: Sections) -> Iterator[str]:
+    """One JSON line per record, tagged with its section"""
+    if FORMATS_CONFIG["json"]["include_metadata"]:
+        yield json.dumps({"metadata": _metadata(sections)}, ensure_ascii=False) + "\n"
+    for name, records in sections.items():
+        for record in records:
+            line = {"section": name, **_as_dict(record)}
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+
+
+def iter_markdown(sections: Sections) -> Iterator[str]:
+    metadata = _metadata(sections)
+    yield f"# {metadata['app']} Export\n\n_Exported {metadata['exported']}_\n\n"
+    if FORMATS_CONFIG["markdown"]["include_toc"]:
+        for name in sections:
+            anchor = re.sub(r"[^\w-]", "", name.lower().replace(" ", "-"))
+            yield f"- [{name.title()}](#{anchor})\n"
+        yield "\n"
+    for name, records in sections.items():
+        yield f"## {name.title()}\n\n"
+        for record in map(_as_dict, records):
+            meta = " · ".join(
+                str(record[key])
+                for key in ("timestamp", "status", "model")
+                if record.get(key)
+            )
+            yield f"### {_title(record)}\n\n" + (f"_{meta}_\n\n" if meta else "")
+            for heading, text in _bodies(record):
+                if heading:
+                    yield f"#### {heading}\n\n"
+                yield f"{text}\n\n"
+            if record.get("code"):
+                code = str(record["code"]).rstrip("\n")
+                # A fence longer than any backtick run inside the code
+                longest = max(map(len, _BACKTICKS_RE.findall(code)), default=2)
+                fence = "`" * (longest + 1)
+                yield f"{fence}{_fence_for(record.get('language'))}\n{code}\n{fence}\n\n"
+
+
+def iter_html(sections: Sections) -> Iterator[str]:
+    metadata = _metadata(sections)
+    settings = FORMATS_CONFIG["html"]
+    yield '<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n'
+    if settings["responsive"]:
+        yield '<meta name="viewport" content="width=device-width, initial-scale=1">\n'
+    yield f"<title>{html.escape(metadata['app'])} Export</title>\n"
+    if settings["include_css"]:
+        yield f"<style>{HTML_CSS}</style>\n"
+    yield (
+        f"</head>\n<body>\n<h1>{html.escape(metadata['app'])} Export</h1>\n"
+        f"<p class=\"meta\">Exported {metadata['exported']}</p>\n"
+    )
+    for name, records in sections.items():
+        yield f"<section>\n<h2>{html.escape(name.title())}</h2>\n"
+        for record in map(_as_dict, records):
+            meta = " · ".join(
+                str(record[key])
+                for key in ("timestamp", "status", "model")
+                if record.get(key)
+            )
+            yield f"<article>\n<h3>{html.escape(_title(record))}</h3>\n"
+            if meta:
+                yield f'<p class="meta">{html.escape(meta)}</p>\n'
+            for heading, text in _bodies(record):
+                if heading:
+                    yield f"<h4>{html.escape(heading)}</h4>\n"
+                yield f'<pre class="content">{html.escape(text)}</pre>\n'
+            if record.get("code"):
+                yield f'<pre class="code"><code>{html.escape(str(record["code"]))}</code></pre>\n'
+            yield "</article>\n"
+        yield "</section>\n"
+    yield "</body>\n</html>\n"
+
+
+WRITERS = {
+    "json": iter_json,
+    "jsonl": iter_jsonl,
+    "markdown": iter_markdown,
+    "html": iter_html,
+}
+
+
+def iter_export(sections: Sections, fmt: str) -> Iterator[str]:
+    """Text pieces of the export document, generated lazily"""
+    if fmt not in WRITERS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    return WRITERS[fmt](sections)
+
+
+def write_export(
+    sections: Sections, fmt: str, out: IO[bytes], compress: bool = None
+) -> int:
+    """Stream the export into a binary file object; returns bytes written
+
+    Pieces are gathered into writes of ``buffer_bytes`` so that small
+    pieces do not each cost a write or a gzip flush.
+    """
+    if compress is None:
+        compress = STREAM_CONFIG["gzip"]
+    target = gzip.GzipFile(fileobj=out, mode="wb") if compress else out
+    limit = STREAM_CONFIG["buffer_bytes"]
+    pending: List[bytes] = []
+    size = written = 0
+    try:
+        for piece in iter_export(sections, fmt):
+            data = piece.encode("utf-8")
+            pending.append(data)
+            size += len(data)
+            if size >= limit:
+                target.write(b"".join(pending))
+                written += size
+                pending.clear()
+                size = 0
+        target.write(b"".join(pending))
+        written += size
+    finally:
+        if compress:
+            target.close()
+    return written
+
+
+def export_to_file(
+    sections: Sections, fmt: str, path: str, compress: bool = None
+) -> int:
+    with open(path, "wb") as out:
+        return write_export(sections, fmt, out, compress)
+
+
+def export_filename(stem: str, fmt: str, compress: bool = None) -> str:
+    if compress is None:
+        compress = STREAM_CONFIG["gzip"]
+    return stem + FORMATS[fmt][0] + (".gz" if compress else "")
+
+
+def iter_jsonl_records(path: str) -> Iterator[Dict[str, object]]:
+    """Records of a JSONL file such as batch_cli output, read lazily"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Export batch_cli JSONL results to another format"
+    )
+    parser.add_argument("input", help="JSONL results file (optionally .gz)")
+    parser.add_argument("--format", choices=enabled_formats(), default="markdown")
+    parser.add_argument("--output", help="Output file (default: next to the input)")
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        default=STREAM_CONFIG["gzip"],
+        help="Compress the output",
+    )
+    args = parser.parse_args(argv)
+    if not args.output:
+        stem = re.sub(r"\.jsonl(\.gz)?$", "", args.input)
+        args.output = export_filename(stem, args.format, args.gzip)
+    return args
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    if os.path.abspath(args.output) == os.path.abspath(args.input):
+        print("Output would overwrite the input", file=sys.stderr)
+        return 1
+    written = export_to_file(
+        {"results": iter_jsonl_records(args.input)},
+        args.format,
+        args.output,
+        args.gzip,
+    )
+    print(
+        f"Wrote {args.output} ({written:,} bytes before compression)", file=sys.stderr
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,59 +1,458 @@
-from openai import OpenAI
-import google.generativeai as genai
-from typing import List, Dict, Any
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Hashable, Iterator, Tuple
 
+from call_metrics import call_metrics, record_usage
+from client_pool import client_pool
+from mock_backend import mock_backend
+from model_router import model_router
+from config import DEBUG_CONFIG, PERFORMANCE_CONFIG
+from provider_registry import Provider, provider_for_model, providers
+from response_cache import response_cache
+from single_flight import single_flight
+from request_scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, request_scheduler
 
-def get_ai_response(prompt: str, api_key: str, model: str) -> str:
-    """Get response from AI model"""
+SYSTEM_PROMPT = "You are an expert programming assistant. Provide detailed, accurate, and well-formatted responses using markdown. Focus on code quality, best practices, and comprehensive analysis."
+
+GEMINI_MODEL = "gemini-2.0-flash"
+
+OPENAI_MODEL_MAP = {
+    "ChatGPT-4o": "gpt-4o",
+    "ChatGPT-4": "gpt-4",
+    "GPT-3.5-Turbo": "gpt-3.5-turbo",
+    "ChatGPT": "gpt-3.5-turbo",
+}
+
+# Provider failures are reported as strings; never cache them
+ERROR_PREFIXES = (
+    "Error:",
+    "OpenAI API Error:",
+    "Gemini API Error:",
+    "Model not supported",
+)
+
+# Keep-alive settings for the pooled OpenAI HTTP connections
+HTTP_LIMITS = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 120,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Return the shared worker pool for concurrent AI requests"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=PERFORMANCE_CONFIG["parallel_processing"]["max_workers"],
+                thread_name_prefix="ai-request",
+            )
+        return _executor
+
+
+def _load_openai() -> Provider:
+    """Import the OpenAI SDK; called by the registry on first use"""
+    import httpx
+    from openai import DefaultHttpxClient, OpenAI
+
+    limits = httpx.Limits(**HTTP_LIMITS)
+
+    def build(api_key: str) -> OpenAI:
+        """Create an OpenAI client backed by a keep-alive connection pool"""
+        # Retries are owned by request_scheduler, so disable the SDK's own
+        return OpenAI(
+            api_key=api_key,
+            max_retries=0,
+            http_client=DefaultHttpxClient(limits=limits),
+        )
+
+    def warm(client: OpenAI) -> None:
+        # Free metadata request that opens the TLS connection in the pool
+        client.models.list(timeout=10)
+
+    return Provider("openai", build, lambda client: client.close(), warm)
+
+
+def _load_gemini() -> Provider:
+    """Import the Gemini SDK; called by the registry on first use"""
+    from google.ai import generativelanguage as glm
+
+    def build(api_key: str) -> glm.GenerativeServiceClient:
+        """Create a Gemini client configured with its own key
+
+        genai.configure() sets one process-wide key; a client per key keeps
+        concurrent sessions with different keys isolated.
+        """
+        return glm.GenerativeServiceClient(client_options={"api_key": api_key})
+
+    def close(client: glm.GenerativeServiceClient) -> None:
+        client.transport.close()
+
+    return Provider("gemini", build, close)
+
+
+providers.register("openai", _load_openai)
+providers.register("gemini", _load_gemini)
+
+
+def _build_openai_client(api_key: str) -> Any:
+    return providers.get("openai").build(api_key)
+
+
+def _close_openai_client(client: Any) -> None:
+    providers.get("openai").close(client)
+
+
+def _build_gemini_client(api_key: str) -> Any:
+    return providers.get("gemini").build(api_key)
+
+
+def _close_gemini_client(client: Any) -> None:
+    providers.get("gemini").close(client)
+
+
+def warm_up_provider(model: str, api_key: str) -> None:
+    """Import the SDK for a model and open its connection in the background"""
+    provider = provider_for_model(model)
+    if provider and api_key and not DEBUG_CONFIG["mock_ai_responses"]:
+        providers.warm_up(provider, api_key)
+
+
+def _openai_request(prompt: str, model: str) -> Dict[str, Any]:
+    """Build the chat-completions arguments shared by blocking and streaming calls"""
+    return {
+        "model": OPENAI_MODEL_MAP.get(model, "gpt-3.5-turbo"),
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.5,
+        "max_tokens": 4000,
+    }
+
+
+def _record_openai_usage(usage: Any) -> None:
+    if usage is not None:
+        record_usage(usage.prompt_tokens, usage.completion_tokens)
+
+
+def _gemini_request(prompt: str) -> Dict[str, Any]:
+    """Build the generate-content request shared by blocking and streaming calls"""
+    return {
+        "model": f"models/{GEMINI_MODEL}",
+        "contents": [
+            {
+                "role": "user",
+                "parts": [{"text": f"{SYSTEM_PROMPT}\n\nPrompt: {prompt}"}],
+            }
+        ],
+    }
+
+
+def _gemini_text(response: Any) -> str:
+    return "".join(
+        part.text
+        for candidate in response.candidates[:1]
+        for part in candidate.content.parts
+    )
+
+
+def _record_gemini_usage(usage: Any) -> None:
+    if usage is not None:
+        record_usage(usage.prompt_token_count, usage.candidates_token_count)
+
+
+def is_error_response(text: str) -> bool:
+    """Whether a response string is one of the provider error messages"""
+    return not text or text.startswith(ERROR_PREFIXES)
+
+
+def get_ai_response(
+    prompt: str,
+    api_key: str,
+    model: str,
+    priority: int = PRIORITY_INTERACTIVE,
+    cache_prompt: str = None,
+) -> str:
+    """Get response from AI model, served from the response cache when possible
+
+    ``cache_prompt`` stands in for the prompt when building the cache key,
+    e.g. with embedded code replaced by a formatting-insensitive fingerprint.
+    """
+    model = model_router.route(model, prompt)
+    with call_metrics.track(model, prompt) as call:
+        cache_key = response_cache.make_key(
+            model, SYSTEM_PROMPT, cache_prompt or prompt
+        )
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            call.outcome = "cache_hit"
+            call.set_response(cached, error=False)
+            return cached
+
+        # Identical requests already running are shared, not repeated
+        try:
+            response, coalesced = single_flight.call(
+                cache_key, lambda: _call_ai_model(prompt, api_key, model, priority)
+            )
+        except Exception as e:
+            response, coalesced = f"Error: {str(e)}", True
+        error = is_error_response(response)
+        call.set_response(response, error)
+        if coalesced:
+            if not error:
+                call.outcome = "coalesced"
+        elif not error:
+            response_cache.set(cache_key, response)
+        return response
+
+
+def _call_ai_model(prompt: str, api_key: str, model: str, priority: int) -> str:
+    """Dispatch a prompt to the provider backing the selected model"""
     try:
-        if "ChatGPT" in model or "GPT" in model:
-            return get_openai_response(prompt, api_key, model)
-        elif "Gemini" in model:
-            return get_gemini_response(prompt, api_key)
+        provider = provider_for_model(model)
+        if DEBUG_CONFIG["mock_ai_responses"]:
+            return get_mock_response(prompt, api_key, model, priority)
+        elif provider == "openai":
+            return get_openai_response(prompt, api_key, model, priority)
+        elif provider == "gemini":
+            return get_gemini_response(prompt, api_key, priority)
         else:
             return "Model not supported yet. Please select ChatGPT or Gemini."
     except Exception as e:
         return f"Error: {str(e)}"
 
 
-def get_openai_response(prompt: str, api_key: str, model: str) -> str:
+def get_openai_response(
+    prompt: str, api_key: str, model: str, priority: int = PRIORITY_INTERACTIVE
+) -> str:
     """Get response from OpenAI models using the new v1.0+ API"""
-    try:
-        client = OpenAI(api_key=api_key)
-
-        model_map = {
-            "ChatGPT-4o": "gpt-4o",
-            "ChatGPT-4": "gpt-4",
-            "GPT-3.5-Turbo": "gpt-3.5-turbo",
-            "ChatGPT": "gpt-3.5-turbo",
-        }
-
-        response = client.chat.completions.create(
-            model=model_map.get(model, "gpt-3.5-turbo"),
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert programming assistant. Provide detailed, accurate, and well-formatted responses using markdown. Focus on code quality, best practices, and comprehensive analysis.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.5,
-            max_tokens=4000,
-        )
+
+    def call(timeout: float) -> str:
+        with client_pool.lease(
+            "openai", api_key, _build_openai_client, _close_openai_client
+        ) as client:
+            response = client.chat.completions.create(
+                **_openai_request(prompt, model), timeout=timeout
+            )
+        _record_openai_usage(getattr(response, "usage", None))
         return response.choices[0].message.content
+
+    try:
+        return request_scheduler.run(api_key, call, priority)
     except Exception as e:
         return f"OpenAI API Error: {str(e)}"
 
 
-def get_gemini_response(prompt: str, api_key: str) -> str:
+def get_gemini_response(
+    prompt: str, api_key: str, priority: int = PRIORITY_INTERACTIVE
+) -> str:
     """Get response from Google Gemini"""
+
+    def call(timeout: float) -> str:
+        with client_pool.lease(
+            "gemini", api_key, _build_gemini_client, _close_gemini_client
+        ) as client:
+            response = client.generate_content(
+                request=_gemini_request(prompt), timeout=timeout
+            )
+        _record_gemini_usage(getattr(response, "usage_metadata", None))
+        return _gemini_text(response)
+
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel("gemini-2.0-flash")
+        return request_scheduler.run(api_key, call, priority)
+    except Exception as e:
+        return f"Gemini API Error: {str(e)}"
+
+
+def get_mock_response(
+    prompt: str, api_key: str, model: str, priority: int = PRIORITY_INTERACTIVE
+) -> str:
+    """Get a simulated response from the local mock backend (MOCK_AI=true)"""
 
-        response = model.generate_content(
-            f"You are an expert programming assistant. Provide detailed, accurate, and well-formatted responses using markdown. Focus on code quality, best practices, and comprehensive analysis.\n\nPrompt: {prompt}"
+    def call(timeout: float) -> str:
+        return mock_backend.complete(prompt, model, timeout)
+
+    try:
+        return request_scheduler.run(api_key or "mock", call, priority)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def stream_ai_response(
+    prompt: str,
+    api_key: str,
+    model: str,
+    cache_prompt: str = None,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> Iterator[str]:
+    """Stream response chunks from AI model, replaying cached responses instantly"""
+    model = model_router.route(model, prompt)
+    with call_metrics.track(model, prompt) as call:
+        cache_key = response_cache.make_key(
+            model, SYSTEM_PROMPT, cache_prompt or prompt
         )
-        return response.text
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            call.outcome = "cache_hit"
+            call.first_token()
+            call.set_response(cached, error=False)
+            yield cached
+            return
+
+        stream, coalesced = single_flight.stream(
+            cache_key, lambda: _stream_ai_model(prompt, api_key, model, priority)
+        )
+        chunks = []
+        try:
+            for chunk in stream:
+                call.first_token()
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            # Only a shared stream raises; provider errors arrive as text
+            chunks.append(f"Error: {str(e)}")
+            yield chunks[-1]
+        finally:
+            stream.close()
+
+        response = "".join(chunks)
+        error = is_error_response(response)
+        call.set_response(response, error)
+        if coalesced:
+            if not error:
+                call.outcome = "coalesced"
+        elif not error:
+            response_cache.set(cache_key, response)
+
+
+def _stream_ai_model(
+    prompt: str, api_key: str, model: str, priority: int
+) -> Iterator[str]:
+    """Dispatch a streaming prompt to the provider backing the selected model"""
+    try:
+        provider = provider_for_model(model)
+        if DEBUG_CONFIG["mock_ai_responses"]:
+            yield from stream_mock_response(prompt, api_key, model, priority)
+        elif provider == "openai":
+            yield from stream_openai_response(prompt, api_key, model, priority)
+        elif provider == "gemini":
+            yield from stream_gemini_response(prompt, api_key, priority)
+        else:
+            yield "Model not supported yet. Please select ChatGPT or Gemini."
     except Exception as e:
-        return f"Gemini API Error: {str(e)}"
+        yield f"Error: {str(e)}"
+
+
+def stream_openai_response(
+    prompt: str, api_key: str, model: str, priority: int = PRIORITY_INTERACTIVE
+) -> Iterator[str]:
+    """Stream response chunks from OpenAI models"""
+
+    def open_stream(timeout: float) -> Iterator[str]:
+        with client_pool.lease(
+            "openai", api_key, _build_openai_client, _close_openai_client
+        ) as client:
+            stream = client.chat.completions.create(
+                **_openai_request(prompt, model),
+                stream=True,
+                stream_options={"include_usage": True},
+                timeout=timeout,
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                # The final chunk carries usage and no choices
+                _record_openai_usage(getattr(chunk, "usage", None))
+
+    try:
+        yield from request_scheduler.stream(api_key, open_stream, priority)
+    except Exception as e:
+        yield f"OpenAI API Error: {str(e)}"
+
+
+def stream_gemini_response(
+    prompt: str, api_key: str, priority: int = PRIORITY_INTERACTIVE
+) -> Iterator[str]:
+    """Stream response chunks from Google Gemini"""
+
+    def open_stream(timeout: float) -> Iterator[str]:
+        with client_pool.lease(
+            "gemini", api_key, _build_gemini_client, _close_gemini_client
+        ) as client:
+            stream = client.stream_generate_content(
+                request=_gemini_request(prompt), timeout=timeout
+            )
+            for chunk in stream:
+                text = _gemini_text(chunk)
+                if text:
+                    yield text
+                _record_gemini_usage(getattr(chunk, "usage_metadata", None))
+
+    try:
+        yield from request_scheduler.stream(api_key, open_stream, priority)
+    except Exception as e:
+        yield f"Gemini API Error: {str(e)}"
+
+
+def stream_mock_response(
+    prompt: str, api_key: str, model: str, priority: int = PRIORITY_INTERACTIVE
+) -> Iterator[str]:
+    """Stream simulated response chunks from the local mock backend"""
+
+    def open_stream(timeout: float) -> Iterator[str]:
+        return mock_backend.stream(prompt, model, timeout)
+
+    try:
+        yield from request_scheduler.stream(api_key or "mock", open_stream, priority)
+    except Exception as e:
+        yield f"Error: {str(e)}"
+
+
+def iter_ai_responses_parallel(
+    prompts: Dict[Hashable, str],
+    api_key: str,
+    model: str,
+    priority: int = PRIORITY_BULK,
+    cache_prompts: Dict[Hashable, str] = None,
+) -> Iterator[Tuple[Hashable, str]]:
+    """Run several prompts concurrently and yield (name, response) as each finishes
+
+    Fan-out requests default to bulk priority so interactive chat on the
+    same key is admitted first when the rate limit is tight.
+    ``cache_prompts`` optionally maps names to cache identities as in
+    get_ai_response.
+    """
+    cache_prompts = cache_prompts or {}
+    if not PERFORMANCE_CONFIG["parallel_processing"]["enabled"]:
+        for name, prompt in prompts.items():
+            yield name, get_ai_response(
+                prompt, api_key, model, priority, cache_prompts.get(name)
+            )
+        return
+
+    executor = _get_executor()
+    # Run each request in a copy of the caller's context so call metrics
+    # are attributed to the caller's action
+    futures = {
+        executor.submit(
+            contextvars.copy_context().run,
+            get_ai_response,
+            prompt,
+            api_key,
+            model,
+            priority,
+            cache_prompts.get(name),
+        ): name
+        for name, prompt in prompts.items()
+    }
+    for future in as_completed(futures):
+        try:
+            yield futures[future], future.result()
+        except Exception as e:
+            yield futures[future], f"Error: {str(e)}"
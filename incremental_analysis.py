@@ -0,0 +1,190 @@
+"""
+Incremental Analysis
+====================
+
+Re-analyzes only the functions that changed since the previous run. Code is
+split into units (one per function or method, plus the statements between
+them), and each unit's result is remembered under its code fingerprint. On
+the next run only added or edited units go to the model. The rest are
+filled in from the previous run, so latency and token spend follow the size
+of the edit rather than the size of the file.
+
+Fingerprints ignore formatting and comments (see code_fingerprint), so
+reindenting or commenting a function does not count as a change.
+"""
+
+import re
+import textwrap
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Tuple
+
+from call_metrics import estimate_tokens
+from code_chunker import CodeChunk, split_units
+from code_fingerprint import cache_prompt, code_fingerprint
+from code_minifier import prompt_code
+from helper_ai import is_error_response, iter_ai_responses_parallel
+
+UNIT_TEMPLATE = (
+    "You are reviewing one unit ({name}) of a larger {language} file. "
+    "Answer only for this unit; answers for the other units are merged "
+    "separately.\n\nTask: {task}\n\nCode:\n{code}"
+)
+
+# Previous-run results are kept for this many distinct tasks
+MAX_TASKS = 16
+
+_NAME_RE = re.compile(r"^\s*(?:async\s+)?(?:def|class|fn|func|function)\s+(\w+)", re.M)
+
+
+def _unit_name(unit: CodeChunk) -> str:
+    match = _NAME_RE.search(unit.text)
+    return match.group(1) if match else "top-level statements"
+
+
+def _unit_prompt(task: str, unit: CodeChunk, code: str, language: str) -> str:
+    return UNIT_TEMPLATE.format(
+        name=_unit_name(unit),
+        language=language or "source",
+        task=task,
+        code=code,
+    )
+
+
+class IncrementalRun(NamedTuple):
+    """Merged results of one run and what it cost"""
+
+    results: Dict[str, str]
+    units: int
+    changed: int
+    reused: int
+    tokens_sent: int
+    tokens_total: int
+
+
+class IncrementalAnalyzer:
+    """Per-unit result store for one session's Process Code runs"""
+
+    def __init__(self, max_tasks: int = MAX_TASKS):
+        self.max_tasks = max_tasks
+        # task text -> {unit fingerprint -> result}
+        self._results: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._results.clear()
+
+    def _known(self, task: str) -> Dict[str, str]:
+        with self._lock:
+            known = self._results.get(task)
+            if known is None:
+                return {}
+            self._results.move_to_end(task)
+            return dict(known)
+
+    def _store(self, task: str, results: Dict[str, str]) -> None:
+        # Only the current file's units are kept, so memory follows the file
+        with self._lock:
+            self._results[task] = results
+            self._results.move_to_end(task)
+            while len(self._results) > self.max_tasks:
+                self._results.popitem(last=False)
+
+    def analyze(
+        self,
+        tasks: Dict[str, str],
+        code: str,
+        api_key: str,
+        model: str,
+        language: str = None,
+        on_result: Callable[[str, str], None] = None,
+    ) -> IncrementalRun:
+        """Answer each task over code, sending only units not seen before
+
+        ``on_result(name, result)`` is called as soon as each task's units
+        are all answered, before the run as a whole finishes.
+        """
+        units = split_units(code)
+        # Methods are indented; dedent so they fingerprint like top-level code
+        fingerprints = [
+            code_fingerprint(textwrap.dedent(unit.text), language) for unit in units
+        ]
+        known = {name: self._known(task) for name, task in tasks.items()}
+        texts = {}
+
+        prompts: Dict[Tuple[str, int], str] = {}
+        cache_prompts: Dict[Tuple[str, int], str] = {}
+        pending: Dict[Tuple[str, str], Tuple[str, int]] = {}
+        for name, task in tasks.items():
+            for i, (unit, fp) in enumerate(zip(units, fingerprints)):
+                # Identical units within a file are sent once
+                if fp in known[name] or (name, fp) in pending:
+                    continue
+                pending[(name, fp)] = (name, i)
+                if i not in texts:
+                    texts[i] = prompt_code(unit.text, language)
+                prompts[(name, i)] = _unit_prompt(task, unit, texts[i], language)
+                cache_prompts[(name, i)] = cache_prompt(
+                    prompts[(name, i)], texts[i], language
+                )
+
+        answers: Dict[Tuple[str, int], str] = {}
+        results: Dict[str, str] = {}
+
+        def finish(name: str) -> None:
+            task = tasks[name]
+            fresh = {
+                fp: answers[key]
+                for (task_name, fp), key in pending.items()
+                if task_name == name
+            }
+            by_fp = {**known[name], **fresh}
+            sections = []
+            for unit, fp in zip(units, fingerprints):
+                marker = "" if fp in fresh else " · unchanged"
+                sections.append(
+                    f"### `{_unit_name(unit)}` (lines {unit.start_line}-"
+                    f"{unit.end_line}{marker})\n\n{by_fp[fp]}"
+                )
+            results[name] = "\n\n".join(sections)
+            self._store(
+                task,
+                {
+                    fp: by_fp[fp]
+                    for fp in fingerprints
+                    if not is_error_response(by_fp[fp])
+                },
+            )
+            if on_result is not None:
+                on_result(name, results[name])
+
+        outstanding = {name: 0 for name in tasks}
+        for name, _ in prompts:
+            outstanding[name] += 1
+        for name, count in outstanding.items():
+            if not count:
+                finish(name)
+        for key, answer in iter_ai_responses_parallel(
+            prompts, api_key, model, cache_prompts=cache_prompts
+        ):
+            answers[key] = answer
+            outstanding[key[0]] -= 1
+            if not outstanding[key[0]]:
+                finish(key[0])
+        results = {name: results[name] for name in tasks}
+
+        changed = {fingerprints[i] for _, i in prompts}
+
+        return IncrementalRun(
+            results=results,
+            units=len(units),
+            changed=sum(fp in changed for fp in fingerprints),
+            reused=sum(fp not in changed for fp in fingerprints),
+            tokens_sent=sum(estimate_tokens(p) for p in prompts.values()),
+            tokens_total=sum(
+                estimate_tokens(_unit_prompt(task, unit, unit.text, language))
+                for task in tasks.values()
+                for unit in units
+            ),
+        )
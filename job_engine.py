@@ -0,0 +1,286 @@
+"""
+Job Engine
+==========
+
+Runs long AI analyses on background threads so the Streamlit script never
+blocks on a model call. Widget interactions and reruns no longer interrupt
+work in flight. Settings live in ``PERFORMANCE_CONFIG["jobs"]``.
+
+Every job gets an id, a status and a progress value, and the UI polls them
+on each rerun. A job function receives its ``Job`` as the first argument.
+It reports progress with ``job.report()``, publishes partial output with
+``job.emit()``, and calls ``job.check()`` between steps to honour
+cancellation and its deadline. A job that is cancelled or overruns its
+deadline is marked finished at once, and whatever its thread returns
+afterwards is discarded.
+
+Finished jobs wait until their owner (a session id) collects them with
+``collect()``. Uncollected results from abandoned sessions are dropped
+after ``keep_finished`` seconds.
+"""
+
+import contextvars
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from config import PERFORMANCE_CONFIG
+
+JOBS_CONFIG = PERFORMANCE_CONFIG["jobs"]
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed out"
+FINISHED = (DONE, FAILED, CANCELLED, TIMED_OUT)
+
+
+class JobCancelled(Exception):
+    """Raised by Job.check() once the job is cancelled or out of time"""
+
+
+class Job:
+    """A unit of background work and its observable state"""
+
+    def __init__(
+        self,
+        job_id: str,
+        title: str,
+        kind: str = "",
+        owner: str = None,
+        deadline: float = None,
+        meta: Dict[str, Any] = None,
+    ):
+        self.id = job_id
+        self.title = title
+        self.kind = kind
+        self.owner = owner
+        self.meta = meta or {}
+        self.created = time.time()
+        self.deadline_at = self.created + deadline if deadline else None
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.fraction = 0.0
+        self.message = ""
+        self._status = QUEUED
+        self._partial: List[str] = []
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def status(self) -> str:
+        if (
+            self.deadline_at is not None
+            and time.time() > self.deadline_at
+            and self._status not in FINISHED
+        ):
+            self._finish(TIMED_OUT, error="Deadline exceeded")
+        return self._status
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished or time.time()
+        return end - (self.started or self.created)
+
+    @property
+    def partial(self) -> str:
+        """Output emitted so far"""
+        with self._lock:
+            return "".join(self._partial)
+
+    # -- Called from the job function ---------------------------------------
+
+    def report(self, done: float, total: float = 1.0, message: str = "") -> None:
+        """Update progress as done out of total steps"""
+        self.fraction = min(1.0, done / total) if total else 1.0
+        if message:
+            self.message = message
+
+    def emit(self, text: str) -> None:
+        """Append partial output, e.g. streamed tokens"""
+        with self._lock:
+            self._partial.append(text)
+
+    def check(self) -> None:
+        """Raise JobCancelled if the job should stop"""
+        if self._cancel.is_set() or self.done:
+            raise JobCancelled(self.id)
+
+    # -- Called by the engine ------------------------------------------------
+
+    def cancel(self) -> bool:
+        """Request cancellation; returns False if the job already finished"""
+        self._cancel.set()
+        return self._finish(CANCELLED)
+
+    def _start(self) -> bool:
+        with self._lock:
+            if self._status != QUEUED:
+                return False
+            self._status = RUNNING
+            self.started = time.time()
+            return True
+
+    def _finish(self, status: str, result: Any = None, error: str = None) -> bool:
+        with self._lock:
+            if self._status in FINISHED:
+                return False
+            self._status = status
+            self.result = result
+            self.error = error
+            self.finished = time.time()
+            if status == DONE:
+                self.fraction = 1.0
+        if status != DONE:
+            self._cancel.set()
+        return True
+
+
+class JobEngine:
+    """Thread pool of background jobs, tracked by id and owner"""
+
+    def __init__(
+        self, max_workers: int = 4, deadline: float = 300, keep_finished: float = 600
+    ):
+        self.max_workers = max_workers
+        self.deadline = deadline
+        self.keep_finished = keep_finished
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @classmethod
+    def from_config(cls) -> "JobEngine":
+        return cls(
+            JOBS_CONFIG["max_workers"],
+            JOBS_CONFIG["deadline"],
+            JOBS_CONFIG["keep_finished"],
+        )
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Separate from helper_ai's request pool, which jobs fan out into
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="ai-job"
+                )
+            return self._executor
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        title: str,
+        kind: str = "",
+        owner: str = None,
+        deadline: float = None,
+        meta: Dict[str, Any] = None,
+        delay: float = 0,
+        **kwargs,
+    ) -> Job:
+        """Queue fn(job, *args, **kwargs) and return its Job at once
+
+        The job runs in a copy of the caller's context, so the action scope
+        and model pinning of the submitting script run still apply. With
+        ``delay`` it waits that many seconds, without holding a worker,
+        before it is queued; cancelling it in the meantime means it never
+        runs.
+        """
+        job = Job(
+            uuid.uuid4().hex[:12],
+            title,
+            kind,
+            owner,
+            deadline if deadline is not None else self.deadline,
+            meta,
+        )
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        context = contextvars.copy_context()
+
+        def enqueue() -> None:
+            self._get_executor().submit(context.run, self._run, job, fn, args, kwargs)
+
+        if delay > 0:
+            timer = threading.Timer(delay, enqueue)
+            timer.daemon = True
+            timer.start()
+        else:
+            enqueue()
+        return job
+
+    @staticmethod
+    def _run(job: Job, fn: Callable[..., Any], args, kwargs) -> None:
+        if not job._start():
+            return
+        try:
+            result = fn(job, *args, **kwargs)
+        except JobCancelled:
+            # cancel() or the deadline check already recorded the outcome
+            job._finish(CANCELLED)
+        except Exception as e:
+            job._finish(FAILED, error=str(e))
+        else:
+            job._finish(DONE, result)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.keep_finished
+        stale = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.done and job.finished < cutoff
+        ]
+        for job_id in stale:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, owner: str = None) -> List[Job]:
+        """Jobs not yet collected, oldest first"""
+        with self._lock:
+            return [
+                job
+                for job in self._jobs.values()
+                if owner is None or job.owner == owner
+            ]
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        return job is not None and job.cancel()
+
+    def collect(self, owner: str = None) -> List[Job]:
+        """Remove and return the owner's finished jobs, oldest first"""
+        with self._lock:
+            finished = [
+                job
+                for job in self._jobs.values()
+                if (owner is None or job.owner == owner) and job.done
+            ]
+            for job in finished:
+                del self._jobs[job.id]
+        return finished
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {status: 0 for status in (QUEUED, RUNNING) + FINISHED}
+        for job in jobs:
+            counts[job.status] += 1
+        return counts
+
+
+# Shared engine; jobs outlive the script run that submitted them
+job_engine = JobEngine.from_config()
@@ -1,23 +1,241 @@
 import streamlit as st
+import os
+import tarfile
+import tempfile
 import time
-from datetime import datetime
-from helper_ai import get_ai_response
+import uuid
+import zipfile
+from typing import Dict, Iterator
+from helper_ai import get_ai_response, stream_ai_response, warm_up_provider
+from code_chunker import iter_code_analyses, stream_code_analysis
+from security_scanner import language_for_path, summarize_findings
+from complexity_metrics import metrics_table
+from analysis_options import (
+    base_sections,
+    build_sections,
+    combined_task,
+    run_local_analysis,
+    section_tasks,
+)
+from chat_view import ChatWindow, prepare_markdown
+from code_minifier import minification_stats
+from conversation_memory import ConversationMemory
+from exporter import (
+    FORMATS,
+    STREAM_CONFIG,
+    enabled_formats,
+    export_filename,
+    write_export,
+)
+from incremental_analysis import IncrementalAnalyzer
+from job_engine import DONE, Job, job_engine
+from project_index import ProjectIndex, is_archive
+from prefetch import PREFETCH_CONFIG, QUICK_ACTIONS, QuickActionPrefetcher
+from response_cache import response_cache
+from request_scheduler import PRIORITY_INTERACTIVE, request_scheduler
+from session_history import SessionHistory
+from single_flight import single_flight
+from call_metrics import action_scope, call_metrics, start_metrics_server
+from model_router import model_router, set_pinned
+from config import DEBUG_CONFIG, PERFORMANCE_CONFIG
 
 
 def initialize_session_state():
     """Initialize session state variables"""
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
     if "api_key" not in st.session_state:
         st.session_state.api_key = ""
     if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
+        st.session_state.chat_history = SessionHistory.for_chat()
+    if "prefetcher" not in st.session_state:
+        st.session_state.prefetcher = QuickActionPrefetcher.from_config()
+    if "chat_window" not in st.session_state:
+        st.session_state.chat_window = ChatWindow.from_config()
+    if "conversation_memory" not in st.session_state:
+        st.session_state.conversation_memory = ConversationMemory()
     if "code_history" not in st.session_state:
-        st.session_state.code_history = []
+        st.session_state.code_history = SessionHistory.for_code()
+    if "incremental_analyzer" not in st.session_state:
+        st.session_state.incremental_analyzer = IncrementalAnalyzer()
+    if "project_index" not in st.session_state:
+        st.session_state.project_index = ProjectIndex.from_config()
+    if "indexed_uploads" not in st.session_state:
+        st.session_state.indexed_uploads = set()
+    if "upload_generation" not in st.session_state:
+        st.session_state.upload_generation = 0
+    if "open_file" not in st.session_state:
+        st.session_state.open_file = None
     if "current_code" not in st.session_state:
         st.session_state.current_code = ""
+    if "current_language" not in st.session_state:
+        st.session_state.current_language = None
     if "selected_ai_model" not in st.session_state:
         st.session_state.selected_ai_model = "ChatGPT-4o"
 
 
+def stream_assistant_reply(container, response_stream: Iterator[str]) -> str:
+    """Render the AI reply in the chat as it streams and return the full text"""
+    with container:
+        with st.chat_message("user"):
+            st.write(st.session_state.chat_history[-1]["content"])
+        with st.chat_message("assistant"):
+            response = st.write_stream(response_stream)
+    return response
+
+
+def stream_code_reply(task: str, template: str, context: str = "") -> Iterator[str]:
+    """Stream an answer about the current code, chunking large files"""
+    return stream_code_analysis(
+        task,
+        st.session_state.current_code,
+        st.session_state.api_key,
+        getattr(st.session_state, "selected_ai_model", "ChatGPT-4o"),
+        template=template,
+        language=st.session_state.current_language,
+        context=context,
+    )
+
+
+def stream_job(job: Job, response_stream: Iterator[str]) -> str:
+    """Background job body: consume a response stream, publishing each token"""
+    try:
+        for token in response_stream:
+            job.check()
+            job.emit(token)
+    finally:
+        response_stream.close()
+    return job.partial
+
+
+def analysis_job(
+    job: Job,
+    mode: str,
+    tasks: Dict[str, str],
+    code: str,
+    api_key: str,
+    model: str,
+    language: str,
+    analyzer: IncrementalAnalyzer = None,
+) -> str:
+    """Background job body for Process Code; returns the combined report"""
+    # Each section is shown in the job panel as soon as it completes
+    results = {}
+
+    def section_ready(title: str, result: str) -> None:
+        job.check()
+        results[title] = result
+        job.emit(f"## {title}\n\n{result}\n\n")
+        job.report(len(results), len(tasks), f"{title} ready")
+
+    if mode == "incremental":
+        job.report(0, 1, "Analyzing changed functions...")
+        run = analyzer.analyze(
+            tasks, code, api_key, model, language=language, on_result=section_ready
+        )
+        job.meta["caption"] = (
+            f"♻️ {run.changed} of {run.units} units re-analyzed, "
+            f"{run.reused} reused · ~{run.tokens_sent:,} of "
+            f"{run.tokens_total:,} tokens sent"
+        )
+        results = run.results
+    elif mode == "parallel":
+        # One request per option; progress advances as each one lands
+        for title, result in iter_code_analyses(
+            tasks,
+            code,
+            api_key,
+            model,
+            language=language,
+            priority=PRIORITY_INTERACTIVE,
+        ):
+            section_ready(title, result)
+        results = {title: results[title] for title in tasks}
+    else:
+        (task,) = tasks.values()
+        job.report(0, 1, "Streaming analysis...")
+        return stream_job(
+            job, stream_code_analysis(task, code, api_key, model, language=language)
+        )
+    return "\n\n".join(f"## {title}\n\n{result}" for title, result in results.items())
+
+
+def submit_quick_action(action: str) -> None:
+    """Ask a canned question about the code as a background chat job
+
+    A ready prefetched answer is shown at once instead.
+    """
+    prompt, template = QUICK_ACTIONS[action]
+    st.session_state.chat_history.append({"role": "user", "content": prompt})
+    prefetched = st.session_state.prefetcher.take(action)
+    if prefetched is not None:
+        st.session_state.chat_history.append(
+            {"role": "assistant", "content": prefetched}
+        )
+        return
+    with action_scope(action):
+        job_engine.submit(
+            stream_job,
+            stream_code_reply(prompt, template),
+            title=action,
+            kind="chat",
+            owner=st.session_state.session_id,
+        )
+
+
+def deliver_finished_jobs() -> None:
+    """Move results of this session's finished jobs into its history"""
+    for job in job_engine.collect(st.session_state.session_id):
+        if job.status == DONE:
+            text = job.result
+        else:
+            text = job.partial + f"\n\n⚠️ {job.title} {job.status}"
+            if job.error:
+                text += f": {job.error}"
+        if job.kind == "chat":
+            st.session_state.chat_history.append({"role": "assistant", "content": text})
+        elif job.kind == "analysis":
+            st.session_state.last_analysis = {
+                "text": text,
+                "caption": job.meta.get("caption", ""),
+            }
+            if job.status == DONE:
+                st.session_state.code_history.add(
+                    "analysis", text, code=job.meta["code"]
+                )
+        st.toast(f"{'✅' if job.status == DONE else '⚠️'} {job.title}: {job.status}")
+
+
+@st.fragment(run_every=1.0)
+def job_panel(kind: str) -> None:
+    """Live status of this session's background jobs of one kind
+
+    Only called while such jobs exist; refreshes itself every second and
+    triggers a full rerun once a job finishes so its result is delivered.
+    """
+    jobs = [
+        job for job in job_engine.jobs(st.session_state.session_id) if job.kind == kind
+    ]
+    if any(job.done for job in jobs):
+        st.rerun()
+
+    for job in jobs:
+        if kind == "chat":
+            box = st.chat_message("assistant")
+        else:
+            box = st.container(border=True)
+        with box:
+            st.caption(f"⏳ {job.title} · {job.status} · {job.elapsed:.0f}s")
+            if kind == "analysis":
+                st.progress(job.fraction, text=job.message or None)
+            partial = job.partial
+            if partial:
+                st.markdown(prepare_markdown(partial))
+            if st.button("✖️ Cancel", key=f"cancel_{job.id}"):
+                job_engine.cancel(job.id)
+                st.rerun()
+
+
 def create_code_chat():
     """Create a compact AI chat interface for right sidebar"""
     # Add visual container with border
@@ -37,7 +255,14 @@ def create_code_chat():
         )
 
         # Compact chat info
-        if st.session_state.current_code:
+        project = st.session_state.project_index
+        if len(project) > 1:
+            stats = project.stats()
+            st.success(
+                f"📚 Project indexed ({stats['files']} files, "
+                f"{stats['passages']} functions)"
+            )
+        elif st.session_state.current_code:
             st.success(
                 f"📝 Code loaded ({len(st.session_state.current_code.split())} words)"
             )
@@ -55,42 +280,47 @@ def create_code_chat():
             if not st.session_state.chat_history:
                 st.info("💡 Ask me anything about your code!")
 
-            # Show all messages with proper chat formatting
-            for message in st.session_state.chat_history:
-                if message["role"] == "user":
-                    with st.chat_message("user"):
-                        st.write(message["content"])
-                else:
-                    with st.chat_message("assistant"):
-                        st.write(message["content"])
+            # Draw only the newest page(s) so reruns stay cheap in long chats
+            window = st.session_state.chat_window
+            messages, hidden = window.visible(st.session_state.chat_history)
+            if hidden and st.button(
+                f"⬆️ Show older messages ({hidden} hidden)",
+                key="show_older_messages",
+                use_container_width=True,
+            ):
+                window.show_older()
+                messages, hidden = window.visible(st.session_state.chat_history)
+
+            for message in messages:
+                role = "user" if message["role"] == "user" else "assistant"
+                with st.chat_message(role):
+                    st.markdown(window.markdown(message))
+
+            # Quick actions answer in the background; show them as they stream
+            if any(
+                job.kind == "chat"
+                for job in job_engine.jobs(st.session_state.session_id)
+            ):
+                job_panel("chat")
 
         st.divider()
 
         # Quick question buttons
         st.write("**⚡ Quick Actions:**")
+        if st.session_state.get("prefetch_quick_actions"):
+            prefetcher = st.session_state.prefetcher
+            statuses = [
+                f"{action}: {'ready' if status == DONE else status}"
+                for action in QUICK_ACTIONS
+                if (status := prefetcher.status(action)) is not None
+            ]
+            if statuses:
+                st.caption("🔮 " + " · ".join(statuses))
         col1, col2 = st.columns(2)
         with col1:
             if st.button("Find Bugs", use_container_width=True, key="find_bugs"):
                 if st.session_state.current_code:
-                    auto_prompt = (
-                        "Review this code and find any potential bugs or issues."
-                    )
-                    st.session_state.chat_history.append(
-                        {"role": "user", "content": auto_prompt}
-                    )
-                    with st.spinner("Finding bugs..."):
-                        context = f"Code to review: {st.session_state.current_code}"
-                        selected_model = getattr(
-                            st.session_state, "selected_ai_model", "ChatGPT-4o"
-                        )
-                        response = get_ai_response(
-                            context + "\n\n" + auto_prompt,
-                            st.session_state.api_key,
-                            selected_model,
-                        )
-                        st.session_state.chat_history.append(
-                            {"role": "assistant", "content": response}
-                        )
+                    submit_quick_action("Find Bugs")
                     st.rerun()
                 else:
                     st.error("Please add some code first!")
@@ -98,48 +328,66 @@ def create_code_chat():
         with col2:
             if st.button("Explain Code", use_container_width=True, key="explain_code"):
                 if st.session_state.current_code:
-                    auto_prompt = "Explain what this code does in simple terms."
-                    st.session_state.chat_history.append(
-                        {"role": "user", "content": auto_prompt}
-                    )
-                    with st.spinner("Explaining code..."):
-                        context = f"Code to explain: {st.session_state.current_code}"
-                        selected_model = getattr(
-                            st.session_state, "selected_ai_model", "ChatGPT-4o"
-                        )
-                        response = get_ai_response(
-                            context + "\n\n" + auto_prompt,
-                            st.session_state.api_key,
-                            selected_model,
-                        )
-                        st.session_state.chat_history.append(
-                            {"role": "assistant", "content": response}
-                        )
+                    submit_quick_action("Explain Code")
                     st.rerun()
                 else:
                     st.error("Please add some code first!")
 
         # Manual chat input
         if prompt := st.chat_input("Type your question...", key="chat_input"):
+            # Carry earlier turns within the memory token budget, folding
+            # older ones into the rolling summary when it overflows
+            selected_model = getattr(
+                st.session_state, "selected_ai_model", "ChatGPT-4o"
+            )
+            memory = st.session_state.conversation_memory
+            earlier_turns = st.session_state.chat_history
+            with st.spinner("Updating conversation memory..."), action_scope(
+                "Chat Memory"
+            ):
+                memory.compact(
+                    earlier_turns,
+                    lambda summary_prompt: get_ai_response(
+                        summary_prompt, st.session_state.api_key, selected_model
+                    ),
+                )
+            conversation = memory.build_context(earlier_turns)
+            user_question = f"User question: {prompt}"
+            question = user_question
+            if conversation:
+                question = f"{conversation}\n\n{question}"
+
             # Add user message to chat history
             st.session_state.chat_history.append({"role": "user", "content": prompt})
 
-            # Generate AI response
-            with st.spinner("AI thinking..."):
-                context = (
-                    f"Current code: {st.session_state.current_code[:1000]}..."
-                    if st.session_state.current_code
-                    else "No code provided yet."
+            # Generate AI response, rendering tokens as they arrive. For a
+            # project only the passages most relevant to the question are
+            # sent; a single large file is analyzed chunk by chunk.
+            project = st.session_state.project_index
+            if len(project) > 1:
+                context = project.build_context(prompt) or "No matching code found."
+                response_stream = stream_ai_response(
+                    f"Context: Code from the uploaded project ({len(project)} "
+                    f"files) most relevant to the question:\n{context}\n\n{question}",
+                    st.session_state.api_key,
+                    selected_model,
                 )
-                full_prompt = f"Context: {context}\n\nUser question: {prompt}"
-
-                # Use the selected AI model from session state
-                selected_model = getattr(
-                    st.session_state, "selected_ai_model", "ChatGPT-4o"
+            elif st.session_state.current_code:
+                # Earlier turns only go into the final request, not into
+                # every chunk of a large file
+                response_stream = stream_code_reply(
+                    user_question,
+                    "Context: Current code: {code}\n\n{task}",
+                    conversation,
                 )
-                response = get_ai_response(
-                    full_prompt, st.session_state.api_key, selected_model
+            else:
+                response_stream = stream_ai_response(
+                    f"Context: No code provided yet.\n\n{question}",
+                    st.session_state.api_key,
+                    selected_model,
                 )
+            with action_scope("Chat"):
+                response = stream_assistant_reply(chat_container, response_stream)
 
             # Add AI response to chat history
             st.session_state.chat_history.append(
@@ -161,6 +409,11 @@ def main():
     )
 
     initialize_session_state()
+    deliver_finished_jobs()
+
+    metrics_port = PERFORMANCE_CONFIG["metrics"]["http_port"]
+    if metrics_port:
+        start_metrics_server(metrics_port)
 
     # Main header
     st.markdown(
@@ -193,6 +446,24 @@ def main():
         # Store selected model in session state for chat function
         st.session_state.selected_ai_model = ai_model
 
+        pin_model = st.checkbox(
+            "📌 Always use this model",
+            key="pin_model",
+            help="When unchecked, short and simple requests are routed to a "
+            "faster, cheaper model from the same provider",
+        )
+        # Applies to every AI call made during this script run
+        set_pinned(pin_model)
+
+        prefetch_enabled = st.checkbox(
+            "🔮 Prefetch quick actions",
+            value=PREFETCH_CONFIG["enabled"],
+            key="prefetch_quick_actions",
+            help="Answer Find Bugs and Explain Code in the background once the "
+            "code stops changing, so the buttons respond instantly. Uses extra "
+            "tokens, capped per session",
+        )
+
         # API Key input with validation
         api_key = st.text_input(
             f"🔑 {ai_model} API Key",
@@ -208,6 +479,9 @@ def main():
             else:
                 st.error("❌ Please enter a valid API key")
 
+        if DEBUG_CONFIG["mock_ai_responses"]:
+            st.info("🧪 Mock AI backend enabled (MOCK_AI) - no API calls are made")
+
         st.markdown("</div>", unsafe_allow_html=True)
 
         # Quick actions section
@@ -221,9 +495,141 @@ def main():
         st.header("⚡ Quick Actions")
 
         if st.button("🧹 Clear Chat History", use_container_width=True):
-            st.session_state.chat_history = []
+            st.session_state.chat_history.clear()
+            st.session_state.chat_window.reset()
+            st.session_state.conversation_memory.reset()
             st.success("Chat history cleared!")
 
+        with st.expander("📦 Response Cache"):
+            cache_stats = response_cache.stats()
+            st.write(
+                f"Hits: {cache_stats['hits']} · Misses: {cache_stats['misses']} · "
+                f"Evictions: {cache_stats['evictions']}"
+            )
+            st.write(
+                f"{cache_stats['entries']} entries, "
+                f"{cache_stats['bytes'] / (1024 * 1024):.2f} / "
+                f"{cache_stats['max_bytes'] / (1024 * 1024):.0f} MB"
+            )
+            flights = single_flight.stats()
+            st.write(
+                f"In flight: {flights['in_flight']} · "
+                f"Coalesced: {flights['coalesced']} of "
+                f"{flights['leaders'] + flights['coalesced']} calls saved"
+            )
+            if st.button("🗑️ Clear Cache", use_container_width=True):
+                response_cache.clear()
+                st.success("Response cache cleared!")
+
+        with st.expander("🧠 Session Memory"):
+            for label, history in (
+                ("Chat", st.session_state.chat_history),
+                ("Analyses", st.session_state.code_history),
+            ):
+                usage = history.memory_usage()
+                st.write(
+                    f"{label}: {usage['entries']} entries · "
+                    f"{usage['memory_bytes'] / 1024:.1f} KB in memory"
+                    + (
+                        f" · {usage['spilled_entries']} on disk "
+                        f"({usage['disk_bytes'] / 1024:.1f} KB)"
+                        if usage["spilled_entries"]
+                        else ""
+                    )
+                )
+                if usage["evicted"] or usage["expired"]:
+                    st.caption(
+                        f"{usage['evicted']} dropped over the limit · "
+                        f"{usage['expired']} past retention"
+                    )
+
+        with st.expander("📤 Export History"):
+            export_format = st.selectbox(
+                "Format", enabled_formats(), key="export_format"
+            )
+            compress = st.checkbox(
+                "🗜️ Compress (gzip)", value=STREAM_CONFIG["gzip"], key="export_gzip"
+            )
+            if st.button("Prepare Export", use_container_width=True):
+                # Streamed to a temporary file rather than built up as a string,
+                # then handed to the download widget as an open file
+                with tempfile.NamedTemporaryFile(suffix=".export", delete=False) as out:
+                    write_export(
+                        {
+                            "chat": st.session_state.chat_history,
+                            "analyses": st.session_state.code_history,
+                        },
+                        export_format,
+                        out,
+                        compress,
+                    )
+                    size = out.tell()
+                try:
+                    with open(out.name, "rb") as export_file:
+                        st.download_button(
+                            f"⬇️ Download ({size / 1024:.1f} KB)",
+                            export_file,
+                            file_name=export_filename(
+                                "ai_companion_history", export_format, compress
+                            ),
+                            mime=(
+                                "application/gzip"
+                                if compress
+                                else FORMATS[export_format][1]
+                            ),
+                            on_click="ignore",
+                            use_container_width=True,
+                        )
+                finally:
+                    os.remove(out.name)
+
+        with st.expander("🚦 Request Scheduler"):
+            scheduler_stats = request_scheduler.stats()
+            st.write(
+                f"Requests: {scheduler_stats['requests']} · "
+                f"Queued: {scheduler_stats['queued']}"
+            )
+            st.write(
+                f"Retries: {scheduler_stats['retries']} · "
+                f"Throttled: {scheduler_stats['throttled']} · "
+                f"Failed: {scheduler_stats['failures']}"
+            )
+
+        if DEBUG_CONFIG["show_performance_metrics"]:
+            with st.expander("📈 Call Metrics"):
+                totals = call_metrics.totals()
+                st.write(
+                    f"Calls: {totals['calls']} · Tokens: {totals['tokens']:,} · "
+                    f"Cost: ${totals['cost']:.4f}"
+                )
+                routes = model_router.stats()
+                if routes:
+                    st.caption(
+                        "Routed: " + " · ".join(f"{r} ({n})" for r, n in routes.items())
+                    )
+                rows = call_metrics.summary_rows()
+                if rows:
+                    st.dataframe(rows, hide_index=True, use_container_width=True)
+                    st.download_button(
+                        "⬇️ Prometheus Metrics",
+                        call_metrics.to_prometheus(),
+                        file_name="ai_metrics.prom",
+                        mime="text/plain",
+                        use_container_width=True,
+                    )
+                minified = minification_stats.totals()
+                if minified["requests"]:
+                    st.caption(
+                        f"Minified prompts: {minified['requests']} · "
+                        f"Saved {minified['saved_tokens']:,} tokens "
+                        f"({minified['saved_ratio']:.0%})"
+                    )
+                    st.dataframe(
+                        minification_stats.recent(),
+                        hide_index=True,
+                        use_container_width=True,
+                    )
+
         st.markdown("</div>", unsafe_allow_html=True)
 
     # Main content layout with columns and spacer
@@ -242,16 +648,82 @@ def main():
 
         st.subheader("Code Editor")
 
-        # File upload option
-        uploaded_file = st.file_uploader(
-            "📁 Upload Code File",
-            type=["py", "js", "java", "cpp", "c", "rb", "go", "rs"],
-            help="Upload a code file for analysis",
+        # File upload option; several files or an archive form a project
+        # that chat answers from through the retrieval index
+        uploaded_files = st.file_uploader(
+            "📁 Upload Code Files or Archive",
+            type=["py", "js", "java", "cpp", "c", "rb", "go", "rs"]
+            + ["zip", "tar", "gz", "tgz"],
+            accept_multiple_files=True,
+            help="Upload code files, or a zip/tar archive of a project",
+            # A new key empties the uploader when the project is cleared
+            key=f"uploads_{st.session_state.upload_generation}",
         )
 
-        if uploaded_file:
-            st.session_state.current_code = str(uploaded_file.read(), "utf-8")
-            st.success(f"✅ Loaded {uploaded_file.name}")
+        project = st.session_state.project_index
+        new_uploads = [
+            upload
+            for upload in uploaded_files or []
+            if upload.file_id not in st.session_state.indexed_uploads
+        ]
+        for upload in new_uploads:
+            st.session_state.indexed_uploads.add(upload.file_id)
+            data = upload.getvalue()
+            try:
+                indexed = project.add_upload(upload.name, data)
+            except (zipfile.BadZipFile, tarfile.TarError, RuntimeError) as e:
+                # RuntimeError: a zip that needs a password
+                st.error(f"❌ Could not read {upload.name}: {e}")
+                continue
+
+            if not indexed:
+                # A lone file still opens in the editor, as before projects
+                text = None
+                if len(uploaded_files) == 1 and not is_archive(upload.name):
+                    try:
+                        text = data.decode("utf-8")
+                    except UnicodeDecodeError:
+                        pass
+                if text is None:
+                    st.error(
+                        f"❌ Nothing indexed from {upload.name}: no supported "
+                        f"text files of at most {project.max_file_bytes // 1000} KB"
+                    )
+                    continue
+                st.session_state.open_file = None
+                st.session_state.current_code = text
+                st.session_state.current_language = language_for_path(upload.name)
+                st.success(f"✅ Loaded {upload.name} (not indexed for project chat)")
+                continue
+
+            if st.session_state.open_file is None or len(uploaded_files) == 1:
+                # Open the first file in the editor
+                st.session_state.open_file = indexed[0]
+                st.session_state.current_code = project.file_text(indexed[0])
+                st.session_state.current_language = language_for_path(indexed[0])
+            st.success(f"✅ Loaded {upload.name} ({len(indexed)} file(s) indexed)")
+
+        if len(project) > 1:
+            open_file = st.selectbox(
+                "📂 Open project file",
+                project.files(),
+                index=(
+                    project.files().index(st.session_state.open_file)
+                    if st.session_state.open_file in project.files()
+                    else 0
+                ),
+            )
+            if open_file != st.session_state.open_file:
+                st.session_state.open_file = open_file
+                st.session_state.current_code = project.file_text(open_file)
+                st.session_state.current_language = language_for_path(open_file)
+                st.rerun()
+        if project and st.button("🗑️ Clear Project", use_container_width=True):
+            project.clear()
+            st.session_state.indexed_uploads = set()
+            st.session_state.upload_generation += 1
+            st.session_state.open_file = None
+            st.rerun()
 
         # Code input area
         code_input = st.text_area(
@@ -263,6 +735,25 @@ def main():
 
         if code_input != st.session_state.current_code:
             st.session_state.current_code = code_input
+            if st.session_state.open_file is not None:
+                # Re-index only the edited file
+                project.add_file(st.session_state.open_file, code_input)
+
+        # Speculative quick-action answers; a code change cancels the old ones
+        prefetcher = st.session_state.prefetcher
+        if prefetch_enabled and (
+            st.session_state.api_key or DEBUG_CONFIG["mock_ai_responses"]
+        ):
+            prefetcher.update(
+                st.session_state.current_code,
+                st.session_state.api_key,
+                ai_model,
+                st.session_state.current_language,
+                owner=st.session_state.session_id,
+                immediate=bool(new_uploads),
+            )
+        else:
+            prefetcher.cancel()
 
         st.markdown("</div>", unsafe_allow_html=True)
 
@@ -291,6 +782,10 @@ def main():
             space_complexity = st.checkbox("💾 Space Complexity Analysis")
             generate_tests = st.checkbox("🧪 Generate Unit Tests")
             generate_docs = st.checkbox("📚 Generate Documentation")
+            security_scan = st.checkbox(
+                "🔒 Security Scan",
+                help="Run the local pattern scanner and have the AI review flagged lines",
+            )
 
         with col2:
             st.write("**🛠️ Code Enhancement**")
@@ -316,58 +811,143 @@ def main():
             add_comments = st.checkbox("💬 Add Comments")
             optimize_code = st.checkbox("🚀 Optimize Performance")
 
+        parallel_sections = st.checkbox(
+            "⚡ Analyze each option separately (in parallel)",
+            help="Send every selected option as its own request and show each result as soon as it is ready",
+        )
+        incremental = st.checkbox(
+            "♻️ Only re-analyze changed functions",
+            help="Analyze each function separately and reuse the previous results for functions you have not edited",
+        )
+
         # Process button
         if st.button("🎯 Process Code", type="primary", use_container_width=True):
             if not st.session_state.current_code:
                 st.error("❌ Please provide some code first!")
-            elif not st.session_state.api_key:
+            elif not st.session_state.api_key and not DEBUG_CONFIG["mock_ai_responses"]:
                 st.error("❌ Please configure your API key first!")
             else:
-                with st.spinner("🤖 AI is processing your code..."):
-                    # Build comprehensive prompt
-                    prompt_parts = ["Analyze and enhance the following code:"]
-
-                    if time_complexity:
-                        prompt_parts.append("- Calculate time complexity")
-                    if space_complexity:
-                        prompt_parts.append("- Calculate space complexity")
-                    # if security_scan:
-                    #     prompt_parts.append("- Perform security analysis")
-                    if target_language != "Keep Original":
-                        prompt_parts.append(f"- Convert to {target_language}")
-                    if generate_docs:
-                        prompt_parts.append("- Generate comprehensive documentation")
-                    if generate_tests:
-                        prompt_parts.append("- Create unit tests")
-                    if add_comments:
-                        prompt_parts.append("- Add detailed comments")
-                    if optimize_code:
-                        prompt_parts.append("- Optimize for better performance")
-
-                    full_prompt = (
-                        "\n".join(prompt_parts)
-                        + f"\n\nCode:\n{st.session_state.current_code}"
+                selected_options = [
+                    name
+                    for name, checked in (
+                        ("time_complexity", time_complexity),
+                        ("space_complexity", space_complexity),
+                        ("security_scan", security_scan),
+                        ("generate_docs", generate_docs),
+                        ("generate_tests", generate_tests),
+                        ("add_comments", add_comments),
+                        ("optimize_code", optimize_code),
                     )
+                    if checked
+                ]
+
+                # Local analyzers take milliseconds and ground the AI's answer
+                local = run_local_analysis(
+                    st.session_state.current_code,
+                    st.session_state.current_language,
+                    selected_options,
+                )
+                if local.complexity is not None:
+                    report = local.complexity
+                    with st.expander("📐 Complexity Metrics", expanded=True):
+                        st.caption(
+                            f"{report.language} · {report.method}-based · "
+                            f"{report.duration_ms} ms"
+                        )
+                        if report.functions:
+                            st.table(metrics_table(report))
+                        else:
+                            st.info("No functions found to measure.")
+                if local.findings is not None:
+                    # Local findings are instant and free. The AI security
+                    # section is only requested when something was flagged.
+                    with st.expander("🔒 Local Security Scan", expanded=True):
+                        if local.findings:
+                            counts = summarize_findings(local.findings)
+                            st.warning(
+                                " · ".join(f"{k}: {v}" for k, v in counts.items())
+                            )
+                            st.table(
+                                [
+                                    {
+                                        "Line": f.line,
+                                        "Severity": f.severity,
+                                        "Issue": f.description,
+                                        "Code": f.snippet,
+                                    }
+                                    for f in local.findings
+                                ]
+                            )
+                        else:
+                            st.success("✅ No known insecure patterns found")
+
+                # Build one instruction per selected option
+                sections = build_sections(
+                    st.session_state.current_code,
+                    selected_options,
+                    target_language,
+                    local,
+                )
 
-                    # Get AI response
-                    response = get_ai_response(
-                        full_prompt, st.session_state.api_key, ai_model
+                # The analysis runs as a background job, so the editor
+                # stays usable and reruns do not lose it
+                if selected_options and not sections:
+                    # Only the security scan was selected and it found
+                    # nothing; the local results above are the answer
+                    st.info("ℹ️ Nothing left for the AI to analyze.")
+                    mode = None
+                elif incremental:
+                    # Per-function instructions must not depend on the
+                    # rest of the file, so skip the whole-file grounding
+                    plain = {
+                        title: instruction
+                        for title, instruction in base_sections(
+                            selected_options, target_language
+                        ).items()
+                        if title in sections
+                    }
+                    mode = "incremental"
+                    tasks = (
+                        section_tasks(plain)
+                        if parallel_sections and len(plain) > 1
+                        else {"📋 Analysis": combined_task(plain)}
                     )
+                elif parallel_sections and len(sections) > 1:
+                    mode = "parallel"
+                    tasks = section_tasks(sections)
+                else:
+                    mode = "stream"
+                    tasks = {"📋 Analysis": combined_task(sections)}
+
+                if mode is not None:
+                    with action_scope("Process Code"):
+                        job_engine.submit(
+                            analysis_job,
+                            mode,
+                            tasks,
+                            st.session_state.current_code,
+                            st.session_state.api_key,
+                            ai_model,
+                            st.session_state.current_language,
+                            st.session_state.incremental_analyzer,
+                            title="Process Code",
+                            kind="analysis",
+                            owner=st.session_state.session_id,
+                            meta={"code": st.session_state.current_code},
+                        )
 
-                    # Display results
-                    st.success("✅ Analysis completed!")
-
-                    with st.expander("📋 AI Analysis Results", expanded=True):
-                        st.markdown(response)
+        if any(
+            job.kind == "analysis"
+            for job in job_engine.jobs(st.session_state.session_id)
+        ):
+            job_panel("analysis")
 
-                    # Save to history
-                    st.session_state.code_history.append(
-                        {
-                            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            "code": st.session_state.current_code[:200] + "...",
-                            "analysis": response[:500] + "...",
-                        }
-                    )
+        last_analysis = st.session_state.get("last_analysis")
+        if last_analysis:
+            with st.expander("📋 AI Analysis Results", expanded=True):
+                if last_analysis["caption"]:
+                    st.caption(last_analysis["caption"])
+                st.markdown(last_analysis["text"])
 
         st.markdown("</div>", unsafe_allow_html=True)
     # Right column - AI Chat
@@ -391,6 +971,10 @@ def main():
 
     st.markdown("</div>", unsafe_allow_html=True)
 
+    # The page is painted; load the provider SDK and open its connection
+    # in the background so the first request does not pay for it
+    warm_up_provider(st.session_state.selected_ai_model, st.session_state.api_key)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,344 @@
+"""
+Mock AI Backend
+===============
+
+Local stand-in for the AI providers, enabled by
+``DEBUG_CONFIG["mock_ai_responses"]`` (``MOCK_AI=true``). It lets the app
+be exercised and load-tested without live keys or spend.
+
+Two ways to use it:
+
+- In-process: helper_ai routes calls to ``mock_backend`` when mocking is
+  on. Requests still pass through the response cache and request
+  scheduler, so our own overhead is measured.
+- Over HTTP: ``python mock_backend.py --port 8765`` serves an
+  OpenAI-compatible ``/v1/chat/completions`` endpoint (blocking and SSE
+  streaming). Point the real SDK at it with
+  ``OPENAI_BASE_URL=http://127.0.0.1:8765/v1``.
+
+Latency to first token follows a lognormal distribution, tokens are
+emitted at a fixed rate, and 429s (with Retry-After) and timeouts can be
+injected at configurable rates. Response text is canned and deterministic
+for a given prompt.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List
+
+from config import DEBUG_CONFIG
+
+CANNED_RESPONSES = {
+    "bug": (
+        "## 🐛 Potential Issues\n\n"
+        "1. **Unvalidated input** - arguments are used without type or range checks.\n"
+        "2. **Unhandled exceptions** - I/O and parsing calls are not wrapped.\n"
+        "3. **Edge cases** - empty collections and `None` values are not covered.\n\n"
+        "Add guards for these cases and cover them with unit tests."
+    ),
+    "explain": (
+        "## 📖 Explanation\n\n"
+        "The code defines a small set of functions that read their inputs, "
+        "transform them step by step, and return the result. Control flow is "
+        "linear apart from a few conditional branches that handle special cases."
+    ),
+    "complexity": (
+        "## ⏱️ Complexity\n\n"
+        "- **Time:** O(n) - each element is visited once.\n"
+        "- **Space:** O(1) auxiliary - only a few scalar variables are kept."
+    ),
+    "summary": (
+        "The developer shared code and asked about bugs, complexity and "
+        "possible improvements; the assistant suggested input validation "
+        "and additional tests."
+    ),
+}
+
+DEFAULT_RESPONSE = (
+    "## 🤖 Mock Analysis\n\n"
+    "This is a deterministic response from the local mock backend. The code "
+    "is readable, but consider adding docstrings, input validation and unit "
+    "tests. Performance looks adequate for typical input sizes."
+)
+
+
+class MockRateLimitError(Exception):
+    """Injected 429, shaped like provider SDK errors for the scheduler"""
+
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__("Rate limit exceeded (mock)")
+
+        class _Response:
+            headers = {"retry-after": str(retry_after)}
+
+        self.response = _Response()
+
+
+class MockTimeoutError(TimeoutError):
+    """Injected request timeout"""
+
+
+def canned_response(prompt: str) -> str:
+    """Pick a deterministic canned reply based on the prompt's content"""
+    lowered = prompt.lower()
+    if "running summary" in lowered:
+        return CANNED_RESPONSES["summary"]
+    if "bug" in lowered:
+        return CANNED_RESPONSES["bug"]
+    if "explain" in lowered:
+        return CANNED_RESPONSES["explain"]
+    if "complexity" in lowered:
+        return CANNED_RESPONSES["complexity"]
+    return DEFAULT_RESPONSE
+
+
+def _tokens(text: str) -> List[str]:
+    """Split text into word-sized chunks that re-join to the original"""
+    words = text.split(" ")
+    return [w + " " for w in words[:-1]] + words[-1:]
+
+
+class MockBackend:
+    """Simulated provider with configurable latency, throughput and errors"""
+
+    def __init__(
+        self,
+        latency_ms: float = 200,
+        latency_sigma: float = 0.5,
+        tokens_per_second: float = 80,
+        rate_limit_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        retry_after: float = 1,
+        seed: Any = None,
+    ):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.rate_limit_rate = rate_limit_rate
+        self.timeout_rate = timeout_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any] = None) -> "MockBackend":
+        return cls(**(config or DEBUG_CONFIG["mock_backend"]))
+
+    def _sample(self) -> tuple:
+        with self._lock:
+            roll = self._random.random()
+            latency = (
+                self.latency_ms
+                / 1000
+                * math.exp(self._random.gauss(0, self.latency_sigma))
+            )
+        return roll, latency
+
+    def _start(self, timeout: float = None) -> float:
+        """Wait out the time to first token, injecting errors; return TTFT"""
+        roll, latency = self._sample()
+        if roll < self.rate_limit_rate:
+            raise MockRateLimitError(self.retry_after)
+        if roll < self.rate_limit_rate + self.timeout_rate:
+            time.sleep(timeout if timeout is not None else latency * 10)
+            raise MockTimeoutError("Request timed out (mock)")
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise MockTimeoutError("Request timed out (mock)")
+        time.sleep(latency)
+        return latency
+
+    def stream(
+        self, prompt: str, model: str = None, timeout: float = None
+    ) -> Iterator[str]:
+        """Yield the canned reply token by token at the configured rate"""
+        self._start(timeout)
+        delay = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+        for token in _tokens(canned_response(prompt)):
+            if delay:
+                time.sleep(delay)
+            yield token
+
+    def complete(self, prompt: str, model: str = None, timeout: float = None) -> str:
+        """Return the whole canned reply after simulated generation time"""
+        return "".join(self.stream(prompt, model, timeout))
+
+
+# Shared in-process backend used by helper_ai when mocking is enabled
+mock_backend = MockBackend.from_config()
+
+
+# =============================================================================
+# OPENAI-COMPATIBLE HTTP SERVER
+# =============================================================================
+
+
+def _completion_id(prompt: str) -> str:
+    return "chatcmpl-mock-" + hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+def make_handler(backend: MockBackend):
+    """Build a request handler class bound to a backend"""
+    # http.server pulls in email and ssl; import it only when serving
+    from http.server import BaseHTTPRequestHandler
+
+    class MockHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):  # keep load tests quiet
+            pass
+
+        def _send_json(self, status: int, payload: Dict[str, Any], headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "Not found"}})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            prompt = "\n".join(
+                m.get("content", "") for m in request.get("messages", [])
+            )
+            model = request.get("model", "mock")
+
+            try:
+                backend._start()
+            except MockRateLimitError:
+                self._send_json(
+                    429,
+                    {"error": {"message": "Rate limit exceeded (mock)"}},
+                    {"Retry-After": str(backend.retry_after)},
+                )
+                return
+            except MockTimeoutError:
+                self._send_json(504, {"error": {"message": "Timed out (mock)"}})
+                return
+
+            text = canned_response(prompt)
+            completion_id = _completion_id(prompt)
+            created = int(time.time())
+            if not request.get("stream"):
+                if backend.tokens_per_second > 0:
+                    time.sleep(len(_tokens(text)) / backend.tokens_per_second)
+                self._send_json(
+                    200,
+                    {
+                        "id": completion_id,
+                        "object": "chat.completion",
+                        "created": created,
+                        "model": model,
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {"role": "assistant", "content": text},
+                                "finish_reason": "stop",
+                            }
+                        ],
+                        "usage": {
+                            "prompt_tokens": len(prompt) // 4 + 1,
+                            "completion_tokens": len(_tokens(text)),
+                            "total_tokens": len(prompt) // 4 + 1 + len(_tokens(text)),
+                        },
+                    },
+                )
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            delay = 1 / backend.tokens_per_second if backend.tokens_per_second else 0
+            tokens = _tokens(text)
+            for i, token in enumerate(tokens):
+                if delay:
+                    time.sleep(delay)
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "delta": {"content": token},
+                            "finish_reason": "stop" if i == len(tokens) - 1 else None,
+                        }
+                    ],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+    return MockHandler
+
+
+def serve(host: str, port: int, backend: MockBackend = None) -> Any:
+    """Start the mock server on a background thread and return it"""
+    from http.server import ThreadingHTTPServer
+
+    server = ThreadingHTTPServer((host, port), make_handler(backend or mock_backend))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv: List[str] = None) -> None:
+    from http.server import ThreadingHTTPServer
+
+    defaults = DEBUG_CONFIG["mock_backend"]
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock AI server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=defaults["latency_ms"])
+    parser.add_argument(
+        "--latency-sigma", type=float, default=defaults["latency_sigma"]
+    )
+    parser.add_argument(
+        "--tokens-per-second", type=float, default=defaults["tokens_per_second"]
+    )
+    parser.add_argument(
+        "--rate-limit-rate", type=float, default=defaults["rate_limit_rate"]
+    )
+    parser.add_argument("--timeout-rate", type=float, default=defaults["timeout_rate"])
+    parser.add_argument("--retry-after", type=float, default=defaults["retry_after"])
+    parser.add_argument("--seed", default=defaults["seed"])
+    args = parser.parse_args(argv)
+
+    backend = MockBackend(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        rate_limit_rate=args.rate_limit_rate,
+        timeout_rate=args.timeout_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(backend))
+    print(f"Mock AI server on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
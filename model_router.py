@@ -0,0 +1,154 @@
+"""
+Model Router
+============
+
+Picks the model for each AI request instead of sending everything to the
+model selected in the sidebar. The routing settings live in
+``PERFORMANCE_CONFIG["routing"]``.
+
+- Short requests for simple actions (Explain Code, chat) go to the
+  cheapest and fastest model from the same provider. The API key only
+  works for that provider.
+- Larger requests keep the selected model. If that model's recent error
+  rate is above ``max_error_rate``, they fail over to the healthiest model
+  with the capability the action needs (``AI_MODELS[...]["capabilities"]``).
+- Latency and error rates come live from ``call_metrics``. Until a model
+  has ``min_samples`` recent calls, its list price decides.
+
+Pinning turns routing off for the current context, i.e. one Streamlit
+script run or one batch job. Routing is off unless someone calls
+``set_pinned(False)``.
+"""
+
+import contextvars
+import threading
+from typing import Dict, List, Optional
+
+from call_metrics import call_metrics, current_action, estimate_tokens
+from config import AI_MODELS, PERFORMANCE_CONFIG
+from provider_registry import provider_for_model
+
+ROUTING_CONFIG = PERFORMANCE_CONFIG["routing"]
+
+# Capability a model needs to serve each action
+ACTION_CAPABILITIES = {
+    "Find Bugs": "analysis",
+    "Explain Code": "analysis",
+    "Chat": "analysis",
+    "Chat Memory": "analysis",
+    "Process Code": "code_generation",
+    "Batch": "code_generation",
+}
+
+_pinned = contextvars.ContextVar("ai_model_pinned", default=True)
+
+
+def set_pinned(pinned: bool) -> None:
+    """Pin (True) or route (False) AI calls made from the current context"""
+    _pinned.set(pinned)
+
+
+def is_pinned() -> bool:
+    return _pinned.get()
+
+
+class ModelRouter:
+    """Chooses a model per request from cost, live latency and error rate"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        simple_max_tokens: int = 1500,
+        simple_actions: List[str] = (),
+        cost_weight: float = 1.0,
+        latency_weight: float = 1.0,
+        max_error_rate: float = 0.5,
+        min_samples: int = 5,
+    ):
+        self.enabled = enabled
+        self.simple_max_tokens = simple_max_tokens
+        self.simple_actions = set(simple_actions)
+        self.cost_weight = cost_weight
+        self.latency_weight = latency_weight
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._routes: Dict[str, int] = {}
+
+    @classmethod
+    def from_config(cls) -> "ModelRouter":
+        return cls(**ROUTING_CONFIG)
+
+    def candidates(self, model: str, capability: Optional[str]) -> List[str]:
+        """Models reachable with the selected model's key that can do the job"""
+        provider = provider_for_model(model)
+        found = [
+            name
+            for name, spec in AI_MODELS.items()
+            if provider_for_model(name) == provider
+            and (capability is None or capability in spec["capabilities"])
+        ]
+        if model not in found:
+            found.append(model)
+        return found
+
+    def _score(self, names: List[str], health: Dict[str, Dict]) -> Dict[str, float]:
+        """Lower is better: weighted, normalized price plus measured latency"""
+        prices = {n: AI_MODELS.get(n, {}).get("cost_per_token", 0) for n in names}
+        latencies = {
+            n: health[n]["latency"]
+            for n in names
+            if n in health
+            and health[n]["samples"] >= self.min_samples
+            and health[n]["latency"] is not None
+        }
+        max_price = max(prices.values()) or 1
+        max_latency = max(latencies.values(), default=0) or 1
+        return {
+            n: self.cost_weight * prices[n] / max_price
+            + self.latency_weight * latencies.get(n, 0) / max_latency
+            for n in names
+        }
+
+    def _healthy(self, name: str, health: Dict[str, Dict]) -> bool:
+        stats = health.get(name)
+        if stats is None or stats["samples"] < self.min_samples:
+            return True
+        return stats["error_rate"] <= self.max_error_rate
+
+    def route(self, model: str, prompt: str, action: str = None) -> str:
+        """Return the model that should serve this request"""
+        if not self.enabled or is_pinned() or provider_for_model(model) is None:
+            return model
+
+        action = action or current_action()
+        capability = ACTION_CAPABILITIES.get(action)
+        health = call_metrics.model_health()
+        simple = (
+            action in self.simple_actions
+            and estimate_tokens(prompt) <= self.simple_max_tokens
+        )
+        if not simple and self._healthy(model, health):
+            return model
+
+        names = [
+            n for n in self.candidates(model, capability) if self._healthy(n, health)
+        ]
+        if not names:
+            return model
+        scores = self._score(names, health)
+        chosen = min(names, key=lambda n: (scores[n], n != model))
+        if chosen != model:
+            with self._lock:
+                route = f"{model} -> {chosen}"
+                self._routes[route] = self._routes.get(route, 0) + 1
+        return chosen
+
+    def stats(self) -> Dict[str, int]:
+        """How many requests were rerouted, by original and chosen model"""
+        with self._lock:
+            return dict(self._routes)
+
+
+# Shared router used by helper_ai
+model_router = ModelRouter.from_config()
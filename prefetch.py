@@ -0,0 +1,202 @@
+"""
+Prefetch
+========
+
+Speculative, opt-in prefetch of the quick-action answers. "Find Bugs" and
+"Explain Code" always send the same prompts over the current code. Once
+code is uploaded, or has stopped changing for ``debounce`` seconds, both
+are computed in the background at bulk priority, so a click on either can
+show its answer at once. Settings live in ``PERFORMANCE_CONFIG["prefetch"]``.
+
+- Prefetches run on their own small job pool, so they never hold up
+  analyses the user asked for.
+- The work goes through stream_code_analysis, which leaves it in the
+  response cache. A click that lands while a prefetch is still running
+  shares that call (see single_flight) instead of starting another.
+- Every session has a token budget for speculative work. Files over
+  ``max_code_tokens`` are never prefetched.
+- Changing the code cancels pending prefetches, and running ones stop at
+  their next streamed chunk. Whitespace and comment edits do not count as
+  changes, since code is compared by fingerprint.
+"""
+
+import threading
+from typing import Dict, Optional, Tuple
+
+from call_metrics import action_scope, estimate_tokens
+from code_chunker import stream_code_analysis
+from code_fingerprint import code_fingerprint
+from config import PERFORMANCE_CONFIG
+from helper_ai import is_error_response
+from job_engine import DONE, Job, JobEngine
+from request_scheduler import PRIORITY_BULK
+
+PREFETCH_CONFIG = PERFORMANCE_CONFIG["prefetch"]
+
+# Quick action -> (task, prompt template)
+QUICK_ACTIONS: Dict[str, Tuple[str, str]] = {
+    "Find Bugs": (
+        "Review this code and find any potential bugs or issues.",
+        "Code to review: {code}\n\n{task}",
+    ),
+    "Explain Code": (
+        "Explain what this code does in simple terms.",
+        "Code to explain: {code}\n\n{task}",
+    ),
+}
+
+_engine: Optional[JobEngine] = None
+_engine_lock = threading.Lock()
+
+
+def _get_engine() -> JobEngine:
+    """Job pool shared by every session's prefetches"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = JobEngine(
+                PREFETCH_CONFIG["max_workers"],
+                PREFETCH_CONFIG["deadline"],
+                keep_finished=PREFETCH_CONFIG["deadline"],
+            )
+        return _engine
+
+
+class QuickActionPrefetcher:
+    """Per-session speculative runs of the quick actions"""
+
+    def __init__(
+        self,
+        debounce: float = 2.0,
+        max_code_tokens: int = 4000,
+        token_budget: int = 20000,
+    ):
+        self.debounce = debounce
+        self.max_code_tokens = max_code_tokens
+        self.token_budget = token_budget
+        self.tokens_spent = 0
+        self.started = 0
+        self.hits = 0
+        self.cancelled = 0
+        self.over_budget = 0
+        self._fingerprint: Optional[str] = None
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "QuickActionPrefetcher":
+        return cls(
+            PREFETCH_CONFIG["debounce"],
+            PREFETCH_CONFIG["max_code_tokens"],
+            PREFETCH_CONFIG["token_budget"],
+        )
+
+    def _charge(self, tokens: int) -> None:
+        with self._lock:
+            self.tokens_spent += tokens
+
+    def _run(
+        self,
+        job: Job,
+        action: str,
+        code: str,
+        api_key: str,
+        model: str,
+        language: str,
+    ) -> str:
+        task, template = QUICK_ACTIONS[action]
+        chunks = []
+        # Same action scope as a click, so routing picks the same model and
+        # the answer lands under the cache key the click will look up
+        with action_scope(action):
+            stream = stream_code_analysis(
+                task, code, api_key, model, template, language, PRIORITY_BULK
+            )
+            try:
+                for chunk in stream:
+                    # Stop paying for an answer the new code made useless
+                    job.check()
+                    chunks.append(chunk)
+            finally:
+                stream.close()
+                self._charge(estimate_tokens("".join(chunks)))
+        return "".join(chunks)
+
+    def update(
+        self,
+        code: str,
+        api_key: str,
+        model: str,
+        language: str = None,
+        owner: str = None,
+        immediate: bool = False,
+    ) -> None:
+        """Restart prefetching if the code changed since the last call
+
+        ``immediate`` skips the debounce, e.g. for an uploaded file.
+        """
+        fingerprint = code_fingerprint(code, language) + model
+        if fingerprint == self._fingerprint:
+            return
+        self.cancel()
+        self._fingerprint = fingerprint
+        if not code.strip() or estimate_tokens(code) > self.max_code_tokens:
+            return
+
+        for action, (task, template) in QUICK_ACTIONS.items():
+            cost = estimate_tokens(template.format(task=task, code=code))
+            with self._lock:
+                if self.tokens_spent + cost > self.token_budget:
+                    self.over_budget += 1
+                    continue
+                self.tokens_spent += cost
+                self.started += 1
+            self._jobs[action] = _get_engine().submit(
+                self._run,
+                action,
+                code,
+                api_key,
+                model,
+                language,
+                title=f"Prefetch {action}",
+                kind="prefetch",
+                owner=owner,
+                meta={"cost": cost},
+                delay=0 if immediate else self.debounce,
+            )
+
+    def cancel(self) -> None:
+        """Cancel prefetches for the previous code and forget their results"""
+        engine = _get_engine()
+        for job in self._jobs.values():
+            if job.cancel():
+                self.cancelled += 1
+                if job.started is None:
+                    # Never ran; give its reservation back to the budget
+                    self._charge(-job.meta["cost"])
+            engine.collect(job.owner)
+        self._jobs.clear()
+        self._fingerprint = None
+
+    def status(self, action: str) -> Optional[str]:
+        job = self._jobs.get(action)
+        return job.status if job is not None else None
+
+    def take(self, action: str) -> Optional[str]:
+        """The prefetched answer for action, if ready and usable"""
+        job = self._jobs.get(action)
+        if job is None or job.status != DONE or is_error_response(job.result):
+            return None
+        self.hits += 1
+        return job.result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "cancelled": self.cancelled,
+                "over_budget": self.over_budget,
+                "tokens_spent": self.tokens_spent,
+                "token_budget": self.token_budget,
+            }
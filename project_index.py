@@ -0,0 +1,401 @@
+"""
+Project Index
+=============
+
+Local retrieval over a multi-file project, so chat can cover a whole
+codebase without sending all of it. Uploaded files, or the members of an
+uploaded zip/tar archive, are split into units (one per function or
+method, see code_chunker.split_units). Each unit goes into two in-memory
+indexes:
+
+- a symbol index from function and class names to their units
+- an inverted index of identifier terms, scored with BM25
+
+For each chat question the best-scoring units are sent, up to a token
+budget, instead of the code itself. Settings live in
+``PERFORMANCE_CONFIG["project_index"]``.
+
+Files are added incrementally. Re-adding a file with the same content is a
+no-op, and a changed file only replaces its own units. Parsing is cached
+by content hash across sessions, so the same file uploaded twice is split
+and tokenized once.
+"""
+
+import hashlib
+import io
+import math
+import posixpath
+import re
+import tarfile
+import threading
+import zipfile
+from collections import Counter, OrderedDict
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from call_metrics import estimate_tokens
+from code_chunker import split_units
+from config import PERFORMANCE_CONFIG
+from security_scanner import language_for_path
+
+INDEX_CONFIG = PERFORMANCE_CONFIG["project_index"]
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz")
+
+_IDENT_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_SUBWORD_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+_SYMBOL_RE = re.compile(
+    r"^\s*(?:export\s+)?(?:pub\s+)?(?:async\s+)?"
+    r"(?:def|class|fn|func|function|struct|enum|trait|interface)\s+(\w+)",
+    re.M,
+)
+
+# Words in questions that say nothing about which code is meant
+STOP_WORDS = frozenset(
+    "a an and are as at be by can code do does for from how i if in is it me "
+    "of on or should the this to what when where which why with you".split()
+)
+
+
+def terms(text: str) -> List[str]:
+    """Lowercased index terms: identifiers plus their snake/camelCase parts"""
+    result = []
+    for ident in _IDENT_RE.findall(text):
+        lowered = ident.lower()
+        if len(lowered) > 1 and lowered not in STOP_WORDS:
+            result.append(lowered)
+        parts = [p.lower() for p in _SUBWORD_RE.findall(ident)]
+        if len(parts) > 1:
+            result.extend(p for p in parts if len(p) > 1 and p not in STOP_WORDS)
+    return result
+
+
+class Passage(NamedTuple):
+    """One retrievable unit of a project file (1-based, inclusive lines)"""
+
+    path: str
+    symbols: Tuple[str, ...]
+    start_line: int
+    end_line: int
+    text: str
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+    def render(self, language: str = None) -> str:
+        fence = (language or "").lower()
+        return (
+            f"# {self.path} (lines {self.start_line}-{self.end_line})\n"
+            f"```{fence}\n{self.text}\n```"
+        )
+
+
+class _ParsedUnit(NamedTuple):
+    symbols: Tuple[str, ...]
+    start_line: int
+    end_line: int
+    text: str
+    term_counts: Counter
+    length: int
+
+
+_parsed: "OrderedDict[str, Tuple[_ParsedUnit, ...]]" = OrderedDict()
+_parsed_lock = threading.Lock()
+
+
+def _parse(digest: str, content: str) -> Tuple[_ParsedUnit, ...]:
+    """Units of a file with their term counts, cached by content hash"""
+    with _parsed_lock:
+        if digest in _parsed:
+            _parsed.move_to_end(digest)
+            return _parsed[digest]
+
+    units = []
+    for unit in split_units(content):
+        unit_terms = terms(unit.text)
+        units.append(
+            _ParsedUnit(
+                tuple(_SYMBOL_RE.findall(unit.text)),
+                unit.start_line,
+                unit.end_line,
+                unit.text,
+                Counter(unit_terms),
+                len(unit_terms),
+            )
+        )
+    units = tuple(units)
+    with _parsed_lock:
+        _parsed[digest] = units
+        while len(_parsed) > INDEX_CONFIG["parse_cache_entries"]:
+            _parsed.popitem(last=False)
+    return units
+
+
+def is_archive(name: str) -> bool:
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _archive_members(
+    name: str, data: bytes, max_file_bytes: int, max_files: int, max_total_bytes: int
+) -> Iterator[Tuple[str, bytes]]:
+    """(path, content) of the source files in a zip or tar archive
+
+    Members are read in memory and never extracted. Files in unsupported
+    languages, encrypted zip members and members over ``max_file_bytes``
+    are skipped before they are decompressed. Reading stops after
+    ``max_files`` members or ``max_total_bytes`` decompressed bytes.
+    """
+    count = total = 0
+
+    def wanted(path: str, size: int) -> bool:
+        return size <= max_file_bytes and language_for_path(path) is not None
+
+    if name.lower().endswith(".zip"):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for info in archive.infolist():
+                # Bit 0 of the flags marks an encrypted member
+                if info.is_dir() or info.flag_bits & 0x1:
+                    continue
+                if not wanted(info.filename, info.file_size):
+                    continue
+                total += info.file_size
+                if count >= max_files or total > max_total_bytes:
+                    return
+                count += 1
+                yield info.filename, archive.read(info)
+    else:
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r:*") as archive:
+            for member in archive:
+                if not member.isfile() or not wanted(member.name, member.size):
+                    continue
+                total += member.size
+                if count >= max_files or total > max_total_bytes:
+                    return
+                count += 1
+                yield member.name, archive.extractfile(member).read()
+
+
+class ProjectIndex:
+    """Incrementally built symbol and BM25 index over a project's files"""
+
+    def __init__(
+        self,
+        max_files: int = 500,
+        max_file_bytes: int = 200_000,
+        context_tokens: int = 3000,
+        k1: float = 1.2,
+        b: float = 0.75,
+        max_archive_bytes: int = 20_000_000,
+    ):
+        self.max_files = max_files
+        self.max_file_bytes = max_file_bytes
+        self.max_archive_bytes = max_archive_bytes
+        self.context_tokens = context_tokens
+        self.k1 = k1
+        self.b = b
+        self.skipped = 0
+        # path -> (content hash, language, passage ids, content)
+        self._files: Dict[str, Tuple[str, Optional[str], List[int], str]] = {}
+        self._passages: Dict[int, Passage] = {}
+        self._lengths: Dict[int, int] = {}
+        self._doc_terms: Dict[int, Counter] = {}
+        self._total_length = 0
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._symbols: Dict[str, Set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "ProjectIndex":
+        return cls(
+            INDEX_CONFIG["max_files"],
+            INDEX_CONFIG["max_file_bytes"],
+            INDEX_CONFIG["context_tokens"],
+            INDEX_CONFIG["bm25_k1"],
+            INDEX_CONFIG["bm25_b"],
+            INDEX_CONFIG["max_archive_bytes"],
+        )
+
+    # -- Building ------------------------------------------------------------
+
+    def add_file(self, path: str, content: str) -> bool:
+        """Index content under path; returns False if nothing changed"""
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        with self._lock:
+            previous = self._files.get(path)
+            if previous is not None and previous[0] == digest:
+                return False
+            if previous is None and len(self._files) >= self.max_files:
+                self.skipped += 1
+                return False
+
+        units = _parse(digest, content)
+        with self._lock:
+            self._remove(path)
+            doc_ids = []
+            for unit in units:
+                doc_id = self._next_id
+                self._next_id += 1
+                doc_ids.append(doc_id)
+                self._passages[doc_id] = Passage(
+                    path, unit.symbols, unit.start_line, unit.end_line, unit.text
+                )
+                self._lengths[doc_id] = unit.length
+                self._doc_terms[doc_id] = unit.term_counts
+                self._total_length += unit.length
+                for term, count in unit.term_counts.items():
+                    self._postings.setdefault(term, {})[doc_id] = count
+                for symbol in unit.symbols:
+                    self._symbols.setdefault(symbol.lower(), set()).add(doc_id)
+            self._files[path] = (digest, language_for_path(path), doc_ids, content)
+        return True
+
+    def add_upload(self, name: str, data: bytes) -> List[str]:
+        """Index an uploaded file or archive; returns the paths now indexed
+
+        Paths whose content was already indexed are included. Files in
+        unsupported languages, over the size limit, not valid UTF-8 or
+        beyond ``max_files`` are skipped, so an empty list means nothing
+        from the upload is in the index. An archive is read up to
+        ``max_archive_bytes`` of decompressed content.
+        """
+        if is_archive(name):
+            members = _archive_members(
+                name,
+                data,
+                self.max_file_bytes,
+                self.max_files,
+                self.max_archive_bytes,
+            )
+        elif len(data) <= self.max_file_bytes:
+            members = [(name, data)]
+        else:
+            members = []
+            self.skipped += 1
+
+        indexed = []
+        for path, content in members:
+            path = posixpath.normpath(path.replace("\\", "/")).lstrip("/")
+            if language_for_path(path) is None:
+                continue
+            try:
+                text = content.decode("utf-8")
+            except UnicodeDecodeError:
+                self.skipped += 1
+                continue
+            self.add_file(path, text)
+            if path in self._files:
+                indexed.append(path)
+        return indexed
+
+    def remove_file(self, path: str) -> None:
+        with self._lock:
+            self._remove(path)
+
+    def _remove(self, path: str) -> None:
+        entry = self._files.pop(path, None)
+        if entry is None:
+            return
+        for doc_id in entry[2]:
+            passage = self._passages.pop(doc_id)
+            self._total_length -= self._lengths.pop(doc_id)
+            for term in self._doc_terms.pop(doc_id):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[term]
+            for symbol in passage.symbols:
+                ids = self._symbols.get(symbol.lower())
+                if ids is not None:
+                    ids.discard(doc_id)
+                    if not ids:
+                        del self._symbols[symbol.lower()]
+
+    def clear(self) -> None:
+        with self._lock:
+            for path in list(self._files):
+                self._remove(path)
+            self.skipped = 0
+
+    # -- Querying ------------------------------------------------------------
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[float, Passage]]:
+        """Best-matching passages by BM25, boosted for named symbols"""
+        query_terms = set(terms(query))
+        with self._lock:
+            count = len(self._passages)
+            if not count or not query_terms:
+                return []
+            average = self._total_length / count or 1
+            scores: Dict[int, float] = {}
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(
+                    1 + (count - len(postings) + 0.5) / (len(postings) + 0.5)
+                )
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (
+                        1 - self.b + self.b * self._lengths[doc_id] / average
+                    )
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (
+                        self.k1 + 1
+                    ) / (tf + norm)
+            # A question naming a function should always get its definition
+            for term in query_terms:
+                for doc_id in self._symbols.get(term, ()):
+                    scores[doc_id] = scores.get(doc_id, 0.0) * 2 + 1
+            best = sorted(scores.items(), key=lambda item: -item[1])[:limit]
+            return [(score, self._passages[doc_id]) for doc_id, score in best]
+
+    def retrieve(self, query: str, token_budget: int = None) -> List[Passage]:
+        """Best passages that fit the token budget, in file and line order"""
+        if token_budget is None:
+            token_budget = self.context_tokens
+        chosen = []
+        used = 0
+        for _, passage in self.search(query, limit=50):
+            if used + passage.tokens > token_budget:
+                continue
+            chosen.append(passage)
+            used += passage.tokens
+        return sorted(chosen, key=lambda p: (p.path, p.start_line))
+
+    def build_context(self, query: str, token_budget: int = None) -> str:
+        """Retrieved passages formatted for a prompt; empty if none match"""
+        return "\n\n".join(
+            passage.render(self.language(passage.path))
+            for passage in self.retrieve(query, token_budget)
+        )
+
+    # -- Introspection -------------------------------------------------------
+
+    def language(self, path: str) -> Optional[str]:
+        entry = self._files.get(path)
+        return entry[1] if entry is not None else None
+
+    def files(self) -> List[str]:
+        with self._lock:
+            return sorted(self._files)
+
+    def file_text(self, path: str) -> str:
+        entry = self._files.get(path)
+        return entry[3] if entry is not None else ""
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def __bool__(self) -> bool:
+        return bool(self._files)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "files": len(self._files),
+                "passages": len(self._passages),
+                "terms": len(self._postings),
+                "symbols": len(self._symbols),
+                "skipped": self.skipped,
+            }
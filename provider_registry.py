@@ -0,0 +1,116 @@
+"""
+Provider Registry
+=================
+
+Lazily loaded AI providers. The OpenAI and Gemini SDKs are heavy to import
+and a session usually only ever talks to one of them, so helper_ai
+registers a loader per provider instead of importing both SDKs up front.
+A loader runs, importing its SDK, the first time the provider is used.
+
+``warm_up`` does that import, and opens a pooled client, on a background
+thread. The UI calls it after the first paint so the first real request
+does not pay for it.
+"""
+
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+from client_pool import client_pool
+
+
+def provider_for_model(model: str) -> Optional[str]:
+    """Name of the registered provider serving a UI model name"""
+    if "ChatGPT" in model or "GPT" in model:
+        return "openai"
+    if "Gemini" in model:
+        return "gemini"
+    return None
+
+
+class Provider(NamedTuple):
+    """Client factory and hooks for one loaded provider SDK"""
+
+    name: str
+    build: Callable[[str], Any]
+    close: Callable[[Any], None]
+    # Optional cheap request that opens the connection ahead of real traffic
+    warm: Optional[Callable[[Any], None]] = None
+
+
+class ProviderRegistry:
+    """Thread-safe registry that imports each provider on first use"""
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Provider]] = {}
+        self._providers: Dict[str, Provider] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._load_times: Dict[str, float] = {}
+        self._warmed = set()
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Provider]) -> None:
+        """Register a loader that imports the SDK and returns its Provider"""
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks[name] = threading.Lock()
+
+    def get(self, name: str) -> Provider:
+        """Return the provider, importing its SDK if this is the first use"""
+        provider = self._providers.get(name)
+        if provider is not None:
+            return provider
+        if name not in self._loaders:
+            raise KeyError(f"Unknown provider: {name}")
+
+        # One lock per provider so a slow SDK import does not block the other
+        with self._load_locks[name]:
+            provider = self._providers.get(name)
+            if provider is None:
+                started = time.perf_counter()
+                provider = self._loaders[name]()
+                with self._lock:
+                    self._load_times[name] = time.perf_counter() - started
+                    self._providers[name] = provider
+        return provider
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._providers
+
+    def load_times(self) -> Dict[str, float]:
+        """Seconds spent loading each provider imported so far"""
+        with self._lock:
+            return dict(self._load_times)
+
+    def warm_up(self, name: str, api_key: str) -> Optional[threading.Thread]:
+        """Load the provider and open a pooled client in the background
+
+        Runs once per provider and key; returns the started thread, or None
+        if this pair was already warmed.
+        """
+        key = (name, hashlib.sha256(api_key.encode("utf-8")).hexdigest())
+        with self._lock:
+            if key in self._warmed:
+                return None
+            self._warmed.add(key)
+
+        def warm() -> None:
+            try:
+                provider = self.get(name)
+                with client_pool.lease(
+                    name, api_key, provider.build, provider.close
+                ) as client:
+                    if provider.warm is not None:
+                        provider.warm(client)
+            except Exception:
+                # Best effort: the real request reports any problem
+                pass
+
+        thread = threading.Thread(target=warm, name=f"warmup-{name}", daemon=True)
+        thread.start()
+        return thread
+
+
+# Shared registry; helper_ai registers the built-in providers
+providers = ProviderRegistry()
@@ -0,0 +1,352 @@
+"""
+Request Scheduler
+=================
+
+Client-side scheduling for provider calls:
+
+- A token-bucket limiter per API key enforcing
+  ``SECURITY_CONFIG["rate_limiting"]`` (per minute and per hour).
+- Priority ordering, so interactive chat is admitted ahead of bulk work
+  waiting on the same key.
+- Retries with jittered exponential backoff for 429s, timeouts and 5xx
+  errors, honoring ``Retry-After``, up to
+  ``EXPORT_CONFIG["api_endpoints"]["retry_attempts"]``.
+- A per-request deadline covering queueing and retries. Each attempt of
+  a stream is bounded by ``EXPORT_CONFIG["api_endpoints"]["timeout"]``. A
+  blocking completion gets the rest of the deadline, since long answers
+  can legitimately take longer. If it still times out on the client side,
+  it is not retried.
+
+Under load requests wait in the queue instead of failing, and only give
+up when their deadline passes.
+"""
+
+import email.utils
+import hashlib
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, TypeVar
+
+from config import EXPORT_CONFIG, PERFORMANCE_CONFIG, SECURITY_CONFIG
+
+T = TypeVar("T")
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+PRIORITY_BACKGROUND = 20
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class RequestDeadlineExceeded(TimeoutError):
+    """Raised when a request cannot be admitted or completed before its deadline"""
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    # openai uses status_code; google.api_core exceptions use code
+    for attr in ("status_code", "code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return int(value)
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether an error is transient (rate limit, timeout, overload)"""
+    if isinstance(exc, RequestDeadlineExceeded):
+        return False
+    if _status_code(exc) in RETRYABLE_STATUS:
+        return True
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    name = type(exc).__name__
+    return any(
+        marker in name
+        for marker in ("Timeout", "Connection", "RateLimit", "ResourceExhausted")
+    )
+
+
+def is_client_timeout(exc: BaseException) -> bool:
+    """Whether the client gave up waiting, as opposed to a 408/504 reply"""
+    if _status_code(exc) is not None:
+        return False
+    return isinstance(exc, TimeoutError) or "Timeout" in type(exc).__name__
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait, from Retry-After headers"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+            return max(0.0, when.timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class _TokenBucket:
+    """Continuously refilling bucket; not thread-safe on its own"""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Per-key limiter that admits waiters in priority order"""
+
+    def __init__(self, per_minute: int, per_hour: int):
+        self._buckets = [_TokenBucket(per_minute, 60), _TokenBucket(per_hour, 3600)]
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        """Hold every request on this key (e.g. after a Retry-After)"""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._waiters)
+
+    def acquire(self, priority: int, deadline: float) -> None:
+        """Block until this caller is first in line and a token is available"""
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if self._waiters[0] == ticket:
+                        for bucket in self._buckets:
+                            bucket.refill(now)
+                        wait = max(
+                            [self._paused_until - now]
+                            + [b.wait_time() for b in self._buckets]
+                        )
+                        if wait <= 0:
+                            for bucket in self._buckets:
+                                bucket.tokens -= 1
+                            return
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise RequestDeadlineExceeded(
+                            "Request deadline exceeded while waiting for rate limit"
+                        )
+                    self._cond.wait(remaining if wait is None else min(wait, remaining))
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+
+class RequestScheduler:
+    """Rate limiting, priority admission, retries and deadlines for AI calls"""
+
+    def __init__(
+        self,
+        per_minute: int,
+        per_hour: int,
+        retry_attempts: int,
+        attempt_timeout: float,
+        deadline: float,
+        backoff_base: float = 1.0,
+        backoff_max: float = 20.0,
+    ):
+        self.per_minute = per_minute
+        self.per_hour = per_hour
+        self.retry_attempts = retry_attempts
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "deadline_exceeded": 0,
+            "throttled": 0,
+        }
+
+    @classmethod
+    def from_config(cls) -> "RequestScheduler":
+        limits = SECURITY_CONFIG["rate_limiting"]
+        endpoints = EXPORT_CONFIG["api_endpoints"]
+        scheduling = PERFORMANCE_CONFIG["scheduler"]
+        return cls(
+            per_minute=limits["requests_per_minute"],
+            per_hour=limits["requests_per_hour"],
+            retry_attempts=endpoints["retry_attempts"],
+            attempt_timeout=endpoints["timeout"],
+            deadline=scheduling["request_deadline"],
+            backoff_base=scheduling["backoff_base"],
+            backoff_max=scheduling["backoff_max"],
+        )
+
+    def _limiter(self, api_key: str) -> RateLimiter:
+        # Index by digest so raw keys are not kept as dict keys
+        key = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = RateLimiter(self.per_minute, self.per_hour)
+                self._limiters[key] = limiter
+            return limiter
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _backoff(self, attempt: int, exc: BaseException, limiter: RateLimiter) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        server_delay = retry_after(exc)
+        if server_delay is not None:
+            # Everyone on this key should back off, not just this caller
+            limiter.pause(server_delay)
+            delay = max(delay, server_delay)
+        if _status_code(exc) == 429:
+            self._count("throttled")
+        return delay
+
+    def _attempts(
+        self,
+        api_key: str,
+        priority: int,
+        deadline: Optional[float],
+        attempt_timeout: Optional[float],
+    ):
+        """Yield (attempt, timeout, limiter, deadline) while retries remain
+
+        ``attempt_timeout`` caps each attempt; None lets an attempt use
+        whatever is left of the deadline.
+        """
+        deadline = time.monotonic() + (deadline or self.deadline)
+        limiter = self._limiter(api_key)
+        self._count("requests")
+        for attempt in range(self.retry_attempts + 1):
+            try:
+                limiter.acquire(priority, deadline)
+            except RequestDeadlineExceeded:
+                self._count("deadline_exceeded")
+                raise
+            remaining = max(deadline - time.monotonic(), 0.1)
+            if attempt_timeout is not None:
+                remaining = min(attempt_timeout, remaining)
+            yield attempt, remaining, limiter, deadline
+
+    def _handle_failure(
+        self,
+        exc: BaseException,
+        attempt: int,
+        limiter: RateLimiter,
+        deadline: float,
+    ) -> None:
+        """Sleep before the next attempt, or re-raise if the error is final"""
+        if not is_retryable(exc) or attempt >= self.retry_attempts:
+            self._count("failures")
+            raise exc
+        delay = self._backoff(attempt, exc, limiter)
+        if time.monotonic() + delay >= deadline:
+            self._count("deadline_exceeded")
+            raise RequestDeadlineExceeded(
+                f"Request deadline exceeded after {attempt + 1} attempts: {exc}"
+            ) from exc
+        self._count("retries")
+        time.sleep(delay)
+
+    def run(
+        self,
+        api_key: str,
+        call: Callable[[float], T],
+        priority: int = PRIORITY_INTERACTIVE,
+        deadline: float = None,
+    ) -> T:
+        """Run ``call(timeout)`` under the rate limit, retrying transient errors
+
+        The call is a whole blocking generation, so its timeout is the rest
+        of the deadline rather than the per-attempt timeout. A client-side
+        timeout therefore means the deadline is spent, and it is not retried.
+        """
+        for attempt, timeout, limiter, expires in self._attempts(
+            api_key, priority, deadline, None
+        ):
+            try:
+                return call(timeout)
+            except Exception as e:
+                if is_client_timeout(e):
+                    self._count("deadline_exceeded")
+                    raise RequestDeadlineExceeded(
+                        f"Request deadline exceeded while generating: {e}"
+                    ) from e
+                self._handle_failure(e, attempt, limiter, expires)
+
+    def stream(
+        self,
+        api_key: str,
+        open_stream: Callable[[float], Iterable[str]],
+        priority: int = PRIORITY_INTERACTIVE,
+        deadline: float = None,
+    ) -> Iterator[str]:
+        """Like run() for streams; retries only until the first chunk arrives"""
+        for attempt, timeout, limiter, expires in self._attempts(
+            api_key, priority, deadline, self.attempt_timeout
+        ):
+            started = False
+            try:
+                for chunk in open_stream(timeout):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started:
+                    self._count("failures")
+                    raise
+                self._handle_failure(e, attempt, limiter, expires)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return retry/failure counters and the current queue depth"""
+        with self._lock:
+            limiters = list(self._limiters.values())
+            counters = dict(self._counters)
+        counters["queued"] = sum(limiter.queue_depth() for limiter in limiters)
+        return counters
+
+
+# Shared scheduler used by helper_ai
+request_scheduler = RequestScheduler.from_config()
@@ -0,0 +1,203 @@
+"""
+Response Cache
+==============
+
+TTL + size-bounded LRU cache for AI responses, driven by
+``PERFORMANCE_CONFIG["caching"]``. Entries are keyed by a hash of the
+model, system prompt and full prompt, evicted least-recently-used first
+once the byte budget is exceeded, and optionally mirrored to local disk
+so warm entries survive a Streamlit restart.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import PERFORMANCE_CONFIG
+
+
+class _CacheEntry:
+    """A cached response with its size and expiry time"""
+
+    __slots__ = ("value", "size", "expires_at")
+
+    def __init__(self, value: str, size: int, expires_at: float):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """Thread-safe LRU response cache bounded by bytes and TTL"""
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: float,
+        enabled: bool = True,
+        persist_dir: Optional[str] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self.persist_dir = persist_dir
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "stores": 0,
+        }
+
+        if self.enabled and self.persist_dir:
+            os.makedirs(self.persist_dir, exist_ok=True)
+            self._load_from_disk()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any] = None) -> "ResponseCache":
+        """Build a cache from a ``PERFORMANCE_CONFIG["caching"]``-style dict"""
+        config = config or PERFORMANCE_CONFIG["caching"]
+        return cls(
+            max_bytes=int(config.get("max_size", 100) * 1024 * 1024),
+            ttl=config.get("ttl", 3600),
+            enabled=config.get("enabled", True),
+            persist_dir=(
+                config.get("cache_dir") if config.get("persist_to_disk") else None
+            ),
+        )
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, prompt: str) -> str:
+        """Hash the request identity into a cache key"""
+        digest = hashlib.sha256()
+        for part in (model, system_prompt, prompt):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None on miss"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            if entry.expires_at <= time.time():
+                self._remove_locked(key)
+                self._counters["expirations"] += 1
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry.value
+
+    def set(self, key: str, value: str) -> None:
+        """Store a response, evicting least recently used entries if needed"""
+        if not self.enabled:
+            return
+
+        size = len(value.encode("utf-8")) + len(key)
+        if size > self.max_bytes:
+            return
+
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+            self._entries[key] = _CacheEntry(value, size, expires_at)
+            self._bytes += size
+            self._counters["stores"] += 1
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove_locked(oldest)
+                self._counters["evictions"] += 1
+            # Written under the lock, so an entry evicted or replaced by
+            # another thread cannot be persisted after its file was removed
+            if key in self._entries:
+                self._write_to_disk(key, value, expires_at)
+
+    def clear(self) -> None:
+        """Drop every entry from memory and disk"""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove_locked(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters and current occupancy"""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": self._counters["hits"] / lookups if lookups else 0.0,
+            }
+
+    def _remove_locked(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        if self.persist_dir:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.persist_dir, f"{key}.json")
+
+    def _write_to_disk(self, key: str, value: str, expires_at: float) -> None:
+        if not self.persist_dir:
+            return
+        tmp_path = self._path(key) + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"value": value, "expires_at": expires_at}, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            pass
+
+    def _load_from_disk(self) -> None:
+        """Warm the in-memory cache from persisted entries, oldest first"""
+        now = time.time()
+        files = []
+        for name in os.listdir(self.persist_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.persist_dir, name)
+            try:
+                files.append((os.path.getmtime(path), name[: -len(".json")], path))
+            except OSError:
+                continue
+
+        for _, key, path in sorted(files):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if data.get("expires_at", 0) <= now:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            size = len(data["value"].encode("utf-8")) + len(key)
+            self._entries[key] = _CacheEntry(data["value"], size, data["expires_at"])
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove_locked(next(iter(self._entries)))
+
+
+# Shared cache used by helper_ai
+response_cache = ResponseCache.from_config()
@@ -0,0 +1,124 @@
+"""
+Security Scanner
+================
+
+Local, LLM-free scanner for the regexes in
+``ANALYSIS_FEATURES["security_scan"]["patterns"]``. The patterns are
+compiled once into a single alternation with one named group per rule, so
+each file is scanned in one pass. Findings carry line/column positions and
+the severity from ``ANALYSIS_FEATURES["security_scan"]["severities"]``.
+"""
+
+import bisect
+import os
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from config import ANALYSIS_FEATURES, SUPPORTED_LANGUAGES
+
+SCAN_CONFIG = ANALYSIS_FEATURES["security_scan"]
+
+RULE_DESCRIPTIONS = {
+    "sql_injection": "Possible SQL injection via string-formatted query",
+    "hardcoded_password": "Hardcoded password",
+    "eval_usage": "Use of eval()",
+    "insecure_random": "Non-cryptographic random number generator",
+    "debug_mode": "Debug mode enabled",
+}
+
+
+class Finding(NamedTuple):
+    """A single pattern match in scanned code"""
+
+    rule: str
+    severity: str
+    line: int
+    column: int
+    snippet: str
+
+    @property
+    def description(self) -> str:
+        return RULE_DESCRIPTIONS.get(self.rule, self.rule.replace("_", " ").title())
+
+
+def _compile_patterns(patterns: Dict[str, str]) -> "re.Pattern":
+    """Combine every rule into one regex with a named group per rule"""
+    return re.compile(
+        "|".join(f"(?P<{name}>{pattern})" for name, pattern in patterns.items()),
+        re.MULTILINE,
+    )
+
+
+# Compiled once per process; worker processes compile on import
+COMBINED_PATTERN = _compile_patterns(SCAN_CONFIG["patterns"])
+
+
+def language_for_path(path: str) -> Optional[str]:
+    """Return the SUPPORTED_LANGUAGES name for a file extension"""
+    ext = os.path.splitext(path)[1].lower()
+    for language, settings in SUPPORTED_LANGUAGES.items():
+        if ext in settings["extensions"]:
+            return language
+    return None
+
+
+def scan_code(code: str, language: str = None) -> List[Finding]:
+    """Scan code in a single pass and return findings sorted by line
+
+    Languages with ``security_patterns`` disabled in SUPPORTED_LANGUAGES
+    are skipped. Overlapping matches of different rules report only the
+    leftmost one.
+    """
+    if not SCAN_CONFIG["enabled"]:
+        return []
+    if language in SUPPORTED_LANGUAGES:
+        if not SUPPORTED_LANGUAGES[language]["security_patterns"]:
+            return []
+
+    line_starts = [0] + [m.end() for m in re.finditer("\n", code)]
+    findings = []
+    for match in COMBINED_PATTERN.finditer(code):
+        rule = match.lastgroup
+        line_index = bisect.bisect_right(line_starts, match.start()) - 1
+        line_start = line_starts[line_index]
+        line_end = code.find("\n", line_start)
+        findings.append(
+            Finding(
+                rule=rule,
+                severity=SCAN_CONFIG["severities"].get(rule, "Low"),
+                line=line_index + 1,
+                column=match.start() - line_start + 1,
+                snippet=code[line_start : line_end if line_end != -1 else None].strip(),
+            )
+        )
+    return findings
+
+
+def summarize_findings(findings: Iterable[Finding]) -> Dict[str, int]:
+    """Count findings per severity level"""
+    counts = {level: 0 for level in SCAN_CONFIG["severity_levels"]}
+    for finding in findings:
+        counts[finding.severity] = counts.get(finding.severity, 0) + 1
+    return counts
+
+
+def flagged_regions(code: str, findings: List[Finding], context: int = 3) -> str:
+    """Extract numbered source lines around findings, merging overlapping windows
+
+    The result is added to the security prompt to point the model at the
+    flagged lines; the whole file is still sent with it.
+    """
+    lines = code.splitlines()
+    windows = []
+    for finding in sorted(findings, key=lambda f: f.line):
+        start = max(1, finding.line - context)
+        end = min(len(lines), finding.line + context)
+        if windows and start <= windows[-1][1] + 1:
+            windows[-1][1] = max(windows[-1][1], end)
+        else:
+            windows.append([start, end])
+
+    return "\n...\n".join(
+        "\n".join(f"{n:>5}: {lines[n - 1]}" for n in range(start, end + 1))
+        for start, end in windows
+    )
@@ -0,0 +1,326 @@
+"""
+Session History
+===============
+
+Bounded, compact storage for a session's chat and code-analysis history,
+driven by ``PERFORMANCE_CONFIG["session_history"]`` and the retention
+periods in ``SECURITY_CONFIG["data_retention"]``.
+
+- Each history is a ring buffer of at most ``max_entries`` records. The
+  oldest records are dropped once it is full.
+- Records use ``__slots__`` and interned role names, so a message costs
+  little more than its text.
+- Records older than the retention period are removed whenever the
+  history is read or appended to.
+- With spilling enabled, only the newest ``hot_entries`` records keep their
+  text in memory. Older text moves to a per-session file on local disk and
+  is read back when needed. Spill files are deleted with the history, and
+  files left behind by abandoned sessions are purged once they are older
+  than the retention period.
+
+Records can be read like the message dicts they replace
+(``record["role"]``, ``record["content"]``).
+"""
+
+import json
+import os
+import sys
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from config import PERFORMANCE_CONFIG, SECURITY_CONFIG
+
+HISTORY_CONFIG = PERFORMANCE_CONFIG["session_history"]
+RETENTION = SECURITY_CONFIG["data_retention"]
+
+SPILL_SUFFIX = ".jsonl"
+
+
+class _SpillFile:
+    """Append-only file holding the text of cold records"""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, uuid.uuid4().hex + SPILL_SUFFIX)
+        self.size = 0
+        self.live_bytes = 0
+
+    def write(self, fields: Dict[str, str]) -> Tuple[int, int]:
+        data = (json.dumps(fields) + "\n").encode("utf-8")
+        with open(self.path, "ab") as f:
+            f.write(data)
+        offset = self.size
+        self.size += len(data)
+        self.live_bytes += len(data)
+        return offset, len(data)
+
+    def read(self, offset: int, length: int) -> Dict[str, str]:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.read(length).decode("utf-8"))
+
+    def delete(self) -> None:
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        self.size = self.live_bytes = 0
+
+
+class HistoryRecord:
+    """One chat message or analysis result"""
+
+    __slots__ = ("id", "role", "created", "_content", "_code", "_spill", "_location")
+
+    def __init__(
+        self, role: str, content: str, code: str = None, created=None, record_id=0
+    ):
+        # Unique within its history and stable while the record is kept
+        self.id = record_id
+        self.role = sys.intern(role)
+        self.created = time.time() if created is None else created
+        self._content = content
+        self._code = code
+        self._spill: Optional[_SpillFile] = None
+        self._location: Optional[Tuple[int, int]] = None
+
+    @property
+    def spilled(self) -> bool:
+        return self._spill is not None
+
+    def _load(self) -> Dict[str, str]:
+        return self._spill.read(*self._location)
+
+    @property
+    def content(self) -> str:
+        return self._load()["content"] if self.spilled else self._content
+
+    @property
+    def code(self) -> Optional[str]:
+        return self._load().get("code") if self.spilled else self._code
+
+    @property
+    def timestamp(self) -> str:
+        return datetime.fromtimestamp(self.created).strftime("%Y-%m-%d %H:%M:%S")
+
+    def __getitem__(self, key: str):
+        if key not in ("role", "content", "code", "timestamp"):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def as_dict(self) -> Dict[str, str]:
+        data = {"role": self.role, "content": self.content, "timestamp": self.timestamp}
+        if self.code is not None:
+            data["code"] = self.code
+        return data
+
+    def spill(self, spill: _SpillFile) -> None:
+        """Move this record's text to disk"""
+        if self.spilled:
+            return
+        fields = {"content": self._content}
+        if self._code is not None:
+            fields["code"] = self._code
+        self._location = spill.write(fields)
+        self._spill = spill
+        self._content = self._code = None
+
+    def release(self) -> None:
+        """Account for this record leaving the history"""
+        if self.spilled:
+            self._spill.live_bytes -= self._location[1]
+
+    def memory_bytes(self) -> int:
+        size = sys.getsizeof(self)
+        if self._content is not None:
+            size += sys.getsizeof(self._content)
+        if self._code is not None:
+            size += sys.getsizeof(self._code)
+        return size
+
+
+def purge_spill_dir(directory: str, max_age: float) -> int:
+    """Delete spill files not touched for max_age seconds; returns the count"""
+    if not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if name.endswith(SPILL_SUFFIX) and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+class SessionHistory:
+    """Ring buffer of history records with retention and optional disk spill
+
+    Not thread-safe: each Streamlit session owns its own instances.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        retention_seconds: float,
+        hot_entries: int = None,
+        spill_dir: str = None,
+    ):
+        self.max_entries = max_entries
+        self.retention_seconds = retention_seconds
+        self.hot_entries = hot_entries if hot_entries is not None else max_entries
+        self.spill_dir = spill_dir
+        self._records: deque = deque()
+        self._spill: Optional[_SpillFile] = None
+        # Records removed from the front so far, for callers that keep
+        # per-position state (see ConversationMemory)
+        self.dropped = 0
+        self.evicted = 0
+        self.expired = 0
+        if spill_dir:
+            purge_spill_dir(spill_dir, retention_seconds)
+
+    @classmethod
+    def from_config(
+        cls, kind: str, max_entries: int, retention_seconds: float
+    ) -> "SessionHistory":
+        # One spill directory per kind, so purging uses the right retention
+        spill_dir = None
+        if HISTORY_CONFIG["spill_to_disk"]:
+            spill_dir = os.path.join(HISTORY_CONFIG["spill_dir"], kind)
+        return cls(
+            max_entries, retention_seconds, HISTORY_CONFIG["hot_entries"], spill_dir
+        )
+
+    @classmethod
+    def for_chat(cls) -> "SessionHistory":
+        return cls.from_config(
+            "chat",
+            HISTORY_CONFIG["max_chat_messages"],
+            RETENTION["chat_history"] * 3600,
+        )
+
+    @classmethod
+    def for_code(cls) -> "SessionHistory":
+        return cls.from_config(
+            "code",
+            HISTORY_CONFIG["max_code_entries"],
+            RETENTION["code_history"] * 86400,
+        )
+
+    def _drop_oldest(self) -> None:
+        self._records.popleft().release()
+        self.dropped += 1
+
+    def expire(self) -> int:
+        """Remove records older than the retention period"""
+        cutoff = time.time() - self.retention_seconds
+        removed = 0
+        while self._records and self._records[0].created < cutoff:
+            self._drop_oldest()
+            removed += 1
+        self.expired += removed
+        if removed:
+            self._compact_spill()
+        return removed
+
+    def _compact_spill(self) -> None:
+        """Delete or rewrite the spill file once most of it is dead"""
+        spill = self._spill
+        if spill is None or spill.live_bytes * 2 > spill.size:
+            return
+        spilled = [r for r in self._records if r.spilled]
+        fields = [r._load() for r in spilled]
+        spill.delete()
+        self._spill = None
+        if not spilled:
+            return
+        self._spill = _SpillFile(self.spill_dir)
+        for record, data in zip(spilled, fields):
+            record._spill = None
+            record._content = data["content"]
+            record._code = data.get("code")
+            record.spill(self._spill)
+
+    def add(self, role: str, content: str, code: str = None) -> HistoryRecord:
+        """Append a record, evicting and spilling older ones as needed"""
+        self.expire()
+        record = HistoryRecord(
+            role, content, code, record_id=self.dropped + len(self._records)
+        )
+        self._records.append(record)
+        while len(self._records) > self.max_entries:
+            self._drop_oldest()
+            self.evicted += 1
+        if self.spill_dir and len(self._records) > self.hot_entries:
+            if self._spill is None:
+                self._spill = _SpillFile(self.spill_dir)
+            cold = len(self._records) - self.hot_entries
+            for index in range(cold - 1, -1, -1):
+                if self._records[index].spilled:
+                    break
+                self._records[index].spill(self._spill)
+        self._compact_spill()
+        return record
+
+    def append(self, message: Dict[str, str]) -> HistoryRecord:
+        """Add a message given as a dict (``role``, ``content``, optional ``code``)"""
+        return self.add(message["role"], message["content"], message.get("code"))
+
+    def clear(self) -> None:
+        self.dropped += len(self._records)
+        self._records.clear()
+        if self._spill is not None:
+            self._spill.delete()
+            self._spill = None
+
+    def __len__(self) -> int:
+        self.expire()
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[HistoryRecord]:
+        self.expire()
+        return iter(list(self._records))
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> Union[HistoryRecord, List[HistoryRecord]]:
+        self.expire()
+        if isinstance(index, slice):
+            return list(self._records)[index]
+        return self._records[index]
+
+    def recent(self, count: int) -> List[HistoryRecord]:
+        """The newest ``count`` records, oldest first, without copying the rest"""
+        self.expire()
+        return list(islice(reversed(self._records), count))[::-1]
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Records held, bytes they take in memory and bytes spilled to disk"""
+        self.expire()
+        spilled = sum(1 for r in self._records if r.spilled)
+        return {
+            "entries": len(self._records),
+            "spilled_entries": spilled,
+            "memory_bytes": sys.getsizeof(self._records)
+            + sum(r.memory_bytes() for r in self._records),
+            "disk_bytes": self._spill.live_bytes if self._spill else 0,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
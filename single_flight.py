@@ -0,0 +1,198 @@
+"""
+Single Flight
+=============
+
+Process-wide coalescing of identical in-flight AI requests. Several
+sessions analyzing the same shared file, or a double-clicked quick action,
+would otherwise each pay for the same model call. Requests are keyed like
+the response cache (model, system prompt and prompt). When a request with
+the same key is already running, later callers wait for it and share its
+result instead of making another call. The response cache covers requests
+that have already finished.
+
+Streams are shared too. A follower first replays the chunks the leader has
+received so far and then gets new chunks as they arrive. If the leader's
+reader stops part way through while others are following, the rest of the
+stream is read on a background thread so that followers still get the
+whole answer.
+"""
+
+import threading
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from config import PERFORMANCE_CONFIG
+
+FLIGHT_CONFIG = PERFORMANCE_CONFIG["single_flight"]
+
+
+class _Flight:
+    """Chunks and final outcome of one shared request"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.result = None
+        self.error = None
+        self.done = False
+        self.followers = 0
+        self._cond = threading.Condition()
+
+    def publish(self, chunk: str) -> None:
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, result: str = None, error: BaseException = None) -> None:
+        with self._cond:
+            self.result = "".join(self.chunks) if result is None else result
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def wait(self, timeout: float) -> str:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.done, timeout):
+                raise TimeoutError("Timed out waiting for an identical request")
+            if self.error is not None:
+                raise self.error
+            return self.result
+
+    def follow(self, timeout: float) -> Iterator[str]:
+        sent = 0
+        while True:
+            with self._cond:
+                ready = self._cond.wait_for(
+                    lambda: self.done or len(self.chunks) > sent, timeout
+                )
+                if not ready:
+                    raise TimeoutError("Timed out waiting for an identical request")
+                chunks = self.chunks[sent:]
+                done, error = self.done, self.error
+            sent += len(chunks)
+            yield from chunks
+            if done:
+                if error is not None:
+                    raise error
+                if not self.chunks and self.result:
+                    # The leader made a blocking call; send it as one chunk
+                    yield self.result
+                return
+
+
+class SingleFlight:
+    """Registry of in-flight requests by key, with coalescing counters"""
+
+    def __init__(self, enabled: bool = True, wait_timeout: float = 180):
+        self.enabled = enabled
+        self.wait_timeout = wait_timeout
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_config(cls) -> "SingleFlight":
+        return cls(FLIGHT_CONFIG["enabled"], FLIGHT_CONFIG["wait_timeout"])
+
+    def _join(self, key: str) -> Tuple[_Flight, bool]:
+        """Return the flight for key and whether the caller leads it"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            self.leaders += 1
+            return flight, True
+
+    def _leave(self, key: str, flight: _Flight) -> int:
+        """Stop new callers joining flight; returns how many followed it"""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            return flight.followers
+
+    def call(self, key: str, fn: Callable[[], str]) -> Tuple[str, bool]:
+        """Run fn, or share the result of an identical running call
+
+        Returns the result and whether it was shared rather than made.
+        """
+        if not self.enabled:
+            return fn(), False
+        flight, leader = self._join(key)
+        if not leader:
+            return flight.wait(self.wait_timeout), True
+        try:
+            result = fn()
+        except BaseException as e:
+            self._leave(key, flight)
+            flight.finish(error=e)
+            raise
+        self._leave(key, flight)
+        flight.finish(result)
+        return result, False
+
+    def stream(
+        self, key: str, open_stream: Callable[[], Iterator[str]]
+    ) -> Tuple[Iterator[str], bool]:
+        """Open a stream, or follow an identical running one
+
+        Joins immediately; the returned iterator must be consumed.
+        """
+        if not self.enabled:
+            return open_stream(), False
+        flight, leader = self._join(key)
+        if not leader:
+            return flight.follow(self.wait_timeout), True
+        return self._lead(key, flight, open_stream()), False
+
+    def _lead(
+        self, key: str, flight: _Flight, upstream: Iterator[str]
+    ) -> Iterator[str]:
+        try:
+            for chunk in upstream:
+                flight.publish(chunk)
+                yield chunk
+        except GeneratorExit:
+            if self._leave(key, flight):
+                # Others are following: finish reading for them
+                threading.Thread(
+                    target=self._drain,
+                    args=(flight, upstream),
+                    name="single-flight-drain",
+                    daemon=True,
+                ).start()
+            else:
+                upstream.close()
+                flight.finish()
+            raise
+        except BaseException as e:
+            self._leave(key, flight)
+            flight.finish(error=e)
+            raise
+        self._leave(key, flight)
+        flight.finish()
+
+    @staticmethod
+    def _drain(flight: _Flight, upstream: Iterator[str]) -> None:
+        try:
+            for chunk in upstream:
+                flight.publish(chunk)
+        except Exception as e:
+            flight.finish(error=e)
+        else:
+            flight.finish()
+
+    def stats(self) -> Dict[str, int]:
+        """Requests in flight now, calls made, and calls saved by sharing"""
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "followers": sum(f.followers for f in self._flights.values()),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+            }
+
+
+# Shared by every session in the process
+single_flight = SingleFlight.from_config()
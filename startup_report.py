@@ -0,0 +1,126 @@
+"""
+Startup Report
+==============
+
+Breaks down the import cost of a cold start by module, using Python's
+``-X importtime`` in a fresh interpreter::
+
+    python startup_report.py              # profile ``import main``
+    python startup_report.py helper_ai --top 15 --runs 5
+
+Reports the total import time, the most expensive top-level packages (self
+time summed over their submodules), and the cumulative cost of each module
+the target imports directly. With ``--runs`` the fastest run is reported,
+to reduce noise from a cold disk cache.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, NamedTuple
+
+
+class ImportTiming(NamedTuple):
+    """One line of ``-X importtime`` output"""
+
+    module: str
+    depth: int
+    self_us: int
+    cumulative_us: int
+
+
+def profile_imports(target: str) -> List[ImportTiming]:
+    """Import ``target`` in a fresh interpreter and parse its import timings"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {target} failed:\n{result.stderr[-2000:]}")
+
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        timings.append(
+            ImportTiming(name.strip(), depth, int(self_us), int(cumulative_us))
+        )
+    return timings
+
+
+def build_report(timings: List[ImportTiming], target: str, top: int) -> Dict:
+    """Aggregate timings into totals per package and per direct import"""
+    by_package: Dict[str, int] = defaultdict(int)
+    for timing in timings:
+        by_package[timing.module.split(".")[0]] += timing.self_us
+
+    target_timing = next((t for t in timings if t.module == target), None)
+    # Direct imports of the target sit one level below it in the tree
+    direct = []
+    if target_timing is not None:
+        index = timings.index(target_timing)
+        start = index
+        while start > 0 and timings[start - 1].depth > target_timing.depth:
+            start -= 1
+        direct = [t for t in timings[start:index] if t.depth == target_timing.depth + 1]
+
+    return {
+        "target": target,
+        "total_ms": round(sum(t.self_us for t in timings) / 1000, 1),
+        "target_ms": (
+            round(target_timing.cumulative_us / 1000, 1) if target_timing else None
+        ),
+        "modules": len(timings),
+        "packages": [
+            {"package": name, "self_ms": round(us / 1000, 1)}
+            for name, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]
+        ],
+        "direct_imports": [
+            {"module": t.module, "cumulative_ms": round(t.cumulative_us / 1000, 1)}
+            for t in sorted(direct, key=lambda t: -t.cumulative_us)
+        ],
+    }
+
+
+def format_report(report: Dict) -> str:
+    lines = [
+        f"import {report['target']}: {report['target_ms']} ms "
+        f"({report['modules']} modules, {report['total_ms']} ms total)",
+        "",
+        "Top packages by self time:",
+    ]
+    lines.extend(
+        f"  {p['package']:<32}{p['self_ms']:>10.1f} ms" for p in report["packages"]
+    )
+    lines.extend(["", f"Direct imports of {report['target']} (cumulative):"])
+    lines.extend(
+        f"  {d['module']:<32}{d['cumulative_ms']:>10.1f} ms"
+        for d in report["direct_imports"]
+    )
+    return "\n".join(lines)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Report import cost of a module")
+    parser.add_argument("target", nargs="?", default="main", help="Module to import")
+    parser.add_argument("--top", type=int, default=20, help="Packages to list")
+    parser.add_argument("--runs", type=int, default=3, help="Report the fastest run")
+    parser.add_argument("--json", action="store_true", help="Print JSON")
+    args = parser.parse_args(argv)
+
+    reports = [
+        build_report(profile_imports(args.target), args.target, args.top)
+        for _ in range(max(1, args.runs))
+    ]
+    report = min(reports, key=lambda r: r["total_ms"])
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())